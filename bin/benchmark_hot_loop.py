@@ -0,0 +1,38 @@
+import os
+import random
+import sys
+import timeit
+# Move to the project directory to access the primediceSim package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".."))
+
+from primediceSim.account import Account
+from primediceSim.configuration import Configuration
+from primediceSim.simulation import Simulation
+
+# Compare single_sim with the hot loop on the same runs. Both are given the
+# same seed, so they simulate exactly the same rolls.
+RUNS = 200
+REPEATS = 5
+
+config = Configuration(base_bet=1, payout=2, loss_adder=100)
+account = Account(balance=100)
+
+
+def time_runs(method_name):
+    simulation = Simulation(config, account)
+    sim_function = getattr(simulation, method_name)
+
+    def run():
+        random.seed(1)
+        for _ in range(RUNS):
+            sim_function()
+
+    return min(timeit.repeat(run, number=1, repeat=REPEATS))
+
+
+single_time = time_runs("single_sim")
+hot_time = time_runs("hot_sim")
+print("single_sim: %.4f seconds for %d runs" % (single_time, RUNS))
+print("hot_sim:    %.4f seconds for %d runs" % (hot_time, RUNS))
+print("Speedup:    %.2fx" % (single_time / hot_time))
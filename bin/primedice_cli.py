@@ -0,0 +1,9 @@
+import os
+import sys
+# Move to the project directory to access the primediceSim package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".."))
+
+from primediceSim.cli import main
+
+sys.exit(main())
@@ -1,7 +1,9 @@
+import os
 import sys
-# Move to the project directory to access main file
-sys.path.append("../primediceSim")
+# Move to the project directory to access the primediceSim package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".."))
 
-from main import main
+from primediceSim.main import main
 
 main()
@@ -27,3 +27,60 @@ class Account:
         """Return the current balance"""
 
         return int(self.balance)
+
+    def freeze(self):
+        """Return a FrozenAccount with the same balance"""
+
+        return FrozenAccount(self.balance)
+
+
+class FrozenAccount:
+    """The same starting balance as an Account, which cannot be changed once
+    it is made. Accounts with the same balance are equal and hash the same,
+    so they can be used as keys. A simulation plays each run from its own
+    Account made from this balance.
+    """
+
+    __slots__ = ("balance",)
+
+    def __init__(self, balance):
+        object.__setattr__(self, "balance", int(balance))
+
+    @classmethod
+    def from_column(cls, balances):
+        """Make one account for each of the given balances, which may be a
+        sequence or a numpy array
+        """
+
+        if hasattr(balances, "tolist"):
+            balances = balances.tolist()
+
+        return [cls(balance) for balance in balances]
+
+    def get_balance(self):
+        """Return the balance"""
+
+        return self.balance
+
+    def thaw(self):
+        """Return an Account with the same balance, which can be changed"""
+
+        return Account(self.balance)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A FrozenAccount cannot be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("A FrozenAccount cannot be changed")
+
+    def __reduce__(self):
+        return type(self), (self.balance,)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.balance == other.balance
+
+    def __hash__(self):
+        return hash(self.balance)
+
+    def __repr__(self):
+        return "FrozenAccount(balance=%r)" % self.balance
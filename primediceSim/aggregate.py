@@ -0,0 +1,381 @@
+import math
+import statistics
+
+import numpy as np
+
+from primediceSim.configuration import STOP_REASONS
+
+
+class PartialResults:
+    """Keep running totals of the results of many simulations, updated as
+    each one finishes, so that neither a single process nor a pool of workers
+    needs to hold on to every balance history.
+    """
+
+    def __init__(self, track_medians=True, pending_limit=1000000,
+                 sketch=None):
+        """track_medians - also count how many runs had each balance at each
+        roll number, which the median and other percentiles need. Without it,
+        memory only grows with the length of the longest run.
+        pending_limit - the number of balances to collect before they are
+        added to the count table in one go
+        sketch - optional BalanceSketch. Balances are then counted by bucket,
+        so the count table stays small and percentiles are approximate.
+        """
+        self.track_medians = track_medians
+        self.pending_limit = pending_limit
+        self.sketch = sketch
+
+        self.number_of_results = 0
+        self.total_rolls = 0
+        self.total_average_balance = 0
+        self.total_final_balance = 0
+        # Sums of squares, which the standard errors of the means need
+        self.total_squared_rolls = 0
+        self.total_squared_average_balance = 0
+        # The number of runs that ended for each of the reasons
+        self.stop_counts = {reason: 0 for reason in STOP_REASONS}
+
+        # The sum of the balances at each roll number, over every run, and the
+        # number of runs that lasted long enough to reach it
+        self.balance_sums = np.zeros(0, dtype=np.int64)
+        self.run_counts = np.zeros(0, dtype=np.int64)
+
+        # How many runs had each balance at each roll number, kept as three
+        # matching arrays sorted by roll number and then by balance. With a
+        # sketch, the keys are bucket keys rather than the balances themselves
+        self.count_indices = np.zeros(0, dtype=np.int64)
+        self.count_keys = np.zeros(0, dtype=np.int64)
+        self.balance_counts = np.zeros(0, dtype=np.int64)
+
+        # Histories that have not been added to the count table yet
+        self.pending_histories = []
+        self.pending_size = 0
+
+    def add(self, result):
+        """Add the balances of a single simulation result"""
+
+        self.add_balances(result.get_balances(), result.get_stop_reason())
+
+    def add_histories(self, histories, stop_reasons=None):
+        """Add the balance history of each of several simulations.
+        stop_reasons - the reason each of them stopped. They all went bankrupt
+        if it is not given.
+        """
+
+        if stop_reasons is None:
+            stop_reasons = ["bankrupt"] * len(histories)
+        for balances, stop_reason in zip(histories, stop_reasons):
+            self.add_balances(balances, stop_reason)
+
+    def add_balances(self, balances, stop_reason="bankrupt"):
+        """Add the balance history of a single simulation, and the reason
+        from STOP_REASONS that it stopped
+        """
+
+        balances = np.asarray(balances, dtype=np.int64)
+
+        self.number_of_results += 1
+        # Initial balance does't count when counting the total rolls
+        rolls = balances.size - 1
+        average_balance = np.mean(balances)
+        self.total_rolls += rolls
+        self.total_average_balance += average_balance
+        self.total_squared_rolls += rolls * rolls
+        self.total_squared_average_balance += average_balance * \
+            average_balance
+        self.total_final_balance += int(balances[-1])
+        self.stop_counts[stop_reason] += 1
+
+        self.grow_totals(balances.size)
+        self.balance_sums[:balances.size] += balances
+        self.run_counts[:balances.size] += 1
+
+        if self.track_medians:
+            self.pending_histories.append(balances)
+            self.pending_size += balances.size
+            if self.pending_size >= self.pending_limit:
+                self.count_pending()
+
+    def merge(self, *others):
+        """Add all of the results held by other PartialResults"""
+
+        if not others:
+            return
+
+        for other in others:
+            if other.sketch != self.sketch:
+                raise ValueError("Only results that were counted with the"
+                                 " same sketch can be merged")
+
+        for other in others:
+            self.number_of_results += other.number_of_results
+            self.total_rolls += other.total_rolls
+            self.total_average_balance += other.total_average_balance
+            self.total_final_balance += other.total_final_balance
+            self.total_squared_rolls += other.total_squared_rolls
+            self.total_squared_average_balance += \
+                other.total_squared_average_balance
+            for reason, count in other.stop_counts.items():
+                self.stop_counts[reason] += count
+
+            self.grow_totals(other.balance_sums.size)
+            self.balance_sums[:other.balance_sums.size] += other.balance_sums
+            self.run_counts[:other.run_counts.size] += other.run_counts
+
+            other.count_pending()
+
+        # Medians can only be found if every merged result counted them
+        self.track_medians = self.track_medians and all(
+            other.track_medians for other in others)
+        if not self.track_medians:
+            return
+
+        # Combine every count table at once, so they are only sorted once
+        self.add_counts(
+            np.concatenate([other.count_indices for other in others]),
+            np.concatenate([other.count_keys for other in others]),
+            np.concatenate([other.balance_counts for other in others]))
+
+    def grow_totals(self, length):
+        """Make sure there is a running total for each of the first length
+        roll numbers
+        """
+
+        if length > self.balance_sums.size:
+            extra = np.zeros(length - self.balance_sums.size, dtype=np.int64)
+            self.balance_sums = np.concatenate((self.balance_sums, extra))
+            self.run_counts = np.concatenate((self.run_counts, extra))
+
+    def get_retained_bytes(self):
+        """Return the memory taken up by the running totals and counts"""
+
+        return (self.balance_sums.nbytes + self.run_counts.nbytes +
+                self.count_indices.nbytes + self.count_keys.nbytes +
+                self.balance_counts.nbytes +
+                sum(balances.nbytes for balances in self.pending_histories))
+
+    def count_pending(self):
+        """Add the histories collected since the last call to the count
+        table
+        """
+
+        if not self.pending_histories:
+            return
+
+        lengths = np.array([balances.size for balances in
+                            self.pending_histories])
+        balances = np.concatenate(self.pending_histories)
+        # The roll number of every balance in the concatenated histories
+        starts = np.cumsum(lengths) - lengths
+        indices = np.arange(balances.size) - np.repeat(starts, lengths)
+
+        self.pending_histories = []
+        self.pending_size = 0
+
+        if self.sketch is None:
+            keys = balances
+        else:
+            keys = self.sketch.bucket(balances)
+
+        self.add_counts(indices, keys, np.ones(keys.size, dtype=np.int64))
+
+    def add_counts(self, indices, keys, counts):
+        """Add to the number of runs that had each balance at each roll
+        number
+        """
+
+        if not counts.size:
+            return
+
+        indices = np.concatenate((self.count_indices, indices))
+        keys = np.concatenate((self.count_keys, keys))
+        counts = np.concatenate((self.balance_counts, counts))
+
+        order = np.lexsort((keys, indices))
+        indices = indices[order]
+        keys = keys[order]
+        counts = counts[order]
+
+        # Combine the counts of any repeated roll number and key pairs
+        new_pair = np.ones(indices.size, dtype=bool)
+        new_pair[1:] = ((indices[1:] != indices[:-1]) |
+                        (keys[1:] != keys[:-1]))
+        pair_starts = np.flatnonzero(new_pair)
+
+        self.count_indices = indices[pair_starts]
+        self.count_keys = keys[pair_starts]
+        self.balance_counts = np.add.reduceat(counts, pair_starts)
+
+    def find_average_bal(self):
+        """Calculate the average balance of all rolls before bankruptcy of
+        each run
+        """
+
+        return self.total_average_balance // self.number_of_results
+
+    def find_average_rolls_until_bankrupt(self):
+        """Calculate the average number of rolls until bankruptcy in each
+        run
+        """
+
+        return self.total_rolls // self.number_of_results
+
+    def find_stop_counts(self):
+        """Return the number of runs that ended for each reason"""
+
+        return dict(self.stop_counts)
+
+    def find_censored_runs(self):
+        """Count the runs that were stopped before going bankrupt"""
+
+        return self.number_of_results - self.stop_counts["bankrupt"]
+
+    def find_average_final_balance(self):
+        """Calculate the average balance that each run ended with"""
+
+        return self.total_final_balance // self.number_of_results
+
+    def find_confidence_intervals(self, confidence=0.95):
+        """Find the confidence intervals of the mean rolls until bankruptcy
+        and of the mean average balance of the runs, at the given confidence
+        level between 0 and 1
+        """
+
+        return {
+            "average_rolls_until_bankrupt": confidence_interval(
+                self.total_rolls, self.total_squared_rolls,
+                self.number_of_results, confidence),
+            "overall_average_balance": confidence_interval(
+                self.total_average_balance,
+                self.total_squared_average_balance, self.number_of_results,
+                confidence),
+        }
+
+    def precision_reached(self, precision, confidence=0.95):
+        """Return True once the confidence interval of every mean is within
+        the given fraction of the mean on either side
+        """
+
+        return all(relative_half_width(interval) <= precision for interval in
+                   self.find_confidence_intervals(confidence).values())
+
+    def find_average_balances(self):
+        """Find the average balance at each roll number, counting runs that
+        have already ended as having a balance of zero
+        """
+
+        return (self.balance_sums // self.number_of_results).tolist()
+
+    def find_runs_remaining(self):
+        """Find the number of runs that were still going at each roll
+        number
+        """
+
+        return self.run_counts.tolist()
+
+    def find_median_balances(self):
+        """Find the median balance at each roll number, counting runs that
+        have already ended as having a balance of zero.
+        Return an empty list if medians were not tracked.
+        """
+
+        return self.find_percentile_balances(50)
+
+    def find_percentile_balances(self, percentile):
+        """Find the given percentile, between 0 and 100, of the balances at
+        each roll number, counting runs that have already ended as having a
+        balance of zero.
+        Return an empty list if balances were not counted.
+        """
+
+        if not self.track_medians:
+            return []
+
+        self.count_pending()
+
+        index_starts = np.searchsorted(self.count_indices,
+                                       np.arange(self.balance_sums.size))
+        index_ends = np.append(index_starts[1:], self.count_indices.size)
+
+        percentile_balances = []
+        for start, end in zip(index_starts, index_ends):
+            low_key, high_key, fraction = percentile_from_counts(
+                self.count_keys[start:end], self.balance_counts[start:end],
+                self.number_of_results, percentile)
+
+            if self.sketch is None:
+                # Truncate the same way that int(np.median(...)) does
+                balance = int(low_key + (high_key - low_key) * fraction)
+            else:
+                low, high = self.sketch.value([low_key, high_key])
+                balance = int(round(low + (high - low) * fraction))
+
+            percentile_balances.append(balance)
+            # Stop calculating percentiles once they reach 0
+            if balance == 0:
+                break
+
+        return percentile_balances
+
+
+def confidence_interval(total, total_squared, count, confidence=0.95):
+    """Find the confidence interval of the mean of count values, given
+    their sum and the sum of their squares. The mean is taken to be normally
+    distributed, which holds well once there are more than a few dozen runs.
+    Return the lowest and highest mean in the interval.
+    """
+
+    if count < 2:
+        return -math.inf, math.inf
+
+    mean = total / count
+    variance = max(total_squared - total * mean, 0) / (count - 1)
+    standard_error = math.sqrt(variance / count)
+    z_score = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    half_width = z_score * standard_error
+
+    return mean - half_width, mean + half_width
+
+
+def relative_half_width(interval):
+    """Return half the width of a confidence interval as a fraction of the
+    mean in its middle
+    """
+
+    low, high = interval
+    half_width = (high - low) / 2
+    if half_width == 0:
+        return 0
+    mean = (high + low) / 2
+    if mean == 0 or math.isinf(half_width):
+        return math.inf
+
+    return half_width / abs(mean)
+
+
+def percentile_from_counts(keys, counts, total, percentile):
+    """Find the two values on either side of the given percentile of total
+    values, given the sorted distinct keys and how many times each appeared.
+    Any values that are not accounted for are zeros.
+    Return the lower key, the higher key and how far the percentile lies
+    between them, interpolated linearly as np.percentile does.
+    """
+
+    zeros = total - counts.sum()
+    if zeros:
+        position = np.searchsorted(keys, 0)
+        keys = np.insert(keys, position, 0)
+        counts = np.insert(counts, position, zeros)
+
+    rank = percentile / 100 * (total - 1)
+    low_rank = int(rank)
+    high_rank = min(low_rank + 1, total - 1)
+
+    cumulative_counts = np.cumsum(counts)
+    low_key = keys[np.searchsorted(cumulative_counts, low_rank,
+                                   side="right")]
+    high_key = keys[np.searchsorted(cumulative_counts, high_rank,
+                                    side="right")]
+
+    return low_key, high_key, rank - low_rank
@@ -0,0 +1,259 @@
+import math
+
+import numpy as np
+
+from primediceSim.instrumentation import get_instrument
+from primediceSim.strategy import Martingale
+
+
+class AnalyticSolver:
+    """Find the expected results of a configuration exactly, by following the
+    probability of every (balance, losing streak) state from roll to roll
+    instead of simulating runs. The configuration's stop conditions end runs
+    just as they do in a simulation: balances at the take profit or stop loss
+    stop rolling, and every run stops once it reaches the most rolls.
+    """
+
+    def __init__(self, config, account, tolerance=1e-6, max_rolls=100000,
+                 instrument=None):
+        """tolerance - stop once the chance that a run is still going falls
+        below this value
+        max_rolls - stop after this many rolls even if runs are still going.
+        The average balances up to that roll are still exact, but the expected
+        rolls until bankruptcy then leave out the runs that were still going,
+        whose chance is given by AnalyticResults.get_unfinished_chance().
+        This is a limit on the solver, unlike the configuration's max_rolls,
+        which ends the runs themselves.
+        instrument - optional Instrument that the results send their messages
+        through. The default instrument is used if it is not given.
+        """
+        strategy = config.get_strategy()
+        if type(strategy) is not Martingale:
+            raise ValueError("Only the martingale strategy can be solved "
+                             "exactly")
+        # The ladder of bets is worked out until no balance can afford the
+        # next bet, which never happens if the bet stops growing
+        if strategy.loss_adder < 0:
+            raise ValueError("Only a loss adder of at least 0 can be solved "
+                             "exactly")
+        if config.get_base_bet() <= 0:
+            raise ValueError("Only a base bet above 0 can be solved exactly")
+
+        self.config = config
+        self.account = account
+        self.loss_adder_decimal = strategy.loss_adder / 100
+        self.tolerance = tolerance
+        self.max_rolls = max_rolls
+        self.instrument = instrument
+
+        # The bet after each number of losses in a row, and the whole amounts
+        # that are taken for it and paid back if it wins
+        self.bets = []
+        self.costs = []
+        self.rewards = []
+        self.minimums = []
+
+    def extend_ladder(self, max_balance):
+        """Work out the bet for each number of losses in a row, until the bet
+        is more than max_balance and no run could afford it.
+        Return the number of streak lengths that can still be afforded.
+        """
+
+        if not self.bets:
+            self.bets.append(self.config.get_base_bet())
+
+        # Without a loss adder the bet never changes, so there is only ever
+        # one streak length that matters
+        if self.loss_adder_decimal == 0:
+            streak_count = 1
+        else:
+            while self.bets[-1] <= max_balance:
+                # Increase the bet exactly the way the Martingale strategy does
+                bet = self.bets[-1]
+                self.bets.append(
+                    bet + bet * self.loss_adder_decimal)
+            streak_count = len(self.bets) - 1
+
+        while len(self.costs) < len(self.bets):
+            bet = self.bets[len(self.costs)]
+            self.costs.append(int(bet))
+            self.rewards.append(int(bet * self.config.get_payout()))
+            # A whole balance can afford the bet once it reaches this value
+            self.minimums.append(math.ceil(bet))
+
+        return streak_count
+
+    def stop_runs(self, chances, final_chances, rolls):
+        """Move the chances of the runs that have to stop, now that they have
+        made the given number of rolls, from chances to final_chances. The
+        runs stop for the same reasons as in Configuration.find_stop_reason.
+        Return the chance that a run is still going.
+        """
+
+        streak_count, width = chances.shape
+
+        # Runs that can no longer afford their bet are bankrupt
+        for streak in range(streak_count):
+            lowest = min(self.minimums[streak], width)
+            final_chances[:lowest] += chances[streak, :lowest]
+            chances[streak, :lowest] = 0
+
+        # Every balance is whole, so the stop conditions are rounded to the
+        # first whole balance that they stop
+        take_profit = self.config.get_take_profit()
+        if take_profit is not None:
+            highest = min(max(math.ceil(take_profit), 0), width)
+            final_chances[highest:width] += chances[:, highest:].sum(axis=0)
+            chances[:, highest:] = 0
+        stop_loss = self.config.get_stop_loss()
+        if stop_loss is not None:
+            lowest = min(max(math.floor(stop_loss) + 1, 0), width)
+            final_chances[:lowest] += chances[:, :lowest].sum(axis=0)
+            chances[:, :lowest] = 0
+
+        max_rolls = self.config.get_max_rolls()
+        if max_rolls is not None and rolls >= max_rolls:
+            final_chances[:width] += chances.sum(axis=0)
+            chances[:] = 0
+
+        return chances.sum()
+
+    def solve(self):
+        """Return an AnalyticResults with the expected results of the
+        configuration
+        """
+
+        win_chance = self.config.get_roll_under_threshold() / 10000
+        streak_matters = self.loss_adder_decimal != 0
+
+        starting_balance = self.account.get_balance()
+        width = starting_balance + 1
+
+        # chances[k, b] is the chance that a run is still going with a balance
+        # of b after losing its last k rolls
+        streak_count = self.extend_ladder(width - 1)
+        chances = np.zeros((streak_count, width))
+        final_chances = np.zeros(width)
+        if starting_balance >= self.bets[0]:
+            chances[0, starting_balance] = 1
+        else:
+            final_chances[starting_balance] = 1
+
+        average_balances = [float(starting_balance)]
+        expected_rolls = 0.0
+
+        rolls = 0
+        still_going = self.stop_runs(chances, final_chances, rolls)
+        while still_going > self.tolerance and rolls < self.max_rolls:
+            expected_rolls += still_going
+            rolls += 1
+
+            # A win can add at most the largest profit of any bet that can
+            # still be afforded
+            gain = max(self.rewards[streak] - self.costs[streak] for streak
+                       in range(streak_count)
+                       if self.minimums[streak] < width)
+            new_width = width + max(gain, 0)
+            new_streak_count = self.extend_ladder(new_width - 1)
+            new_chances = np.zeros((new_streak_count, new_width))
+            if final_chances.size < new_width:
+                # Grow in large steps so the array is rarely copied
+                final_chances = np.append(
+                    final_chances,
+                    np.zeros(max(new_width, 2 * final_chances.size) -
+                             final_chances.size))
+
+            # The total of the new balances of every run that rolled, weighted
+            # by how likely each one is
+            balance_total = 0.0
+            balances = np.arange(new_width)
+            for streak in range(streak_count):
+                lowest = self.minimums[streak]
+                if lowest >= width:
+                    continue
+                row = chances[streak, lowest:]
+                # The bet is taken out first, and paid back with the payout
+                # if the roll is won
+                remaining = lowest - self.costs[streak]
+                won = remaining + self.rewards[streak]
+                new_chances[0, won:won + row.size] += row * win_chance
+                balance_total += win_chance * np.dot(
+                    row, balances[won:won + row.size])
+
+                if streak_matters:
+                    lost_streak = streak + 1
+                else:
+                    lost_streak = streak
+                lost = row * (1 - win_chance)
+                balance_total += np.dot(
+                    lost, balances[remaining:remaining + row.size])
+                if lost_streak < new_streak_count:
+                    new_chances[lost_streak,
+                                remaining:remaining + row.size] += lost
+                else:
+                    final_chances[remaining:remaining + row.size] += lost
+
+            # Runs that have finished count as a balance of zero
+            average_balances.append(float(balance_total))
+
+            self.stop_runs(new_chances, final_chances, rolls)
+
+            # Leave out the highest balances once their chances have become
+            # too small to be represented
+            balance_chances = new_chances.sum(axis=0)
+            new_width = int(np.flatnonzero(balance_chances)[-1]) + 1 if \
+                balance_chances.any() else 1
+            chances, width, streak_count = \
+                new_chances[:, :new_width], new_width, new_streak_count
+            still_going = chances.sum()
+
+        return AnalyticResults(average_balances, expected_rolls,
+                               np.flatnonzero(final_chances),
+                               final_chances[final_chances > 0],
+                               float(still_going), self.instrument)
+
+
+class AnalyticResults:
+    """Contain the expected results of a configuration, as found by the
+    AnalyticSolver
+    """
+
+    def __init__(self, average_balances, average_rolls_until_bankrupt,
+                 final_balances, final_chances, unfinished_chance,
+                 instrument=None):
+        self.average_balances = average_balances
+        self.average_rolls_until_bankrupt = average_rolls_until_bankrupt
+        self.final_balances = final_balances
+        self.final_chances = final_chances
+        # The chance that a run was still going when the solver stopped
+        self.unfinished_chance = unfinished_chance
+        self.num_of_rolls = len(self.average_balances)
+        self.instrument = get_instrument(instrument)
+
+    def get_average_balances(self):
+        return self.average_balances
+
+    def get_average_rolls_until_bankrupt(self):
+        return self.average_rolls_until_bankrupt
+
+    def get_final_balance_distribution(self):
+        """Return each balance that a run can end on, and the chance of
+        ending on it
+        """
+        return self.final_balances, self.final_chances
+
+    def get_unfinished_chance(self):
+        return self.unfinished_chance
+
+    def print_results(self):
+        """Print out the results saved with explaining labels, through the
+        instrument's messages
+        """
+
+        message = self.instrument.message
+        message("\n[Results] Expected rolls until bankruptcy: " +
+                str(self.average_rolls_until_bankrupt))
+        message("[Results] Chance of a run outlasting the solver: " +
+                str(self.unfinished_chance))
+
+        message("\n======================================================")
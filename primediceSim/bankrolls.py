@@ -0,0 +1,84 @@
+import numpy as np
+
+from primediceSim.batch import BatchEngine, GroupedRolls
+from primediceSim.simulation import AverageResults, Results
+
+
+class BankrollSimulation:
+    """Simulate one configuration from several starting balances in a single
+    pass. Each run is played from every starting balance with the same rolls,
+    and all of those bankrolls are moved forward together by the batch engine
+    until each one stops. Every roll is then drawn once however many balances
+    are asked about, and differences between the balances come from the
+    balances alone rather than from luck.
+    """
+
+    def __init__(self, config, balances, random_seed=None, instrument=None,
+                 rng_backend="pcg64", rng=None):
+        """balances - the starting balances to simulate from, as a sequence
+        or numpy array. Results are kept by balance, so each balance can only
+        be given once.
+        instrument - optional Instrument that is told how long each average
+        of the results takes to find
+        rng_backend - the bit generator to draw the rolls with, "pcg64" or
+        "philox"
+        rng - optional object with an integers(low, high, size) method to
+        draw the rolls with instead, such as a numpy Generator
+        """
+        if len(balances) == 0:
+            raise ValueError("At least one starting balance must be given")
+        # numpy balances are turned into plain numbers, so that they can be
+        # used to look up the results
+        if hasattr(balances, "tolist"):
+            balances = balances.tolist()
+        if len(set(balances)) != len(balances):
+            raise ValueError("Each starting balance can only be given once")
+
+        self.config = config
+        self.balances = list(balances)
+        self.random_seed = random_seed
+        self.instrument = instrument
+        self.rng_backend = rng_backend
+        self.rng = rng
+
+    def run(self, iterations=None):
+        """Simulate the given number of runs from each starting balance, or
+        the configuration's iterations if it is not given. Return a
+        dictionary with the AverageResults of each starting balance.
+        """
+
+        if iterations is None:
+            iterations = self.config.get_iterations()
+
+        # Every starting balance gets its own group of runs, and the n-th run
+        # of each group is given the same rolls
+        batch_engine = BatchEngine(
+            self.config, None,
+            shared_rolls=GroupedRolls(iterations, self.random_seed,
+                                      self.rng_backend, self.rng))
+        histories = batch_engine.run(
+            iterations * len(self.balances),
+            start_balances=np.repeat(self.balances, iterations))
+
+        results = {}
+        for group_num, balance in enumerate(self.balances):
+            group = histories.get_runs(group_num * iterations,
+                                       (group_num + 1) * iterations)
+            each_sim_result = [
+                Results(balances=balances, stop_reason=stop_reason) for
+                balances, stop_reason in zip(group,
+                                             group.get_stop_reasons())]
+            results[balance] = AverageResults(each_sim_result,
+                                              histories=group,
+                                              instrument=self.instrument)
+
+        return results
+
+    @staticmethod
+    def print_results(results):
+        """Print out the results returned by run, one balance at a time"""
+
+        for balance, sim_result in results.items():
+            sim_result.instrument.message("[Results] Starting balance: %s" %
+                                          balance)
+            sim_result.print_results()
@@ -0,0 +1,353 @@
+import numpy as np
+
+from primediceSim.configuration import STOP_REASONS
+from primediceSim.histories import BalanceHistories, STOP_REASON_DTYPE
+from primediceSim.rolls import make_generator
+from primediceSim.simulation import deadline_passed
+
+
+class BatchEngine:
+    """Simulate many rounds of betting at once by advancing every run that is
+    still solvent in lockstep, using NumPy arrays instead of one Python loop
+    per run.
+    """
+
+    def __init__(self, config, account, random_seed=None, block_size=65536,
+                 rng=None, shared_rolls=None, track_controls=False,
+                 rng_backend="compat"):
+        """account - the Account that every run starts from, which may be
+        None if run is always given the starting balances.
+        rng - optional object with an integers(low, high, size) method,
+        such as a numpy Generator. One is created from random_seed if it is
+        not given.
+        block_size - the minimum number of rolls that are drawn at once.
+        shared_rolls - optional SharedRolls to take every roll from instead of
+        the generator, so that other engines can be given the same rolls.
+        rng_backend - the bit generator to create the generator with, one of
+        RNG_BACKENDS from the rolls module. "compat" uses PCG64, as earlier
+        versions did.
+        track_controls - also find a control variate for each run: how much
+        more its wins paid out than the win chance alone would have paid on
+        the same bets. Its expected value is exactly zero, and after each run
+        the values are kept in controls.
+        """
+        self.config = config
+        self.account = account
+        self.shared_rolls = shared_rolls
+        self.track_controls = track_controls
+        self.controls = None
+
+        if rng is None:
+            if rng_backend == "compat":
+                rng_backend = "pcg64"
+            rng = make_generator(rng_backend, random_seed)
+        self.rng = rng
+        self.block_size = block_size
+
+        self.roll_buffer = np.empty(0, dtype=np.int64)
+        self.buffer_position = 0
+
+    def draw_rolls(self, count):
+        """Return the next count rolls as whole numbers of hundredths between
+        0 and 9999, drawing a new block from the generator when the buffer
+        runs out.
+        """
+
+        remaining = self.roll_buffer.size - self.buffer_position
+        if remaining < count:
+            leftover = self.roll_buffer[self.buffer_position:]
+            new_rolls = self.rng.integers(
+                0, 10000, size=max(count - remaining, self.block_size))
+            self.roll_buffer = np.concatenate((leftover, new_rolls))
+            self.buffer_position = 0
+
+        rolls = self.roll_buffer[self.buffer_position:
+                                 self.buffer_position + count]
+        self.buffer_position += count
+
+        return rolls
+
+    def run(self, iterations, progress=None, roll_budget=None,
+            deadline=None, start_balances=None):
+        """Simulate the given number of runs until bankruptcy, or until one
+        of the configuration's stop conditions ends them, and return a
+        BalanceHistories with the balance history of each run.
+        progress - optional function that is given the number of finished
+        runs after every roll.
+        roll_budget - optional number of rolls to make over every run
+        together. Every run rolls at once, so the runs that are still going
+        are all stopped before a roll that would go over the budget.
+        deadline - optional time.monotonic() value after which the runs that
+        are still going are all stopped, or a function that returns True once
+        they should stop
+        start_balances - optional array with the balance that each run starts
+        with, instead of the account's balance
+        """
+
+        # Take every configuration value once, rather than on every roll
+        threshold = self.config.get_roll_under_threshold()
+        base_bet = self.config.get_base_bet()
+        strategy = self.config.get_strategy()
+        payout = self.config.get_payout()
+
+        if start_balances is None:
+            start_balances = np.full(iterations, self.account.get_balance(),
+                                     dtype=np.int64)
+        start_balances = np.asarray(start_balances, dtype=np.int64)
+        balances = start_balances.copy()
+        bets = np.full(iterations, base_bet, dtype=np.float64)
+        # The state the betting strategy keeps for each run
+        states = np.zeros(iterations, dtype=np.int64)
+        stop_codes = np.zeros(iterations, dtype=STOP_REASON_DTYPE)
+        controls = None
+        if self.track_controls:
+            controls = np.zeros(iterations, dtype=np.float64)
+            win_chance = threshold / 10000
+
+        # Indices of the runs that can still afford their next bet, and that
+        # no other stop condition has ended
+        alive = self.stop_runs(np.arange(iterations), balances, bets, 0,
+                               stop_codes)
+        rolls_left = roll_budget
+
+        # The runs that rolled and their new balances, one pair per roll, in
+        # the order that the rolls were made
+        rolled_runs = []
+        rolled_balances = []
+
+        roll_num = 0
+        while alive.size:
+            if (rolls_left is not None and alive.size > rolls_left) or \
+                    (deadline is not None and deadline_passed(deadline)):
+                stop_codes[alive] = STOP_REASONS.index("budget")
+                break
+            if rolls_left is not None:
+                rolls_left -= alive.size
+
+            current_bets = bets[alive]
+
+            # The account only deals in whole amounts, so both the bet and the
+            # reward are truncated just as Account.subtract and Account.add do
+            new_balances = balances[alive] - current_bets.astype(np.int64)
+
+            if self.shared_rolls is None:
+                rolls = self.draw_rolls(alive.size)
+            else:
+                rolls = self.shared_rolls.get_rolls(roll_num, alive)
+            won = rolls < threshold
+            roll_num += 1
+            new_balances[won] += \
+                (current_bets[won] * payout).astype(np.int64)
+            if controls is not None:
+                rewards = (current_bets * payout).astype(np.int64)
+                controls[alive] += (won - win_chance) * rewards
+
+            # The strategy moves every run's bet at once
+            current_bets, current_states = strategy.next_bets(
+                base_bet, current_bets, won, states[alive])
+            if strategy.uses_state:
+                states[alive] = current_states
+
+            balances[alive] = new_balances
+            bets[alive] = current_bets
+            rolled_runs.append(alive)
+            rolled_balances.append(new_balances)
+
+            alive = self.stop_runs(alive, new_balances, current_bets,
+                                   roll_num, stop_codes)
+
+            if progress is not None:
+                progress(iterations - alive.size)
+
+        self.controls = controls
+
+        return self.split_histories(balances.size, rolled_runs,
+                                    rolled_balances, stop_codes,
+                                    start_balances)
+
+    def stop_runs(self, runs, balances, bets, rolls, stop_codes):
+        """Find which of the given runs have to stop, now that each has the
+        given balance and next bet after rolls rolls, and record the reason
+        each one stopped in stop_codes. Return the runs that keep going.
+        The reasons are checked in the same order as
+        Configuration.find_stop_reason.
+        """
+
+        take_profit = self.config.get_take_profit()
+        stop_loss = self.config.get_stop_loss()
+        max_rolls = self.config.get_max_rolls()
+
+        # Later reasons are written over earlier ones, so they are written
+        # from the last to be checked to the first
+        codes = np.full(runs.size, -1, dtype=STOP_REASON_DTYPE)
+        if max_rolls is not None and rolls >= max_rolls:
+            codes[:] = STOP_REASONS.index("max_rolls")
+        if stop_loss is not None:
+            codes[balances <= stop_loss] = STOP_REASONS.index("stop_loss")
+        if take_profit is not None:
+            codes[balances >= take_profit] = STOP_REASONS.index("take_profit")
+        codes[balances < bets] = STOP_REASONS.index("bankrupt")
+
+        stopped = codes >= 0
+        stop_codes[runs[stopped]] = codes[stopped]
+
+        return runs[~stopped]
+
+    def split_histories(self, iterations, rolled_runs, rolled_balances,
+                        stop_codes=None, start_balances=None):
+        """Turn the per-roll records into a BalanceHistories holding the
+        balance history of each run, and the position in STOP_REASONS of the
+        reason each one stopped.
+        start_balances - optional array with the balance that each run
+        started with, instead of the account's balance
+        """
+
+        if rolled_runs:
+            runs = np.concatenate(rolled_runs)
+            balances = np.concatenate(rolled_balances)
+        else:
+            runs = np.zeros(0, dtype=np.int64)
+            balances = np.zeros(0, dtype=np.int64)
+
+        # A stable sort keeps each run's balances in the order they were rolled
+        order = np.argsort(runs, kind="stable")
+        rolls_per_run = np.bincount(runs, minlength=iterations)
+
+        # Every history starts with the starting balance, followed by the
+        # balance after each of its rolls
+        offsets = np.zeros(iterations + 1, dtype=np.int64)
+        np.cumsum(rolls_per_run + 1, out=offsets[1:])
+        history_balances = np.empty(offsets[-1], dtype=np.int64)
+        is_start = np.zeros(offsets[-1], dtype=bool)
+        is_start[offsets[:-1]] = True
+        if start_balances is None:
+            start_balances = self.account.get_balance()
+        history_balances[is_start] = start_balances
+        history_balances[~is_start] = balances[order]
+
+        return BalanceHistories.from_buffer(history_balances, offsets,
+                                            stop_codes)
+
+
+class SharedRolls:
+    """Hand out the rolls of a set of runs so that several batch engines can
+    be given exactly the same rolls. The rolls are found by roll number, so
+    every run gets the same roll for its n-th roll no matter which engine
+    asks.
+    Each block of roll numbers is drawn from its own seed, so a block can be
+    drawn again rather than kept. Only the first blocks, which every run
+    uses, are kept, along with the last block asked for, so the memory used
+    does not grow with the longest run.
+    """
+
+    def __init__(self, iterations, random_seed=None, block_rows=256,
+                 rng_backend="pcg64", kept_blocks=8):
+        """iterations - the number of runs to hand out rolls for
+        random_seed - the seed of the rolls, which may also be a numpy
+        SeedSequence
+        block_rows - the number of roll numbers to draw at once
+        rng_backend - the bit generator to draw with, one of RNG_BACKENDS
+        from the rolls module. "compat" uses PCG64, as the batch engine does.
+        kept_blocks - the number of blocks, from the first, that are kept
+        once drawn
+        """
+        self.iterations = iterations
+        if not isinstance(random_seed, np.random.SeedSequence):
+            random_seed = np.random.SeedSequence(random_seed)
+        self.seed_sequence = random_seed
+        if rng_backend == "compat":
+            rng_backend = "pcg64"
+        self.rng_backend = rng_backend
+        self.block_rows = block_rows
+        self.kept_blocks = kept_blocks
+        self.blocks = {}
+        self.last_block = (None, None)
+
+    def draw_block(self, block_num):
+        """Draw the rolls of every run for a block of roll numbers. The same
+        block number always gives the same rolls.
+        """
+
+        seed_sequence = np.random.SeedSequence(
+            self.seed_sequence.entropy,
+            spawn_key=self.seed_sequence.spawn_key + (block_num,),
+            pool_size=self.seed_sequence.pool_size)
+        rng = make_generator(self.rng_backend, seed_sequence=seed_sequence)
+
+        return rng.integers(0, 10000, size=(self.block_rows, self.iterations),
+                            dtype=np.int16)
+
+    def find_block(self, block_num):
+        """Return the rolls of a block of roll numbers, drawing them if they
+        are not kept
+        """
+
+        block = self.blocks.get(block_num)
+        if block is not None:
+            return block
+        if self.last_block[0] == block_num:
+            return self.last_block[1]
+
+        block = self.draw_block(block_num)
+        if block_num < self.kept_blocks:
+            self.blocks[block_num] = block
+        else:
+            self.last_block = (block_num, block)
+
+        return block
+
+    def get_rolls(self, roll_num, runs):
+        """Return the roll that each of the given runs makes on its roll_num-th
+        roll
+        """
+
+        block_num, row = divmod(roll_num, self.block_rows)
+
+        return self.find_block(block_num)[row, runs]
+
+
+class AntitheticRolls:
+    """Hand out the mirror image of the rolls of a SharedRolls, so that a
+    high roll for one run is a low roll for its partner. Averaging the two
+    runs of each pair cancels out much of the luck of either one.
+    """
+
+    def __init__(self, shared_rolls):
+        self.shared_rolls = shared_rolls
+
+    def get_rolls(self, roll_num, runs):
+        return 9999 - self.shared_rolls.get_rolls(roll_num, runs)
+
+
+class GroupedRolls:
+    """Hand the same roll to every run in the same place of several groups of
+    runs, so the first run of every group gets the same rolls, as does the
+    second and so on. Groups that only differ in how the runs start can then
+    be simulated together, drawing each roll once.
+    The rolls are not kept, so each roll number must be asked for once, in
+    order, as the batch engine does.
+    """
+
+    def __init__(self, group_size, random_seed=None, rng_backend="pcg64",
+                 rng=None):
+        """group_size - the number of runs in each group
+        rng_backend - the bit generator to draw with, one of RNG_BACKENDS
+        from the rolls module other than "compat"
+        rng - optional object with an integers(low, high, size) method to
+        draw with instead, such as a numpy Generator
+        """
+        self.group_size = group_size
+        if rng is None:
+            rng = make_generator(rng_backend, random_seed)
+        self.rng = rng
+        self.row = np.zeros(group_size, dtype=np.int64)
+
+    def get_rolls(self, roll_num, runs):
+        places = runs % self.group_size
+        # Only the places that still have a run going are drawn
+        drawn = np.zeros(self.group_size, dtype=bool)
+        drawn[places] = True
+        self.row[drawn] = self.rng.integers(0, 10000,
+                                            size=np.count_nonzero(drawn))
+
+        return self.row[places]
@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from primediceSim.account import Account
+from primediceSim.cli import NullProgress
+from primediceSim.configuration import Configuration
+from primediceSim.histories import BalanceHistories
+from primediceSim.simulation import Simulation, AverageResults
+
+# Change this whenever the layout of the saved benchmark results changes
+RESULTS_VERSION = 1
+
+# Payouts and loss adders that keep every bet a whole number, so that every run
+# ends. A small balance gives short runs and a large one gives long runs.
+PAYOUTS = [2, 3]
+LOSS_ADDERS = [100, 200]
+BALANCES = [50, 2000]
+
+# Payouts, loss adders and balances at which wins are rare and losing streaks
+# long, where the streak engine should be far faster than rolling every roll.
+# None of the cases above has a win chance low enough for it to draw streaks.
+RARE_WIN_CASES = [(50, 5, 5000), (12, 10, 500)]
+
+# The modules whose import time is measured, and the large dependencies that
+# none of them should load on their own
+STARTUP_MODULES = ["primediceSim.configuration", "primediceSim.account",
+                   "primediceSim.simulation", "primediceSim.cli"]
+HEAVY_MODULES = ["numpy", "tkinter", "matplotlib"]
+
+# Time one import in a fresh interpreter, and list the heavy modules it loaded
+IMPORT_CODE = """
+import json, sys, time
+start_time = time.perf_counter()
+import %s
+seconds = time.perf_counter() - start_time
+print(json.dumps({"seconds": seconds,
+                  "heavy_modules": [name for name in %r if name in
+                                    sys.modules]}))
+"""
+
+
+def measure(function, track_memory=True):
+    """Call the function and return how long it took, its result, and the
+    largest amount of memory it had allocated at once, in bytes.
+    The function is called a second time to measure the memory, since
+    tracing allocations slows it down.
+    """
+
+    # Simulation.run prints its settings and results, which would drown out
+    # the benchmark's output
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start_time
+
+        peak_bytes = None
+        if track_memory:
+            tracemalloc.start()
+            function()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return seconds, result, peak_bytes
+
+
+def make_phase(seconds, peak_bytes, rolls=None):
+    """Return the record of one measured phase"""
+
+    phase = {"seconds": seconds, "peak_bytes": peak_bytes}
+    if rolls is not None:
+        phase["rolls_per_second"] = rolls / seconds if seconds else None
+
+    return phase
+
+
+def benchmark_case(payout, loss_adder, balance, iterations, random_seed=0,
+                   engines=("python", "hot", "streak", "batch"),
+                   track_memory=True):
+    """Time every phase of simulating one configuration and return a record
+    of the results
+    """
+
+    config = Configuration(base_bet=1, payout=payout, iterations=iterations,
+                           loss_adder=loss_adder)
+    account = Account(balance)
+    phases = {}
+
+    def single_sims():
+        simulation = Simulation(config, account, random_seed=random_seed)
+        return [simulation.single_sim() for _ in range(iterations)]
+
+    seconds, results_list, peak_bytes = measure(single_sims, track_memory)
+    rolls = sum(result.get_rolls_until_bankrupt() for result in results_list)
+    phases["single_sim"] = make_phase(seconds, peak_bytes, rolls)
+
+    for engine in engines:
+        def run():
+            simulation = Simulation(config, account, random_seed=random_seed)
+            progress = NullProgress()
+            return simulation.run(progress, progress, engine=engine)
+
+        seconds, _, peak_bytes = measure(run, track_memory)
+        # Every engine simulates runs of the same lengths on average, so
+        # the rolls of the single_sim phase give a fair rate for each one
+        phases["run_" + engine] = make_phase(seconds, peak_bytes, rolls)
+
+    # How many times faster each engine ran than simulating every run with
+    # single_sim
+    speedups = {engine: phases["single_sim"]["seconds"] /
+                phases["run_" + engine]["seconds"] for engine in engines if
+                phases["run_" + engine]["seconds"]}
+
+    seconds, _, peak_bytes = measure(
+        lambda: AverageResults(results_list), track_memory)
+    phases["average_results"] = make_phase(seconds, peak_bytes)
+
+    histories = BalanceHistories.from_lists(
+        [result.get_balances() for result in results_list])
+    seconds, _, peak_bytes = measure(histories.find_average_balances,
+                                     track_memory)
+    phases["average_balances"] = make_phase(seconds, peak_bytes)
+    seconds, _, peak_bytes = measure(histories.find_median_balances,
+                                     track_memory)
+    phases["median_balances"] = make_phase(seconds, peak_bytes)
+
+    return {
+        "name": "payout=%s loss_adder=%s balance=%s" % (payout, loss_adder,
+                                                      balance),
+        "payout": payout,
+        "loss_adder": loss_adder,
+        "balance": balance,
+        "iterations": iterations,
+        "rolls": rolls,
+        "phases": phases,
+        "speedups": speedups,
+    }
+
+
+def measure_import(module, repeats=5):
+    """Import the module in fresh interpreters and return the fastest import
+    time, and the heavy modules that the import loaded
+    """
+
+    # Run from the directory holding the package, so it can be imported
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__)))
+    measurements = []
+    for _ in range(repeats):
+        output = subprocess.check_output(
+            [sys.executable, "-c", IMPORT_CODE % (module, HEAVY_MODULES)],
+            cwd=package_parent)
+        measurements.append(json.loads(output.decode()))
+
+    return {
+        "seconds": min(measurement["seconds"] for measurement in
+                       measurements),
+        "heavy_modules": measurements[0]["heavy_modules"],
+    }
+
+
+def benchmark_startup(modules=STARTUP_MODULES, repeats=5):
+    """Measure the import time of each module, as a case that can be
+    compared like any other
+    """
+
+    return {
+        "name": "startup",
+        "phases": {"import " + module: measure_import(module, repeats) for
+                   module in modules},
+    }
+
+
+def run_benchmarks(iterations=100, payouts=PAYOUTS, loss_adders=LOSS_ADDERS,
+                   balances=BALANCES, rare_win_cases=RARE_WIN_CASES,
+                   random_seed=0,
+                   engines=("python", "hot", "streak", "batch"),
+                   track_memory=True, startup=True, progress=None):
+    """Benchmark every combination of the given settings and return the
+    results, ready to be saved as JSON.
+    rare_win_cases - (payout, loss_adder, balance) cases that are benchmarked
+    after the combinations
+    startup - also measure how long the package takes to import
+    progress - optional function that is given the name of each finished case
+    """
+
+    cases = []
+    if startup:
+        cases.append(benchmark_startup())
+        if progress is not None:
+            progress("startup")
+    for payout, loss_adder, balance in itertools.chain(itertools.product(
+            payouts, loss_adders, balances), rare_win_cases):
+        case = benchmark_case(payout, loss_adder, balance, iterations,
+                              random_seed=random_seed, engines=engines,
+                              track_memory=track_memory)
+        cases.append(case)
+        if progress is not None:
+            progress(case["name"])
+
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "iterations": iterations,
+        "random_seed": random_seed,
+        "cases": cases,
+    }
+
+
+def compare(baseline, current, tolerance=0.2, min_seconds=0.01):
+    """Compare benchmark results against a baseline and return a message for
+    every phase that became slower or used more memory by more than the
+    tolerance, as a fraction of the baseline.
+    min_seconds - ignore phases that slowed down by less than this, since the
+    timings of very short phases are mostly noise
+    """
+
+    baseline_cases = {case["name"]: case for case in baseline["cases"]}
+    regressions = []
+
+    for case in current["cases"]:
+        baseline_case = baseline_cases.get(case["name"])
+        if baseline_case is None:
+            continue
+
+        for phase_name, phase in sorted(case["phases"].items()):
+            baseline_phase = baseline_case["phases"].get(phase_name)
+            if baseline_phase is None:
+                continue
+
+            new_heavy_modules = set(phase.get("heavy_modules", [])) - set(
+                baseline_phase.get("heavy_modules", []))
+            if new_heavy_modules:
+                regressions.append("%s, %s: now imports %s" % (
+                    case["name"], phase_name,
+                    ", ".join(sorted(new_heavy_modules))))
+
+            for measurement in ("seconds", "peak_bytes"):
+                old = baseline_phase.get(measurement)
+                new = phase.get(measurement)
+                if old is None or new is None:
+                    continue
+                if measurement == "seconds" and new - old < min_seconds:
+                    continue
+                if new > old * (1 + tolerance):
+                    regressions.append(
+                        "%s, %s: %s went from %.6g to %.6g (%+.0f%%)" % (
+                            case["name"], phase_name, measurement, old, new,
+                            (new / old - 1) * 100 if old else float("inf")))
+
+    return regressions
+
+
+def save_results(results, path):
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=4)
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def check_startup(max_seconds):
+    """Print the import time of each module, and return 1 if any of them
+    took longer than max_seconds or loaded a heavy module, and 0 otherwise
+    """
+
+    failed = False
+    for module in STARTUP_MODULES:
+        measurement = measure_import(module)
+        print("[Startup] %s: %.4f seconds" % (module, measurement["seconds"]))
+        if measurement["seconds"] > max_seconds:
+            print("[Regression] %s took longer than %s seconds to import" %
+                  (module, max_seconds))
+            failed = True
+        if measurement["heavy_modules"]:
+            print("[Regression] %s imports %s" % (
+                module, ", ".join(measurement["heavy_modules"])))
+            failed = True
+
+    return 1 if failed else 0
+
+
+def main(args=None):
+    """Run the benchmarks, check the import time, or compare two sets of
+    saved results from the command line. Return 1 if a regression was found
+    and 0 otherwise.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the simulation engines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", default="benchmark.json",
+                            help="file to save the results to")
+    run_parser.add_argument("--iterations", type=int, default=100)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--no-memory", action="store_true",
+                            help="skip measuring peak memory")
+    run_parser.add_argument("--baseline",
+                            help="saved results to compare the new ones to")
+    run_parser.add_argument("--tolerance", type=float, default=0.2)
+    run_parser.add_argument("--min-seconds", type=float, default=0.01)
+
+    run_parser.add_argument("--no-startup", action="store_true",
+                            help="skip measuring the import time")
+
+    startup_parser = commands.add_parser(
+        "startup", help="check how long the package takes to import")
+    startup_parser.add_argument("--max-seconds", type=float, default=0.2,
+                                help="the longest any module may take to "
+                                     "import")
+
+    compare_parser = commands.add_parser(
+        "compare", help="compare saved results against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.2)
+    compare_parser.add_argument("--min-seconds", type=float, default=0.01)
+
+    args = parser.parse_args(args)
+
+    if args.command == "startup":
+        return check_startup(args.max_seconds)
+
+    if args.command == "run":
+        current = run_benchmarks(
+            iterations=args.iterations, random_seed=args.seed,
+            track_memory=not args.no_memory, startup=not args.no_startup,
+            progress=lambda name: print("[Benchmark] Finished " + name))
+        save_results(current, args.output)
+        print("[Benchmark] Results saved to " + args.output)
+        if args.baseline is None:
+            return 0
+        baseline = load_results(args.baseline)
+    else:
+        baseline = load_results(args.baseline)
+        current = load_results(args.current)
+
+    regressions = compare(baseline, current, args.tolerance,
+                          args.min_seconds)
+    for regression in regressions:
+        print("[Regression] " + regression)
+    if not regressions:
+        print("[Benchmark] No regressions found")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from primediceSim.parallel import run_parallel
+from primediceSim.sketch import BalanceSketch
+
+# Change this whenever the same settings and seed would give different results,
+# so that results from older versions are no longer used
+ENGINE_VERSION = 1
+
+
+def optional_float(value):
+    """Return the value as a float, or None if it is None"""
+
+    if value is None:
+        return None
+    return float(value)
+
+
+class ResultCache:
+    """Keep the results of seeded simulations on disk, so that running the
+    same settings again returns at once, and running more iterations of them
+    only simulates the extra runs.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        """directory - where the results are kept
+        max_bytes - once the results take up more than this, the least
+        recently used ones are removed
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(config, balance, random_seed, engine, chunk_size,
+                 track_medians, median_error, rng_backend="compat"):
+        """Return a hash of everything that the results depend on, apart from
+        the number of iterations
+        """
+
+        settings = {
+            # Numbers are stored as floats so that 2 and 2.0 give the same key
+            "base_bet": float(config.get_base_bet()),
+            "payout": float(config.get_payout()),
+            "loss_adder": float(config.get_loss_adder()),
+            "max_rolls": config.get_max_rolls(),
+            "take_profit": optional_float(config.get_take_profit()),
+            "stop_loss": optional_float(config.get_stop_loss()),
+            "strategy": {
+                name: value if isinstance(value, str) else
+                optional_float(value) for name, value in
+                config.get_strategy().describe().items()},
+            "balance": float(balance),
+            "random_seed": random_seed,
+            "engine": engine,
+            "rng_backend": rng_backend,
+            "chunk_size": chunk_size,
+            "track_medians": track_medians,
+            "median_error": median_error,
+            "engine_version": ENGINE_VERSION,
+        }
+        text = json.dumps(settings, sort_keys=True)
+
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, key, iterations):
+        """Return the file that holds the results of a key and iteration
+        count
+        """
+
+        return os.path.join(self.directory, "%s-%d.pkl" % (key, iterations))
+
+    def cached_iterations(self, key):
+        """Return every iteration count that has results for the key"""
+
+        iteration_counts = []
+        for path in glob.glob(os.path.join(self.directory, key + "-*.pkl")):
+            name = os.path.basename(path)[:-len(".pkl")]
+            iteration_counts.append(int(name.rsplit("-", 1)[1]))
+
+        return sorted(iteration_counts)
+
+    def load(self, key, iterations):
+        """Return the cached PartialResults for a key and iteration count, or
+        None if there are none
+        """
+
+        path = self.path(key, iterations)
+        try:
+            with open(path, "rb") as result_file:
+                partial_results = pickle.load(result_file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        # Mark the results as recently used
+        os.utime(path)
+
+        return partial_results
+
+    def store(self, key, iterations, partial_results):
+        """Save the PartialResults for a key and iteration count, then make
+        room if the cache has grown too large
+        """
+
+        partial_results.count_pending()
+
+        # Write to a temporary file first, so that a half-written file is
+        # never read back
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(file_descriptor, "wb") as result_file:
+            pickle.dump(partial_results, result_file)
+        os.replace(temp_path, self.path(key, iterations))
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the cache is no
+        larger than max_bytes
+        """
+
+        paths = glob.glob(os.path.join(self.directory, "*.pkl"))
+        paths.sort(key=os.path.getmtime)
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+
+        for path in paths:
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= os.path.getsize(path)
+            os.remove(path)
+
+    def run(self, config, account, random_seed, engine="python", workers=None,
+            chunk_size=1000, track_medians=True, median_error=None,
+            progress=None, rng_backend="compat"):
+        """Return the PartialResults of config.get_iterations() runs, taken
+        from the cache where possible. Simulations without a seed are not
+        repeatable, so they are always simulated and never stored.
+        """
+
+        sketch = None
+        if median_error is not None:
+            sketch = BalanceSketch(median_error)
+
+        if random_seed is None:
+            return run_parallel(config, account, workers=workers,
+                                chunk_size=chunk_size, engine=engine,
+                                track_medians=track_medians, sketch=sketch,
+                                progress=progress, rng_backend=rng_backend)
+
+        key = self.make_key(config, account.get_balance(), random_seed,
+                            engine, chunk_size, track_medians, median_error,
+                            rng_backend)
+        iterations = config.get_iterations()
+
+        partial_results = self.load(key, iterations)
+        if partial_results is not None:
+            return partial_results
+
+        # Continue from the most runs that were simulated before, as long as
+        # they end on a whole chunk, so the chunks that follow are the same
+        # ones that a fresh run would simulate
+        done = 0
+        for cached_iterations in self.cached_iterations(key):
+            if cached_iterations < iterations and \
+                    cached_iterations % chunk_size == 0:
+                done = cached_iterations
+
+        partial_results = None
+        if done:
+            partial_results = self.load(key, done)
+        if partial_results is None:
+            done = 0
+
+        remaining_config = config.replace(iterations=iterations - done)
+        partial_results = run_parallel(
+            remaining_config, account, random_seed=random_seed,
+            workers=workers, chunk_size=chunk_size, engine=engine,
+            track_medians=track_medians, sketch=sketch, progress=progress,
+            first_chunk=done // chunk_size, partial_results=partial_results,
+            rng_backend=rng_backend)
+
+        self.store(key, iterations, partial_results)
+
+        return partial_results
@@ -0,0 +1,390 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from primediceSim.account import Account
+from primediceSim.configuration import Configuration
+from primediceSim.instrumentation import Instrument, set_instrument
+from primediceSim.rolls import RNG_BACKENDS
+from primediceSim.simulation import Simulation
+from primediceSim.strategy import parse_strategy
+
+# The settings that can be given on the command line and in batch files, and
+# the values used when they are not
+DEFAULTS = {
+    "balance": 200,
+    "base_bet": 1,
+    "payout": 2,
+    "loss_adder": 100,
+    "iterations": 100,
+    "seed": None,
+    "engine": "hot",
+    "rng": "compat",
+    "workers": 0,
+    "max_rolls": None,
+    "take_profit": None,
+    "stop_loss": None,
+    "roll_budget": None,
+    "time_budget": None,
+    "precision": None,
+    "confidence": 0.95,
+    "strategy": None,
+}
+
+SUMMARY_FIELDS = ["balance", "base_bet", "payout", "loss_adder", "iterations",
+                  "seed", "engine", "max_rolls", "take_profit", "stop_loss",
+                  "average_rolls_until_bankrupt", "overall_average_balance",
+                  "num_of_rolls", "censored_runs", "average_final_balance",
+                  "iterations_used"]
+
+
+class NullProgress:
+    """Stand in for both the progress bar and the screen of the GUI"""
+
+    def step(self, amount):
+        pass
+
+    def update(self):
+        pass
+
+
+def parse_number(text):
+    """Turn text into an int when it is a whole number, and a float
+    otherwise, so whole bets behave exactly as they do in the GUI
+    """
+
+    number = float(text)
+    if number.is_integer() and "." not in text and "e" not in text.lower():
+        return int(number)
+    return number
+
+
+def parse_balances(text):
+    """Turn comma separated text into a list of starting balances, each of
+    which can only be given once
+    """
+
+    balances = [int(balance) for balance in text.split(",")]
+    if len(set(balances)) != len(balances):
+        raise ValueError("Each starting balance can only be given once")
+
+    return balances
+
+
+def parse_setting(name, value):
+    """Turn a setting read from a CSV batch file into the right type"""
+
+    if value is None or value == "":
+        return None
+    if name in ("engine", "strategy", "rng"):
+        return value
+    if name in ("iterations", "workers", "seed", "max_rolls",
+                "roll_budget"):
+        return int(value)
+    if name in ("time_budget", "precision", "confidence"):
+        return float(value)
+    return parse_number(value)
+
+
+def load_batch(path):
+    """Read the settings of every configuration in a batch file. The file is
+    either a JSON list of objects or a CSV file with a header row, and holds
+    any of the settings in DEFAULTS.
+    """
+
+    with open(path, newline="") as batch_file:
+        if path.endswith(".json"):
+            configurations = json.load(batch_file)
+        else:
+            configurations = [
+                {name: parse_setting(name, value) for name, value in
+                 row.items()} for row in csv.DictReader(batch_file)]
+
+    for settings in configurations:
+        unknown = set(settings) - set(DEFAULTS)
+        if unknown:
+            raise ValueError("Unknown settings in batch file: %s" %
+                             ", ".join(sorted(unknown)))
+
+    return configurations
+
+
+def make_configuration(settings):
+    """Make the Configuration described by one set of settings"""
+
+    strategy = None
+    if settings["strategy"] is not None:
+        strategy = parse_strategy(settings["strategy"])
+
+    return Configuration(base_bet=settings["base_bet"],
+                         payout=settings["payout"],
+                         iterations=settings["iterations"],
+                         loss_adder=settings["loss_adder"],
+                         max_rolls=settings["max_rolls"],
+                         take_profit=settings["take_profit"],
+                         stop_loss=settings["stop_loss"],
+                         strategy=strategy)
+
+
+def simulate(settings, median_error=None, streaming=False):
+    """Run the simulations for one set of settings and return a summary of
+    the results, with the mean and median balance at each roll
+    """
+
+    config = make_configuration(settings)
+    simulation = Simulation(config, Account(settings["balance"]),
+                            random_seed=settings["seed"],
+                            rng_backend=settings["rng"])
+    progress = NullProgress()
+    results = simulation.run(progress, progress, engine=settings["engine"],
+                             workers=settings["workers"],
+                             streaming=streaming, median_error=median_error,
+                             roll_budget=settings["roll_budget"],
+                             time_budget=settings["time_budget"],
+                             precision=settings["precision"],
+                             confidence=settings["confidence"])
+
+    return summarize(settings, results)
+
+
+def simulate_bankrolls(settings, balances):
+    """Run the simulations for one set of settings from each of the starting
+    balances in one pass, and return a summary of the results of each
+    balance, in the same order
+    """
+
+    from primediceSim.bankrolls import BankrollSimulation
+
+    # The bankrolls are moved together by the batch engine, which always
+    # draws its rolls in blocks
+    rng_backend = "pcg64" if settings["rng"] == "compat" else settings["rng"]
+    bankroll_simulation = BankrollSimulation(
+        make_configuration(settings), balances, random_seed=settings["seed"],
+        rng_backend=rng_backend)
+    results = bankroll_simulation.run()
+    bankroll_simulation.print_results(results)
+
+    return [summarize(dict(settings, balance=balance, engine="batch"),
+                      results[balance]) for balance in balances]
+
+
+def summarize(settings, results):
+    """Return a summary of the results of one set of settings"""
+
+    summary = {name: settings[name] for name in DEFAULTS}
+    summary.update({
+        "average_rolls_until_bankrupt":
+            int(results.average_rolls_until_bankrupt),
+        "overall_average_balance": float(results.overall_average_balance),
+        "num_of_rolls": results.num_of_rolls,
+        # Runs stopped before bankruptcy make the average rolls a lower bound
+        "censored_runs": int(results.censored_runs),
+        "average_final_balance": int(results.average_final_balance),
+        "stop_counts": {reason: int(count) for reason, count in
+                        results.stop_counts.items()},
+        "iterations_used": results.number_of_results,
+        "average_balances": [int(balance) for balance in
+                             results.get_average_balances()],
+        # Streaming runs without a median error leave the medians empty
+        "median_balances": [int(balance) for balance in
+                            results.get_median_balances()],
+    })
+    if results.confidence_intervals is not None:
+        summary["precision_reached"] = results.precision_reached
+        summary["confidence_intervals"] = {
+            name: [float(low), float(high)] for name, (low, high) in
+            results.confidence_intervals.items()}
+
+    return summary
+
+
+def write_json(summaries, output):
+    json.dump({"results": summaries}, output, indent=4)
+    output.write("\n")
+
+
+def write_csv(summaries, output):
+    """Write one row for each roll of each configuration, with the summary of
+    its configuration repeated on every row
+    """
+
+    writer = csv.writer(output)
+    writer.writerow(["config"] + SUMMARY_FIELDS +
+                    ["roll", "average_balance", "median_balance"])
+    for config_num, summary in enumerate(summaries):
+        summary_values = [summary[name] for name in SUMMARY_FIELDS]
+        median_balances = summary["median_balances"]
+        for roll_num, average_balance in enumerate(
+                summary["average_balances"]):
+            # Medians stop once they reach 0, so later rolls have none
+            median_balance = ""
+            if roll_num < len(median_balances):
+                median_balance = median_balances[roll_num]
+            writer.writerow([config_num] + summary_values +
+                            [roll_num, average_balance, median_balance])
+
+
+def write_npz(summaries, path):
+    """Write one array for each summary field, with one value for each
+    configuration, and one array for each curve of each configuration
+    """
+
+    import numpy as np
+
+    arrays = {}
+    for name in SUMMARY_FIELDS:
+        values = [summary[name] for summary in summaries]
+        # Seeds and stop conditions may be missing, which numpy cannot store
+        # as a number
+        values = [-1 if value is None else value for value in values]
+        arrays[name] = np.array(values)
+    for config_num, summary in enumerate(summaries):
+        arrays["average_balances_%d" % config_num] = np.array(
+            summary["average_balances"], dtype=np.int64)
+        arrays["median_balances_%d" % config_num] = np.array(
+            summary["median_balances"], dtype=np.int64)
+
+    np.savez(path, **arrays)
+
+
+def write_results(summaries, path, output_format=None):
+    """Write the summaries to a file, or to stdout if the path is "-". The
+    format is taken from the file extension unless it is given.
+    """
+
+    if output_format is None:
+        output_format = os.path.splitext(path)[1][1:] or "json"
+
+    if output_format == "npz":
+        if path == "-":
+            raise ValueError("NPZ results cannot be written to stdout")
+        write_npz(summaries, path)
+    elif output_format in ("json", "csv"):
+        write = write_json if output_format == "json" else write_csv
+        if path == "-":
+            write(summaries, sys.stdout)
+        else:
+            with open(path, "w", newline="") as output:
+                write(summaries, output)
+    else:
+        raise ValueError("Unknown output format: %s" % output_format)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description="Simulate the primedice auto-better without the GUI")
+    parser.add_argument("--balance", type=int)
+    parser.add_argument("--base-bet", type=parse_number)
+    parser.add_argument("--payout", type=parse_number)
+    parser.add_argument("--loss-adder", type=parse_number)
+    parser.add_argument("--iterations", type=int)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--engine",
+                        choices=["python", "hot", "streak", "batch"])
+    parser.add_argument("--rng", choices=RNG_BACKENDS,
+                        help="how rolls are drawn: compat gives the same "
+                             "rolls as earlier versions, pcg64 and philox "
+                             "draw them in blocks with numpy")
+    parser.add_argument("--workers", type=int,
+                        help="processes to split the runs across, or 0 to "
+                             "run everything in this process")
+    parser.add_argument("--strategy",
+                        help="betting strategy instead of the loss adder, "
+                             "such as fibonacci, dalembert:step=2, "
+                             "paroli:target_wins=3 or "
+                             "percent:on_win=none,on_loss=100,reset_after=5")
+    parser.add_argument("--max-rolls", type=int,
+                        help="stop each run after this many rolls")
+    parser.add_argument("--take-profit", type=parse_number,
+                        help="stop a run once its balance reaches this")
+    parser.add_argument("--stop-loss", type=parse_number,
+                        help="stop a run once its balance falls to this")
+    parser.add_argument("--roll-budget", type=int,
+                        help="the most rolls to make over every run of a "
+                             "configuration")
+    parser.add_argument("--time-budget", type=float,
+                        help="the most seconds to spend simulating each "
+                             "configuration")
+    parser.add_argument("--precision", type=float,
+                        help="run until the confidence intervals of the "
+                             "averages are within this fraction of them, "
+                             "with --iterations as the most runs")
+    parser.add_argument("--confidence", type=float,
+                        help="confidence level of the intervals, between 0 "
+                             "and 1")
+    parser.add_argument("--batch",
+                        help="JSON or CSV file listing the settings of many "
+                             "configurations, with the other options used "
+                             "for any settings it leaves out")
+    parser.add_argument("--balances", type=parse_balances,
+                        help="comma separated starting balances to simulate "
+                             "together in one pass with the same rolls, "
+                             "such as 100,200,500, instead of --balance")
+    parser.add_argument("--median-error", type=float,
+                        help="find medians approximately, to within this "
+                             "fraction of each balance")
+    parser.add_argument("--streaming", action="store_true",
+                        help="keep running totals instead of every run")
+    parser.add_argument("--output", default="-",
+                        help="file to write the results to, or - for stdout")
+    parser.add_argument("--format", choices=["json", "csv", "npz"],
+                        help="output format, taken from the output file's "
+                             "extension if not given")
+
+    return parser
+
+
+def main(args=None):
+    """Run the simulations described on the command line and write their
+    results
+    """
+
+    parser = make_parser()
+    args = parser.parse_args(args)
+    if args.balances is not None and (
+            args.workers or args.roll_budget is not None or
+            args.time_budget is not None or args.precision is not None):
+        parser.error("--balances cannot be combined with workers, budgets "
+                     "or a precision")
+
+    # Settings given on the command line replace the defaults, and settings
+    # in a batch file replace both
+    base_settings = dict(DEFAULTS)
+    for name in DEFAULTS:
+        value = getattr(args, name)
+        if value is not None:
+            base_settings[name] = value
+
+    if args.batch is None:
+        configurations = [{}]
+    else:
+        configurations = load_batch(args.batch)
+
+    # The simulations report their settings and results as messages, which
+    # are printed to stderr so that they do not mix with results written to
+    # stdout
+    previous_instrument = set_instrument(Instrument(message_output=sys.stderr))
+    try:
+        summaries = []
+        for config_settings in configurations:
+            settings = dict(base_settings)
+            settings.update({name: value for name, value in
+                             config_settings.items() if value is not None})
+
+            if args.balances is None:
+                summaries.append(simulate(settings, args.median_error,
+                                          args.streaming))
+            else:
+                summaries.extend(simulate_bankrolls(settings, args.balances))
+    finally:
+        set_instrument(previous_instrument)
+
+    write_results(summaries, args.output, args.format)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
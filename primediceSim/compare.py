@@ -0,0 +1,188 @@
+import math
+
+import numpy as np
+
+from primediceSim.aggregate import confidence_interval
+from primediceSim.batch import AntitheticRolls, BatchEngine, SharedRolls
+from primediceSim.instrumentation import get_instrument
+
+# The measurements of each run that are compared
+METRICS = ["rolls_until_bankrupt", "average_balance", "final_balance"]
+
+
+def find_run_metrics(histories):
+    """Return the rolls until bankruptcy, the average balance and the final
+    balance of every run in a BalanceHistories, as arrays
+    """
+
+    lengths = histories.get_lengths()
+    offsets = np.asarray(histories.offsets, dtype=np.int64)
+    balances = histories.balances[:histories.size()]
+
+    # Every history holds at least the starting balance, so no run is empty
+    return {
+        "rolls_until_bankrupt": (lengths - 1).astype(np.float64),
+        "average_balance": np.add.reduceat(balances, offsets[:-1]) / lengths,
+        "final_balance": balances[offsets[1:] - 1].astype(np.float64),
+    }
+
+
+def apply_control(values, controls):
+    """Remove the part of each value that its control variate explains. The
+    controls have an expected value of zero, so the adjusted values have the
+    same expected value and, when the two are related, a smaller variance.
+    """
+
+    variance = np.var(controls)
+    if variance == 0:
+        return values
+
+    slope = np.mean((values - values.mean()) * controls) / variance
+    return values - slope * controls
+
+
+class Comparison:
+    """Estimate how much two configurations differ when played from the same
+    account, using far fewer runs than comparing two independent simulations
+    would need.
+    Each run of one configuration is paired with a run of the other, and the
+    differences within pairs are averaged. Three ways of making those
+    differences less noisy can be combined:
+
+    common rolls - both runs of a pair are given the same rolls, so luck that
+    helps one configuration tends to help the other too and cancels out of
+    their difference
+    antithetic - half of the runs are given the mirror image of the rolls of
+    the other half, and each run is averaged with its mirror image
+    control variates - the gap between what each run's wins paid and what the
+    win chance says they should have paid on the same bets is known to
+    average to zero, so the part of each measurement that follows it is
+    removed
+    """
+
+    def __init__(self, config_a, config_b, account, random_seed=None,
+                 common_rolls=True, antithetic=False, control_variates=False,
+                 confidence=0.95, rng_backend="pcg64", instrument=None):
+        """confidence - the confidence level of the intervals, between 0 and
+        1
+        rng_backend - the bit generator to draw the rolls with, one of
+        RNG_BACKENDS from the rolls module
+        instrument - optional Instrument that the results are sent through as
+        messages. The default instrument is used if it is not given.
+        """
+        self.config_a = config_a
+        self.config_b = config_b
+        self.account = account
+        self.random_seed = random_seed
+        self.common_rolls = common_rolls
+        self.antithetic = antithetic
+        self.control_variates = control_variates
+        self.confidence = confidence
+        self.rng_backend = rng_backend
+        self.instrument = instrument
+
+    def run(self, iterations):
+        """Simulate about iterations runs of each configuration and return,
+        for each of METRICS, a dictionary with the mean of each
+        configuration, their difference, the confidence interval and standard
+        error of the difference, and how many times smaller its variance is
+        than comparing two independent simulations of the same size would
+        give
+        """
+
+        if self.antithetic:
+            # Every run has a mirror image, so there are always an even number
+            pair_count = max(math.ceil(iterations / 2), 1)
+        else:
+            pair_count = max(iterations, 1)
+
+        seed_a, seed_b = np.random.SeedSequence(self.random_seed).spawn(2)
+        rolls_a = SharedRolls(pair_count, random_seed=seed_a,
+                              rng_backend=self.rng_backend)
+        rolls_b = rolls_a
+        if not self.common_rolls:
+            rolls_b = SharedRolls(pair_count, random_seed=seed_b,
+                                  rng_backend=self.rng_backend)
+
+        units_a, plain_a = self.simulate(self.config_a, rolls_a, pair_count)
+        units_b, plain_b = self.simulate(self.config_b, rolls_b, pair_count)
+
+        comparison = {}
+        for metric in METRICS:
+            differences = units_a[metric] - units_b[metric]
+            low, high = confidence_interval(
+                differences.sum(), np.square(differences).sum(),
+                differences.size, self.confidence)
+
+            standard_error = math.inf
+            variance_reduction = 1.0
+            if differences.size > 1:
+                standard_error = math.sqrt(np.var(differences, ddof=1) /
+                                           differences.size)
+                # Two independent simulations with the same number of runs
+                independent_variance = \
+                    np.var(plain_a[metric], ddof=1) / plain_a[metric].size + \
+                    np.var(plain_b[metric], ddof=1) / plain_b[metric].size
+                variance_reduction = math.inf
+                if standard_error > 0:
+                    variance_reduction = independent_variance / \
+                        standard_error ** 2
+
+            comparison[metric] = {
+                "mean_a": float(units_a[metric].mean()),
+                "mean_b": float(units_b[metric].mean()),
+                "difference": float(differences.mean()),
+                "interval": (float(low), float(high)),
+                "standard_error": float(standard_error),
+                "variance_reduction": float(variance_reduction),
+            }
+
+        return comparison
+
+    def simulate(self, config, shared_rolls, pair_count):
+        """Simulate the runs of one configuration with the given rolls.
+        Return the value that each pair contributes for each metric, and the
+        plain measurements of every run.
+        """
+
+        streams = [shared_rolls]
+        if self.antithetic:
+            streams.append(AntitheticRolls(shared_rolls))
+
+        plain = {metric: [] for metric in METRICS}
+        controls = []
+        for rolls in streams:
+            batch_engine = BatchEngine(config, self.account,
+                                       shared_rolls=rolls,
+                                       track_controls=self.control_variates)
+            run_metrics = find_run_metrics(batch_engine.run(pair_count))
+            for metric in METRICS:
+                plain[metric].append(run_metrics[metric])
+            controls.append(batch_engine.controls)
+
+        units = {}
+        for metric in METRICS:
+            values = np.concatenate(plain[metric])
+            plain[metric] = values
+            if self.control_variates:
+                values = apply_control(values, np.concatenate(controls))
+            # Each run is averaged with its mirror image, which is the run in
+            # the same place in the other stream
+            units[metric] = values.reshape(len(streams), pair_count).mean(
+                axis=0)
+
+        return units, plain
+
+    def print_results(self, comparison):
+        """Print out a comparison returned by run with explaining labels,
+        through the instrument's messages
+        """
+
+        message = get_instrument(self.instrument).message
+        for metric, row in comparison.items():
+            low, high = row["interval"]
+            message("[Results] %s: %.2f vs %.2f, difference %.2f (%.2f to "
+                    "%.2f), variance %.1fx smaller than independent runs" % (
+                        metric.replace("_", " ").capitalize(), row["mean_a"],
+                        row["mean_b"], row["difference"], low, high,
+                        row["variance_reduction"]))
@@ -1,27 +1,65 @@
 import decimal
+import functools
 
+from primediceSim.instrumentation import get_instrument
+from primediceSim.strategy import Martingale
+from primediceSim.streaks import find_bet_ladder
 
-class Configuration:
-    """Contain all of the configurations of the different options that the
-    primedice auto-better provides.
+# The reasons that a run can stop for. Runs that stop for any reason other
+# than bankruptcy are censored: they could have gone on for longer.
+STOP_REASONS = ["bankrupt", "max_rolls", "take_profit", "stop_loss", "budget"]
+
+
+@functools.lru_cache(maxsize=4096)
+def find_roll_under_value(payout):
+    """Find the win chance that primedice will use with a given win payout.
+    It is kept for each payout, since configurations are often made by the
+    thousand with only a few different payouts.
     """
 
-    def __init__(self, base_bet, payout, iterations=100, loss_adder=100):
-        """These are the different settings that can be given to the auto-better.
-        All of the values should be given as they are on the primedice screen.
-        payout - float multiplier between 1.01202 and 9900
-        loss_adder_percent - percent given as integer between 0 and 100.
-        """
-        self.base_bet = base_bet
+    # The equation used was found from taking data points from the
+    # primedice website and calculating the line of best fit. It is a power
+    # function, following the form f(x) = kx^n where x is the win payout
+    # and f(x) is the win chance that primedice allows. Apparently, they
+    # have chosen to make k = 98.998 and n = .99999 This way, with a high
+    # win payout, the chance of winning is low. At the same time, with a
+    # low win payout, the chance of winning is much higher.
+    decimal_places = 2
+    win_chance = decimal.Decimal(98.998 * (payout ** -.99999))
+    rounded_win_chance = round(win_chance, decimal_places)
 
-        self.payout = payout
+    return rounded_win_chance
 
-        self.loss_adder = loss_adder
 
-        # Turn the user-given percent into a decimal
-        self.loss_adder_decimal = self.loss_adder / 100
-        self.roll_under_value = self.calc_roll_under_value()
-        self.iterations = iterations
+@functools.lru_cache(maxsize=4096)
+def find_roll_under_threshold(roll_under_value):
+    """Find the number of whole rolls, counted in hundredths from 0 to 9999,
+    that win with the given roll under value
+    """
+
+    # Rolls are compared as floats (r / 100) against the exact decimal
+    # roll under value, so the roll that lands right on the value only
+    # wins if its float representation happens to fall below it.
+    threshold = int(roll_under_value * 100)
+    if threshold / 100 < roll_under_value:
+        threshold += 1
+
+    return min(max(threshold, 0), 10000)
+
+
+# The settings that a configuration is made from, in the order its
+# constructor takes them
+SETTINGS = ["base_bet", "payout", "iterations", "loss_adder", "max_rolls",
+            "take_profit", "stop_loss", "strategy"]
+
+
+class ConfigurationBase:
+    """The ways of looking at the settings that Configuration and
+    FrozenConfiguration share. Both keep the same attributes, so either can
+    be given to a simulation.
+    """
+
+    __slots__ = ()
 
     def calc_roll_under_value(self):
         """Find the win chance that primedice will use with a given win payout.
@@ -29,18 +67,15 @@ class Configuration:
 
         self.check_valid_payout()
 
-        # The equation used was found from taking data points from the
-        # primedice website and calculating the line of best fit. It is a power
-        # function, following the form f(x) = kx^n where x is the win payout
-        # and f(x) is the win chance that primedice allows. Apparently, they
-        # have chosen to make k = 98.998 and n = .99999 This way, with a high
-        # win payout, the chance of winning is low. At the same time, with a
-        # low win payout, the chance of winning is much higher.
-        decimal_places = 2
-        win_chance = decimal.Decimal(98.998 * (self.payout ** -.99999))
-        rounded_win_chance = round(win_chance, decimal_places)
+        return find_roll_under_value(self.payout)
 
-        return rounded_win_chance
+    def calc_roll_under_threshold(self):
+        """Find the number of whole rolls, counted in hundredths from 0 to
+        9999, that win with the current roll under value.
+        A roll of r wins exactly when r < threshold.
+        """
+
+        return find_roll_under_threshold(self.roll_under_value)
 
     def check_valid_payout(self):
         """Ensure that the given payout is allowed by the site.
@@ -58,13 +93,149 @@ class Configuration:
         if payout_minimum <= self.payout <= payout_maximum:
             valid = True
         else:
-            print("[WARNING] Payout value entered was not within the range"
-                  " allowed by PrimeDice")
+            message = get_instrument().message
+            message("[WARNING] Payout value entered was not within the range"
+                    " allowed by PrimeDice")
             valid = False
-            print(self.payout)
+            message(str(self.payout))
 
         return valid
 
+    def get_base_bet(self):
+        """Return the current base bet"""
+        return self.base_bet
+
+    def get_loss_adder(self):
+        """Return the current loss adder as a percent"""
+        return self.loss_adder
+
+    def get_loss_adder_decimal(self):
+        """Return the current loss adder as a percent"""
+        return self.loss_adder_decimal
+
+    def get_payout(self):
+        """Return the current payout"""
+        return self.payout
+
+    def get_iterations(self):
+        """Return the current iterations value"""
+        return self.iterations
+
+    def get_roll_under_value(self):
+        """Return the current roll under value"""
+        return self.roll_under_value
+
+    def get_roll_under_threshold(self):
+        """Return the current roll under value as a whole-roll threshold"""
+        return self.roll_under_threshold
+
+    def get_max_rolls(self):
+        """Return the most rolls a run may make, or None for no limit"""
+        return self.max_rolls
+
+    def get_take_profit(self):
+        """Return the balance that stops a run with a profit, or None"""
+        return self.take_profit
+
+    def get_stop_loss(self):
+        """Return the balance that stops a run with a loss, or None"""
+        return self.stop_loss
+
+    def get_strategy(self):
+        """Return the betting strategy, which is a Martingale with the loss
+        adder unless another one was given"""
+        if self.strategy is None:
+            return Martingale(self.loss_adder)
+        return self.strategy
+
+    def get_bet_ladder(self):
+        """Return the BetLadder of the base bet and the Martingale
+        strategy's loss adder, which is shared with every other configuration
+        that has the same two settings
+        """
+        strategy = self.get_strategy()
+        if type(strategy) is not Martingale:
+            raise ValueError("Only the martingale strategy has a bet ladder")
+        return find_bet_ladder(self.base_bet, strategy.loss_adder / 100)
+
+    def has_stop_conditions(self):
+        """Return True if any condition can stop a run before bankruptcy"""
+        return self.max_rolls is not None or self.take_profit is not None \
+            or self.stop_loss is not None
+
+    def find_stop_reason(self, balance, current_bet, rolls):
+        """Return the reason that a run with the given balance, next bet and
+        number of rolls made has to stop, or None if it can keep rolling.
+        Bankruptcy is checked first, so a run that can no longer afford its
+        bet always counts as bankrupt.
+        """
+
+        if balance < current_bet:
+            return "bankrupt"
+        if self.take_profit is not None and balance >= self.take_profit:
+            return "take_profit"
+        if self.stop_loss is not None and balance <= self.stop_loss:
+            return "stop_loss"
+        if self.max_rolls is not None and rolls >= self.max_rolls:
+            return "max_rolls"
+
+        return None
+
+    def get_settings(self):
+        """Return the settings that the configuration was made from, which
+        its constructor can use to make it again
+        """
+        return {name: getattr(self, name) for name in SETTINGS}
+
+    def replace(self, **changes):
+        """Return a new configuration of the same type, with the given
+        settings changed and the rest the same as this one's
+        """
+        return type(self)(**dict(self.get_settings(), **changes))
+
+    def freeze(self):
+        """Return a FrozenConfiguration with the same settings"""
+        return FrozenConfiguration(**self.get_settings())
+
+
+class Configuration(ConfigurationBase):
+    """Contain all of the configurations of the different options that the
+    primedice auto-better provides. The settings can be changed after the
+    configuration is made, as the GUI does.
+    """
+
+    def __init__(self, base_bet, payout, iterations=100, loss_adder=100,
+                 max_rolls=None, take_profit=None, stop_loss=None,
+                 strategy=None):
+        """These are the different settings that can be given to the auto-better.
+        All of the values should be given as they are on the primedice screen.
+        payout - float multiplier between 1.01202 and 9900
+        loss_adder_percent - percent given as integer between 0 and 100.
+        The stop conditions end a run early, and are all off when None:
+        max_rolls - the most rolls that a single run may make
+        take_profit - stop once the balance reaches this value or more
+        stop_loss - stop once the balance falls to this value or less
+        strategy - optional Strategy that decides each bet. Without one, the
+        bet goes back to the base bet after a win and increases by the loss
+        adder after a loss.
+        """
+        self.base_bet = base_bet
+
+        self.payout = payout
+
+        self.loss_adder = loss_adder
+
+        # Turn the user-given percent into a decimal
+        self.loss_adder_decimal = self.loss_adder / 100
+        self.roll_under_value = self.calc_roll_under_value()
+        self.roll_under_threshold = self.calc_roll_under_threshold()
+        self.iterations = iterations
+
+        self.max_rolls = max_rolls
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.strategy = strategy
+
     def set_base_bet(self, new_val):
         """Change the base_bet value to be the given input"""
         self.base_bet = new_val
@@ -74,6 +245,7 @@ class Configuration:
         self.payout = new_val
         # The roll under value changes with the payout
         self.roll_under_value = self.calc_roll_under_value()
+        self.roll_under_threshold = self.calc_roll_under_threshold()
 
     def set_iterations(self, new_val):
         """Change the iterations value to be the given input"""
@@ -87,26 +259,100 @@ class Configuration:
         # Turn the user-given percent into a decimal
         self.loss_adder_decimal = self.loss_adder / 100
 
-    def get_base_bet(self):
-        """Return the current base bet"""
-        return self.base_bet
+    def set_max_rolls(self, new_val):
+        """Change the most rolls a run may make, or None for no limit"""
+        self.max_rolls = new_val
 
-    def get_loss_adder(self):
-        """Return the current loss adder as a percent"""
-        return self.loss_adder
+    def set_take_profit(self, new_val):
+        """Change the balance that stops a run once it is reached, or None
+        to never stop on a profit"""
+        self.take_profit = new_val
 
-    def get_loss_adder_decimal(self):
-        """Return the current loss adder as a percent"""
-        return self.loss_adder_decimal
+    def set_stop_loss(self, new_val):
+        """Change the balance that stops a run once it falls to it, or None
+        to never stop on a loss"""
+        self.stop_loss = new_val
 
-    def get_payout(self):
-        """Return the current payout"""
-        return self.payout
+    def set_strategy(self, new_val):
+        """Change the betting strategy, or None to use the loss adder"""
+        self.strategy = new_val
 
-    def get_iterations(self):
-        """Return the current iterations value"""
-        return self.iterations
 
-    def get_roll_under_value(self):
-        """Return the current roll under value"""
-        return self.roll_under_value
+class FrozenConfiguration(ConfigurationBase):
+    """The same settings as a Configuration, which cannot be changed once it
+    is made. The roll under value and the loss adder decimal are found once,
+    and configurations with the same settings are equal and hash the same,
+    so they can be used as keys. Slots keep them small enough to make in
+    large numbers, for which from_columns is quickest.
+    """
+
+    __slots__ = SETTINGS + ["loss_adder_decimal", "roll_under_value",
+                            "roll_under_threshold"]
+
+    def __init__(self, base_bet, payout, iterations=100, loss_adder=100,
+                 max_rolls=None, take_profit=None, stop_loss=None,
+                 strategy=None):
+        """The settings are the same as those of Configuration"""
+        set_value = object.__setattr__
+        set_value(self, "base_bet", base_bet)
+        set_value(self, "payout", payout)
+        set_value(self, "iterations", iterations)
+        set_value(self, "loss_adder", loss_adder)
+        set_value(self, "max_rolls", max_rolls)
+        set_value(self, "take_profit", take_profit)
+        set_value(self, "stop_loss", stop_loss)
+        set_value(self, "strategy", strategy)
+
+        set_value(self, "loss_adder_decimal", loss_adder / 100)
+        set_value(self, "roll_under_value", self.calc_roll_under_value())
+        set_value(self, "roll_under_threshold",
+                  self.calc_roll_under_threshold())
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Make one configuration for each row of the given columns, which
+        map the names in SETTINGS to sequences or numpy arrays of equal
+        length. Settings that are left out take their default values.
+        """
+
+        unknown = set(columns) - set(SETTINGS)
+        if unknown:
+            raise ValueError("Unknown configuration settings: %s" %
+                             ", ".join(sorted(unknown)))
+
+        # numpy values are turned into plain numbers, so that they hash and
+        # print the same as the numbers a user would type
+        names = list(columns)
+        values = [column.tolist() if hasattr(column, "tolist") else
+                  list(column) for column in columns.values()]
+
+        return [cls(**dict(zip(names, row))) for row in zip(*values)]
+
+    def thaw(self):
+        """Return a Configuration with the same settings, which can be
+        changed
+        """
+
+        return Configuration(**self.get_settings())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A FrozenConfiguration cannot be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("A FrozenConfiguration cannot be changed")
+
+    def __reduce__(self):
+        # Copies and pickles are made again from the settings, since the
+        # attributes cannot be set one at a time
+        return type(self), tuple(getattr(self, name) for name in SETTINGS)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and \
+            self.get_settings() == other.get_settings()
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, name) for name in SETTINGS))
+
+    def __repr__(self):
+        return "FrozenConfiguration(%s)" % ", ".join(
+            "%s=%r" % item for item in self.get_settings().items())
@@ -4,14 +4,27 @@ from tkinter.ttk import *
 import matplotlib
 matplotlib.use("TkAgg")     # Allow matplotlib to work with Tkinter
 # Import MUST come after matplotlib.use() is called!!
-from matplotlib import pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+
+from primediceSim.instrumentation import get_instrument
+from primediceSim.worker import SimulationWorker
+
+# How often the window checks on a simulation running in the background
+POLL_MILLISECONDS = 100
 
 
 class Gui:
-    def __init__(self, simulation):
-        """Display the inputs for the configuration values and their values"""
+    def __init__(self, simulation, background=True):
+        """Display the inputs for the configuration values and their values.
+        background - run simulations on a background worker, so the window
+        keeps responding, the graphs fill in as runs finish, and the runs can
+        be cancelled. Otherwise the window waits for every run to finish.
+        """
 
         self.sim = simulation   # A starting simulation with default values
+        self.background = background
+        self.worker = None      # The background worker, while one is running
 
         self.master = Tk()
         self.master.title("Primedice Simulator")
@@ -29,10 +42,12 @@ class Gui:
             self.make_loss_adder_input()
 
         self.run_button = self.make_run_button()
+        self.cancel_button = self.make_cancel_button()
 
         self.progress_label, self.progress_bar = self.make_progress_bar()
 
-        self.graph_fig = self.make_graph()
+        self.graph_fig, self.graph_canvas, self.median_line, self.mean_line = \
+            self.make_graph()
         self.sim_results = None     # Placeholder for when results come in
 
         self.master.mainloop()
@@ -44,6 +59,10 @@ class Gui:
 
         self.update_settings()
 
+        if self.background:
+            self.start_worker()
+            return
+
         # Pass in the progress bar and the master so that the simulator can
         # update the progress bar and then refresh the screen when the progress
         # checkpoints are hit
@@ -51,6 +70,71 @@ class Gui:
         self.sim_results = self.sim.run(self.progress_bar, self.master)
         self.graph_results()
 
+    def start_worker(self):
+        """Start simulating on a background worker and begin checking on it
+        """
+
+        self.worker = SimulationWorker(self.sim.config, self.sim.account,
+                                       random_seed=self.sim.random_seed)
+        self.progress_bar.configure(value=0,
+                                    maximum=self.sim.config.get_iterations())
+        self.run_button.configure(state=DISABLED)
+        self.cancel_button.configure(state=NORMAL)
+
+        self.worker.start()
+        self.master.after(POLL_MILLISECONDS, self.poll_worker)
+
+    def poll_worker(self):
+        """Show any progress that the worker has sent, and check again later
+        until it is done
+        """
+
+        worker = self.worker
+        if worker is None:
+            return
+
+        for message in worker.get_messages():
+            kind = message[0]
+            if kind == "progress":
+                finished, average_balances, median_balances = message[1:]
+                self.progress_bar.configure(value=finished)
+                self.draw_graph(average_balances, median_balances)
+            elif kind == "finished":
+                self.sim_results = message[1]
+                self.sim_results.print_results()
+                self.progress_bar.configure(
+                    value=self.sim.config.get_iterations())
+                self.graph_results()
+                self.finish_worker()
+            elif kind == "cancelled":
+                get_instrument(self.sim.instrument).message(
+                    "[MESSAGE] Simulation cancelled after %d runs" %
+                    message[1])
+                self.finish_worker()
+            elif kind == "error":
+                get_instrument(self.sim.instrument).message(
+                    "[ERROR] Simulation failed: %s" % message[1])
+                self.finish_worker()
+
+        if self.worker is not None:
+            self.master.after(POLL_MILLISECONDS, self.poll_worker)
+
+    def cancel_simulator(self):
+        """Stop the background worker. The runs that are going are cut short
+        and left out, and no more are started.
+        """
+
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_button.configure(state=DISABLED)
+
+    def finish_worker(self):
+        """Let the user run the simulation again"""
+
+        self.worker = None
+        self.run_button.configure(state=NORMAL)
+        self.cancel_button.configure(state=DISABLED)
+
     def make_run_button(self):
         """Construct a button that runs the simulation"""
 
@@ -60,6 +144,18 @@ class Gui:
 
         return run_button
 
+    def make_cancel_button(self):
+        """Construct a button that stops a simulation running in the
+        background
+        """
+
+        cancel_button = Button(
+            self.master, text="Cancel", command=self.cancel_simulator,
+            state=DISABLED)
+        cancel_button.grid(row=6, column=0)
+
+        return cancel_button
+
     def make_balance_input(self):
         """Construct an input field for the balance value"""
 
@@ -150,51 +246,46 @@ class Gui:
         self.sim.config.set_iterations(int(self.iterations_str.get()))
         self.sim.config.set_loss_adder(int(self.loss_adder_str.get()))
 
-    @staticmethod
-    def make_graph():
+    def make_graph(self):
+        """Construct the median and mean graphs below the inputs. The lines
+        are kept so they can be redrawn as results come in.
+        """
 
-        fig = plt.figure()
+        fig = Figure()
         fig.subplots_adjust(hspace=.35)
 
-        return fig
-
-    def graph_results(self):
-        """Display the average simulation results on a graph"""
-        # fig = plt.figure()
-        # fig.subplots_adjust(hspace=.35)
-
-        # median_x_values = [num for num in
-        #                          range(len(results.get_meaningful_medians()))]
-        # median_y_values = results.get_meaningful_medians()
+        median_graph = fig.add_subplot(2, 1, 1)
+        median_graph.set_title("Simulation Result Medians")
+        median_graph.set_xlabel("Roll #")
+        median_graph.set_ylabel("Median Balance")
+        median_line, = median_graph.plot([], [])
 
-        # print("Meaningful medians:", results.get_meaningful_medians())
-        # print("Enumerated meaningful medians:",
-        #       list(enumerate(results.get_meaningful_medians())))
-        # print("Zipped enumerated meaningful medians:",
-        #       list(zip(*enumerate(results.get_meaningful_medians()))))
+        mean_graph = fig.add_subplot(2, 1, 2)
+        mean_graph.set_title("Simulation Result Means")
+        mean_graph.set_xlabel("Roll #")
+        mean_graph.set_ylabel("Mean Balance")
+        mean_line, = mean_graph.plot([], [])
 
-        print("[Progress] Graphing results...")
+        canvas = FigureCanvasTkAgg(fig, master=self.master)
+        canvas.get_tk_widget().grid(row=8, column=0, columnspan=2)
 
-        median_x_values, median_y_values = \
-            zip(*enumerate(self.sim_results.get_median_balances()))
-        median_graph = self.graph_fig.add_subplot(2, 1, 1)
+        return fig, canvas, median_line, mean_line
 
-        median_graph.plot(median_x_values, median_y_values)
+    def draw_graph(self, average_balances, median_balances):
+        """Show the given mean and median balances on the graphs"""
 
-        median_graph.set_title("Simulation Result Medians")
-        median_graph.set_xlabel("Roll #")
-        median_graph.set_ylabel("Median Balance")
+        for line, balances in ((self.median_line, median_balances),
+                               (self.mean_line, average_balances)):
+            line.set_data(range(len(balances)), balances)
+            line.axes.relim()
+            line.axes.autoscale_view()
 
-        mean_graph = self.graph_fig.add_subplot(2, 1, 2)
+        self.graph_canvas.draw_idle()
 
-        mean_values_to_graph = \
-            self.sim_results.get_average_balances()
-        mean_x_values, mean_y_values = \
-            zip(*enumerate(mean_values_to_graph))
-        mean_graph.plot(mean_x_values, mean_y_values)
+    def graph_results(self):
+        """Display the average simulation results on a graph"""
 
-        mean_graph.set_title("Simulation Result Means")
-        mean_graph.set_xlabel("Roll #")
-        mean_graph.set_ylabel("Mean Balance")
+        print("[Progress] Graphing results...")
 
-        plt.show()
+        self.draw_graph(self.sim_results.get_average_balances(),
+                        self.sim_results.get_median_balances())
@@ -0,0 +1,440 @@
+import json
+import os
+
+import numpy as np
+
+from primediceSim.aggregate import PartialResults
+from primediceSim.configuration import STOP_REASONS
+
+# Change this whenever the layout of history files changes
+FILE_FORMAT_VERSION = 3
+
+# The reason each run stopped is kept as its position in STOP_REASONS
+STOP_REASON_DTYPE = np.int8
+
+
+class BalanceHistories:
+    """Keep the balance history of many runs in one contiguous array, with
+    the start of each run's balances kept in a second array of offsets.
+    Each run's history is handed out as a view into that array, so no copies
+    or per-balance Python objects are made.
+    """
+
+    def __init__(self, dtype=np.int64, capacity=1024, run_capacity=64):
+        """capacity - the number of balances there is room for before the
+        storage has to grow
+        run_capacity - the number of runs there is room for before the
+        offsets and stop reasons have to grow
+        """
+        self.dtype = np.dtype(dtype)
+        self.balances = np.empty(capacity, dtype=self.dtype)
+        # offset_buffer[i] is where run i starts, and offset_buffer[i + 1]
+        # where it ends. Like the balances, the offsets and the reason each
+        # run stopped are kept in arrays with room to spare, of which only
+        # the first run_count runs are used.
+        self.run_count = 0
+        self.offset_buffer = np.zeros(run_capacity + 1, dtype=np.int64)
+        # The position in STOP_REASONS of the reason each run stopped
+        self.stop_reason_buffer = np.zeros(run_capacity,
+                                           dtype=STOP_REASON_DTYPE)
+
+    @classmethod
+    def from_buffer(cls, balances, offsets, stop_reasons=None):
+        """Create the storage around an existing array of balances and the
+        offsets where each run starts, without copying the balances.
+        stop_reasons - the position in STOP_REASONS of the reason each run
+        stopped. Every run went bankrupt if it is not given.
+        The offsets and stop reasons are only copied if they are not arrays
+        of the right type already.
+        """
+
+        storage = cls(dtype=balances.dtype, capacity=0, run_capacity=0)
+        storage.balances = balances
+        storage.offset_buffer = np.asarray(offsets, dtype=np.int64)
+        storage.run_count = storage.offset_buffer.size - 1
+        if stop_reasons is None:
+            stop_reasons = np.zeros(storage.run_count,
+                                    dtype=STOP_REASON_DTYPE)
+        storage.stop_reason_buffer = np.asarray(stop_reasons,
+                                                dtype=STOP_REASON_DTYPE)
+
+        return storage
+
+    @classmethod
+    def from_lists(cls, histories, dtype=np.int64):
+        """Create the storage from a list of balance histories of runs that
+        all went bankrupt
+        """
+
+        lengths = [len(balances) for balances in histories]
+        storage = cls(dtype=dtype, capacity=max(sum(lengths), 1),
+                      run_capacity=len(histories))
+        if histories:
+            storage.balances[:sum(lengths)] = np.concatenate(
+                [np.asarray(balances, dtype=storage.dtype) for balances in
+                 histories])
+        np.cumsum(lengths, out=storage.offset_buffer[1:])
+        storage.run_count = len(histories)
+
+        return storage
+
+    @property
+    def offsets(self):
+        """The offset where each run starts, followed by the end of the last
+        run
+        """
+        return self.offset_buffer[:self.run_count + 1]
+
+    @property
+    def stop_reasons(self):
+        """The position in STOP_REASONS of the reason each run stopped"""
+        return self.stop_reason_buffer[:self.run_count]
+
+    def __len__(self):
+        return self.run_count
+
+    def __getitem__(self, run_num):
+        """Return a view of the balance history of one run"""
+
+        if run_num < 0:
+            run_num += len(self)
+        if not 0 <= run_num < len(self):
+            raise IndexError("Run number out of range")
+
+        return self.balances[self.offset_buffer[run_num]:
+                             self.offset_buffer[run_num + 1]]
+
+    def __iter__(self):
+        for run_num in range(len(self)):
+            yield self[run_num]
+
+    def size(self):
+        """Return the total number of balances kept"""
+
+        return int(self.offset_buffer[self.run_count])
+
+    def append(self, balances, stop_reason="bankrupt"):
+        """Add the balance history of one more run, and the reason from
+        STOP_REASONS that it stopped. Views that were handed out before may
+        stop following the storage once it has to grow.
+        """
+
+        start = self.size()
+        end = start + len(balances)
+        if end > self.balances.size:
+            # Double the space so that adding many runs is rarely copied
+            self.balances = grow(self.balances, start,
+                                 max(end, 2 * self.balances.size))
+        if self.run_count == self.stop_reason_buffer.size:
+            run_capacity = max(1, 2 * self.run_count)
+            self.offset_buffer = grow(self.offset_buffer, self.run_count + 1,
+                                      run_capacity + 1)
+            self.stop_reason_buffer = grow(self.stop_reason_buffer,
+                                           self.run_count, run_capacity)
+
+        self.balances[start:end] = balances
+        self.run_count += 1
+        self.offset_buffer[self.run_count] = end
+        self.stop_reason_buffer[self.run_count - 1] = STOP_REASONS.index(
+            stop_reason)
+
+    def get_runs(self, start, stop):
+        """Return a BalanceHistories of the runs from start up to stop,
+        whose balances are a view into this storage rather than a copy
+        """
+
+        first = self.offset_buffer[start]
+        offsets = self.offset_buffer[start:stop + 1] - first
+
+        return BalanceHistories.from_buffer(
+            self.balances[first:self.offset_buffer[stop]], offsets,
+            self.stop_reason_buffer[start:stop])
+
+    def get_stop_reason(self, run_num):
+        """Return the reason from STOP_REASONS that one run stopped"""
+
+        return STOP_REASONS[self.stop_reasons[run_num]]
+
+    def get_stop_reasons(self):
+        """Return the reason from STOP_REASONS that each run stopped"""
+
+        return [STOP_REASONS[code] for code in self.stop_reasons.tolist()]
+
+    def get_lengths(self):
+        """Return the number of balances in each run"""
+
+        return np.diff(self.offsets)
+
+    def get_roll_numbers(self):
+        """Return the roll number that each kept balance belongs to"""
+
+        offsets = self.offsets
+        lengths = np.diff(offsets)
+
+        return np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+
+    def find_average_balances(self):
+        """Find the average balance at each roll number, counting runs that
+        have already ended as having a balance of zero
+        """
+
+        roll_numbers = self.get_roll_numbers()
+        sums = np.zeros(self.get_lengths().max(initial=0), dtype=np.int64)
+        np.add.at(sums, roll_numbers, self.balances[:self.size()])
+
+        return (sums // len(self)).tolist()
+
+    def find_percentile_balances(self, percentile):
+        """Find the given percentile, between 0 and 100, of the balances at
+        each roll number, counting runs that have already ended as having a
+        balance of zero. Stop once the percentile reaches zero.
+        """
+
+        run_count = len(self)
+        roll_numbers = self.get_roll_numbers()
+        balances = self.balances[:self.size()]
+
+        # Sort the balances by roll number, and by value within each one
+        order = np.lexsort((balances, roll_numbers))
+        sorted_balances = balances[order]
+        runs_at_roll = np.bincount(roll_numbers)
+        roll_starts = np.cumsum(runs_at_roll) - runs_at_roll
+
+        # The runs that have ended stand in for zeros, which sit between the
+        # negative balances and the rest once everything is sorted
+        negatives = np.bincount(roll_numbers[balances < 0],
+                                minlength=runs_at_roll.size)
+        zeros = run_count - runs_at_roll
+
+        def balance_at_rank(rank):
+            """Return the balance of the given rank at every roll number"""
+            positions = np.where(rank < negatives + zeros,
+                                 np.minimum(rank, negatives), rank - zeros)
+            positions = np.minimum(positions, runs_at_roll - 1)
+            values = sorted_balances[roll_starts + positions]
+            is_zero = (rank >= negatives) & (rank < negatives + zeros)
+            return np.where(is_zero, 0, values)
+
+        rank = percentile / 100 * (run_count - 1)
+        low_rank = int(rank)
+        high_rank = min(low_rank + 1, run_count - 1)
+        low = balance_at_rank(low_rank)
+        high = balance_at_rank(high_rank)
+
+        # Interpolate the same way that np.percentile does, and truncate the
+        # same way int(np.median(...)) does
+        percentile_balances = (low + (high - low) * (rank - low_rank)).astype(
+            np.int64).tolist()
+
+        # Stop calculating percentiles once they reach 0
+        if 0 in percentile_balances:
+            percentile_balances = \
+                percentile_balances[:percentile_balances.index(0) + 1]
+
+        return percentile_balances
+
+    def find_median_balances(self):
+        """Find the median balance at each roll number, counting runs that
+        have already ended as having a balance of zero
+        """
+
+        return self.find_percentile_balances(50)
+
+
+def grow(array, used, capacity):
+    """Return a larger copy of an array with the given capacity, holding the
+    first used items of the array
+    """
+
+    grown = np.empty(capacity, dtype=array.dtype)
+    grown[:used] = array[:used]
+
+    return grown
+
+
+class HistoryWriter:
+    """Write the balance history of each run to disk as soon as it finishes,
+    so that histories larger than memory can be kept and opened again later
+    with MappedHistories.
+    The histories are kept in a directory holding the balances of every run
+    back to back, the offset where each run starts, the reason each run
+    stopped, and a small metadata file with the settings that were simulated.
+    """
+
+    def __init__(self, path, config, account, random_seed=None,
+                 engine="python", rng_backend="compat"):
+        """path - the directory to write the histories to. It is created if
+        it does not exist yet, and any histories already in it are replaced.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self.metadata = {
+            "format_version": FILE_FORMAT_VERSION,
+            "dtype": np.dtype(np.int64).str,
+            "base_bet": config.get_base_bet(),
+            "payout": config.get_payout(),
+            "loss_adder": config.get_loss_adder(),
+            "iterations": config.get_iterations(),
+            "max_rolls": config.get_max_rolls(),
+            "take_profit": config.get_take_profit(),
+            "stop_loss": config.get_stop_loss(),
+            "strategy": config.get_strategy().describe(),
+            "balance": account.get_balance(),
+            "random_seed": random_seed,
+            "engine": engine,
+            "rng_backend": rng_backend,
+        }
+
+        # Remove the metadata first, so a half-written directory can never be
+        # opened as if it were finished
+        metadata_path = os.path.join(path, "metadata.json")
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+
+        self.balance_file = open(os.path.join(path, "balances.bin"), "wb")
+        self.offset_file = open(os.path.join(path, "offsets.bin"), "wb")
+        self.stop_reason_file = open(os.path.join(path, "stop_reasons.bin"),
+                                     "wb")
+        self.run_count = 0
+        self.balance_count = 0
+        self.offset_file.write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, balances, stop_reason="bankrupt"):
+        """Write the balance history of one more run, and the reason from
+        STOP_REASONS that it stopped
+        """
+
+        balances = np.asarray(balances, dtype=np.int64)
+        self.balance_file.write(balances.tobytes())
+
+        self.run_count += 1
+        self.balance_count += balances.size
+        self.offset_file.write(
+            np.array([self.balance_count], dtype=np.int64).tobytes())
+        self.stop_reason_file.write(
+            np.array([STOP_REASONS.index(stop_reason)],
+                     dtype=STOP_REASON_DTYPE).tobytes())
+
+    def close(self):
+        """Finish writing, and record the metadata of the histories"""
+
+        if self.balance_file.closed:
+            return
+
+        self.balance_file.close()
+        self.offset_file.close()
+        self.stop_reason_file.close()
+
+        self.metadata["runs"] = self.run_count
+        with open(os.path.join(self.path, "metadata.json"), "w") as \
+                metadata_file:
+            json.dump(self.metadata, metadata_file, indent=4)
+
+
+class MappedHistories(BalanceHistories):
+    """Open the histories written by a HistoryWriter without reading them
+    into memory. The operating system loads the parts that are looked at, and
+    averages and percentiles are found by going over the runs a chunk at a
+    time.
+    """
+
+    def __init__(self, path, chunk_balances=1 << 24):
+        """chunk_balances - the number of balances to look at in one go when
+        going over every run
+        """
+        with open(os.path.join(path, "metadata.json")) as metadata_file:
+            self.metadata = json.load(metadata_file)
+        if self.metadata["format_version"] != FILE_FORMAT_VERSION:
+            raise ValueError("Unsupported history file version: %s" %
+                             self.metadata["format_version"])
+
+        super().__init__(dtype=self.metadata["dtype"], capacity=0)
+        self.path = path
+        self.chunk_balances = chunk_balances
+
+        self.offset_buffer = np.memmap(os.path.join(path, "offsets.bin"),
+                                       dtype=np.int64, mode="r")
+        self.run_count = self.offset_buffer.size - 1
+        if self.size():
+            self.balances = np.memmap(os.path.join(path, "balances.bin"),
+                                      dtype=self.dtype, mode="r",
+                                      shape=(self.size(),))
+        if len(self):
+            self.stop_reason_buffer = np.memmap(
+                os.path.join(path, "stop_reasons.bin"),
+                dtype=STOP_REASON_DTYPE, mode="r")
+
+    def get_metadata(self):
+        return self.metadata
+
+    def make_configuration(self):
+        """Return the Configuration and Account that were simulated"""
+
+        # Imported here because the configuration is only needed when the
+        # histories are opened to be simulated again
+        from primediceSim.account import Account
+        from primediceSim.configuration import Configuration
+        from primediceSim.strategy import make_strategy
+
+        config = Configuration(base_bet=self.metadata["base_bet"],
+                               payout=self.metadata["payout"],
+                               iterations=self.metadata["iterations"],
+                               loss_adder=self.metadata["loss_adder"],
+                               max_rolls=self.metadata["max_rolls"],
+                               take_profit=self.metadata["take_profit"],
+                               stop_loss=self.metadata["stop_loss"],
+                               strategy=make_strategy(
+                                   **self.metadata["strategy"]))
+
+        return config, Account(self.metadata["balance"])
+
+    def append(self, balances, stop_reason="bankrupt"):
+        raise TypeError("Histories opened from a file are read only")
+
+    def iter_chunks(self):
+        """Yield the runs in groups that hold about chunk_balances balances
+        each, as a list of views and a list of the reasons they stopped
+        """
+
+        first_run = 0
+        while first_run < len(self):
+            # Find the first run that would take the chunk past its size,
+            # always taking at least one run
+            limit = self.offsets[first_run] + self.chunk_balances
+            end_run = int(np.searchsorted(self.offsets, limit, side="right"))
+            end_run = min(max(end_run - 1, first_run + 1), len(self))
+
+            yield ([self[run_num] for run_num in range(first_run, end_run)],
+                   [self.get_stop_reason(run_num) for run_num in
+                    range(first_run, end_run)])
+            first_run = end_run
+
+    def summarize(self, track_medians=True, sketch=None):
+        """Go over every run a chunk at a time and return a PartialResults
+        with their totals.
+        track_medians and sketch are passed on to the PartialResults. Without
+        a sketch, the exact medians keep a count of every balance that was
+        seen at each roll number, which can still grow large.
+        """
+
+        partial_results = PartialResults(track_medians=track_medians,
+                                         pending_limit=self.chunk_balances,
+                                         sketch=sketch)
+        for chunk, stop_reasons in self.iter_chunks():
+            partial_results.add_histories(chunk, stop_reasons)
+            partial_results.count_pending()
+
+        return partial_results
+
+    def find_average_balances(self):
+        return self.summarize(track_medians=False).find_average_balances()
+
+    def find_percentile_balances(self, percentile):
+        return self.summarize().find_percentile_balances(percentile)
@@ -0,0 +1,258 @@
+import contextlib
+import time
+
+# The sinks import json and logging themselves, so that simulations that are
+# not instrumented never load them
+
+
+class Instrument:
+    """Receive the timings and counts reported while simulations run.
+    This base class ignores everything it is given apart from messages, which
+    it prints as simulations always have, and that makes it the default when
+    nothing is listening. Subclasses override the methods for the events they
+    want to keep.
+    """
+
+    # Instruments that ignore every event are skipped before any timing or
+    # counting is even done
+    enabled = False
+
+    # The file that messages are printed to, or None for stdout
+    message_output = None
+
+    def __init__(self, message_output=None):
+        """message_output - the file to print messages to, such as
+        sys.stderr, or None for stdout
+        """
+        self.message_output = message_output
+
+    def phase_started(self, name, fields):
+        """Called when a phase, such as running the simulations or finding
+        the medians, starts. fields holds any details about the phase.
+        """
+
+    def phase_finished(self, name, seconds, fields):
+        """Called when a phase finishes, with the number of seconds it took"""
+
+    def count(self, name, amount=1):
+        """Add to a counter, such as the number of rolls simulated"""
+
+    def observe(self, name, value):
+        """Record one value of a measurement that is kept as a histogram,
+        such as the rolls or seconds taken by each run
+        """
+
+    def message(self, text):
+        """Called with a line of text meant for the user, such as the
+        settings of a simulation or its results
+        """
+
+        print(text, file=self.message_output)
+
+    def phase(self, name, **fields):
+        """Return a context manager that reports the start and finish of a
+        phase, and how long it took
+        """
+
+        if not self.enabled:
+            return contextlib.nullcontext()
+
+        return self.timed_phase(name, fields)
+
+    @contextlib.contextmanager
+    def timed_phase(self, name, fields):
+        self.phase_started(name, fields)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_finished(name, time.perf_counter() - start_time,
+                                fields)
+
+
+class LoggingSink(Instrument):
+    """Write every event to a logger"""
+
+    enabled = True
+
+    def __init__(self, logger=None, level=None, value_level=None):
+        """level - the level to log every event at, logging.INFO by default
+        value_level - the level to log observed values at, logging.DEBUG by
+        default, since a value is observed for every run
+        """
+        import logging
+
+        if logger is None:
+            logger = logging.getLogger("primediceSim")
+        if level is None:
+            level = logging.INFO
+        if value_level is None:
+            value_level = logging.DEBUG
+        self.logger = logger
+        self.level = level
+        self.value_level = value_level
+
+    def phase_started(self, name, fields):
+        self.logger.log(self.level, "[Progress] Started %s", name)
+
+    def phase_finished(self, name, seconds, fields):
+        self.logger.log(self.level, "[Time] Finished %s in %.3f seconds",
+                        name, seconds)
+
+    def count(self, name, amount=1):
+        self.logger.log(self.level, "[Count] %s: +%s", name, amount)
+
+    def observe(self, name, value):
+        self.logger.log(self.value_level, "[Value] %s: %s", name, value)
+
+    def message(self, text):
+        self.logger.log(self.level, "%s", text)
+
+
+class JsonLinesSink(Instrument):
+    """Write every event as one line of JSON, so that it can be collected and
+    analyzed later
+    """
+
+    enabled = True
+
+    def __init__(self, output):
+        """output - a path to append the events to, or an open text file"""
+        self.owns_file = isinstance(output, str)
+        if self.owns_file:
+            output = open(output, "a")
+        self.output = output
+
+    def write(self, event, name, **values):
+        import json
+
+        record = {"event": event, "name": name, "time": time.time()}
+        record.update(values)
+        self.output.write(json.dumps(record, default=str) + "\n")
+
+    def phase_started(self, name, fields):
+        self.write("phase_started", name, fields=fields)
+
+    def phase_finished(self, name, seconds, fields):
+        self.write("phase_finished", name, seconds=seconds, fields=fields)
+
+    def count(self, name, amount=1):
+        self.write("count", name, amount=amount)
+
+    def observe(self, name, value):
+        self.write("observe", name, value=value)
+
+    def message(self, text):
+        self.write("message", "message", text=text)
+
+    def close(self):
+        if self.owns_file:
+            self.output.close()
+        else:
+            self.output.flush()
+
+
+class MemorySink(Instrument):
+    """Keep every event in memory, so that it can be looked at once the
+    simulations have finished
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.events = []
+        self.counters = {}
+        # Every timing of each phase, and every value of each measurement
+        self.timings = {}
+        self.values = {}
+        self.messages = []
+
+    def phase_started(self, name, fields):
+        self.events.append(("phase_started", name, fields))
+
+    def phase_finished(self, name, seconds, fields):
+        self.events.append(("phase_finished", name, fields))
+        self.timings.setdefault(name, []).append(seconds)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        self.values.setdefault(name, []).append(value)
+
+    def message(self, text):
+        self.messages.append(text)
+
+    def get_counter(self, name):
+        return self.counters.get(name, 0)
+
+    def summarize_timings(self):
+        """Return the number of times each phase ran, and the total, fastest,
+        slowest and average time it took
+        """
+
+        summary = {}
+        for name, timings in self.timings.items():
+            summary[name] = {
+                "count": len(timings),
+                "total": sum(timings),
+                "min": min(timings),
+                "max": max(timings),
+                "mean": sum(timings) / len(timings),
+            }
+
+        return summary
+
+
+class CombinedInstrument(Instrument):
+    """Pass every event on to several instruments"""
+
+    def __init__(self, *instruments):
+        self.instruments = [instrument for instrument in instruments if
+                            instrument.enabled]
+        self.enabled = bool(self.instruments)
+        # Every instrument deals with messages, even one that ignores the
+        # other events
+        self.message_instruments = list(instruments)
+
+    def phase_started(self, name, fields):
+        for instrument in self.instruments:
+            instrument.phase_started(name, fields)
+
+    def phase_finished(self, name, seconds, fields):
+        for instrument in self.instruments:
+            instrument.phase_finished(name, seconds, fields)
+
+    def count(self, name, amount=1):
+        for instrument in self.instruments:
+            instrument.count(name, amount)
+
+    def observe(self, name, value):
+        for instrument in self.instruments:
+            instrument.observe(name, value)
+
+    def message(self, text):
+        for instrument in self.message_instruments:
+            instrument.message(text)
+
+
+# The instrument used by simulations that are not given one of their own
+default_instrument = Instrument()
+
+
+def get_instrument(instrument=None):
+    """Return the given instrument, or the default one if it is None"""
+
+    if instrument is None:
+        return default_instrument
+    return instrument
+
+
+def set_instrument(instrument):
+    """Make the instrument the default one, and return the one it replaced"""
+
+    global default_instrument
+    previous = default_instrument
+    default_instrument = instrument
+
+    return previous
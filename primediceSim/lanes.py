@@ -0,0 +1,242 @@
+import numpy as np
+
+from primediceSim.configuration import STOP_REASONS
+from primediceSim.rolls import make_generator
+from primediceSim.strategy import Martingale
+
+
+class LaneEngine:
+    """Simulate the runs of many different configurations side by side. The
+    engine keeps a fixed number of lanes, each holding one run, and every
+    setting a run needs is kept in an array with one value per lane, so a
+    lane of one configuration can sit next to a lane of any other. Each roll
+    moves every lane at once. Lanes whose runs have stopped are added to the
+    totals of their configuration and given the next run that is waiting, so
+    the arrays stay full until the last runs are going.
+    Only the totals of each configuration are kept, not the balance history
+    of each run.
+    """
+
+    def __init__(self, configs, balances, random_seed=None, lanes=4096,
+                 rng_backend="pcg64", rng=None):
+        """configs - the Configurations to simulate, which must all use the
+        Martingale strategy
+        balances - the starting balance of each configuration
+        lanes - the most runs to move at once
+        rng_backend - the bit generator to draw the rolls with, "pcg64" or
+        "philox"
+        rng - optional object with an integers(low, high, size) method to
+        draw the rolls with instead, such as a numpy Generator
+        """
+        if len(configs) != len(balances):
+            raise ValueError("Every configuration needs a starting balance")
+        for config in configs:
+            if type(config.get_strategy()) is not Martingale:
+                raise ValueError("Only the martingale strategy can be "
+                                 "simulated in lanes")
+        if lanes < 1:
+            raise ValueError("There must be at least one lane")
+
+        self.configs = configs
+        self.lanes = lanes
+        if rng is None:
+            rng = make_generator(rng_backend, random_seed)
+        self.rng = rng
+
+        # The settings of each configuration, one array per setting. Stop
+        # conditions that are off are given values that never stop a run.
+        self.balances = np.asarray(balances, dtype=np.int64)
+        self.base_bets = np.array([config.get_base_bet() for config in
+                                   configs], dtype=np.float64)
+        self.payouts = np.array([config.get_payout() for config in configs],
+                                dtype=np.float64)
+        self.thresholds = np.array([config.get_roll_under_threshold() for
+                                    config in configs], dtype=np.int64)
+        self.loss_adder_decimals = np.array(
+            [config.get_strategy().loss_adder / 100 for config in configs],
+            dtype=np.float64)
+        self.take_profits = np.array(
+            [setting_or(config.get_take_profit(), np.inf) for config in
+             configs], dtype=np.float64)
+        self.stop_losses = np.array(
+            [setting_or(config.get_stop_loss(), -np.inf) for config in
+             configs], dtype=np.float64)
+        self.max_rolls = np.array(
+            [setting_or(config.get_max_rolls(), np.iinfo(np.int64).max) for
+             config in configs], dtype=np.int64)
+
+    def run(self, iterations=None):
+        """Simulate the given number of runs of each configuration, or each
+        configuration's own iterations if it is not given. Return a
+        LaneResults for each configuration, in the same order.
+        """
+
+        if iterations is None:
+            run_counts = [config.get_iterations() for config in self.configs]
+        else:
+            run_counts = [iterations] * len(self.configs)
+        # The configuration of every run, in the order they are started
+        pending = np.repeat(np.arange(len(self.configs)), run_counts)
+        next_run = 0
+
+        totals = LaneTotals(len(self.configs))
+
+        # The state of the run in each lane, one array per value
+        lane_configs = np.zeros(0, dtype=np.int64)
+        lane_balances = np.zeros(0, dtype=np.int64)
+        lane_bets = np.zeros(0, dtype=np.float64)
+        lane_rolls = np.zeros(0, dtype=np.int64)
+        # The total of every balance of each run, starting balance included
+        lane_balance_totals = np.zeros(0, dtype=np.float64)
+
+        while True:
+            # Fill the free lanes with the runs that are waiting
+            free = min(self.lanes - lane_configs.size, pending.size - next_run)
+            if free > 0:
+                new_configs = pending[next_run:next_run + free]
+                next_run += free
+                lane_configs = np.concatenate((lane_configs, new_configs))
+                lane_balances = np.concatenate(
+                    (lane_balances, self.balances[new_configs]))
+                lane_bets = np.concatenate(
+                    (lane_bets, self.base_bets[new_configs]))
+                lane_rolls = np.concatenate(
+                    (lane_rolls, np.zeros(free, dtype=np.int64)))
+                lane_balance_totals = np.concatenate(
+                    (lane_balance_totals,
+                     self.balances[new_configs].astype(np.float64)))
+
+            codes = self.find_stop_codes(lane_configs, lane_balances,
+                                         lane_bets, lane_rolls)
+            stopped = codes >= 0
+            if stopped.any():
+                totals.add(lane_configs[stopped], lane_rolls[stopped],
+                           lane_balance_totals[stopped],
+                           lane_balances[stopped], codes[stopped])
+
+                # Move the runs that are still going together, so the free
+                # lanes are all at the end
+                going = ~stopped
+                lane_configs = lane_configs[going]
+                lane_balances = lane_balances[going]
+                lane_bets = lane_bets[going]
+                lane_rolls = lane_rolls[going]
+                lane_balance_totals = lane_balance_totals[going]
+
+                # New runs can stop before their first roll, so they are
+                # checked before anything rolls
+                continue
+
+            if not lane_configs.size:
+                break
+
+            # Every lane rolls at once, with the settings of its own
+            # configuration. The account only deals in whole amounts, so the
+            # bet and the reward are truncated as Account.subtract and
+            # Account.add do.
+            won = np.asarray(self.rng.integers(0, 10000,
+                                               size=lane_configs.size)) < \
+                self.thresholds[lane_configs]
+            lane_balances -= lane_bets.astype(np.int64)
+            lane_balances[won] += (lane_bets[won] *
+                                   self.payouts[lane_configs[won]]).astype(
+                np.int64)
+            lane_bets = np.where(
+                won, self.base_bets[lane_configs],
+                lane_bets + lane_bets * self.loss_adder_decimals[lane_configs])
+            lane_rolls += 1
+            lane_balance_totals += lane_balances
+
+        return totals.make_results()
+
+    def find_stop_codes(self, lane_configs, lane_balances, lane_bets,
+                        lane_rolls):
+        """Return the position in STOP_REASONS of the reason that the run in
+        each lane has to stop, or -1 for the runs that keep going. The reasons
+        are checked in the same order as Configuration.find_stop_reason.
+        """
+
+        # Later reasons are written over earlier ones, so they are written
+        # from the last to be checked to the first
+        codes = np.full(lane_configs.size, -1, dtype=np.int64)
+        codes[lane_rolls >= self.max_rolls[lane_configs]] = \
+            STOP_REASONS.index("max_rolls")
+        codes[lane_balances <= self.stop_losses[lane_configs]] = \
+            STOP_REASONS.index("stop_loss")
+        codes[lane_balances >= self.take_profits[lane_configs]] = \
+            STOP_REASONS.index("take_profit")
+        codes[lane_balances < lane_bets] = STOP_REASONS.index("bankrupt")
+
+        return codes
+
+
+def setting_or(value, default):
+    """Return the value of a setting, or the default if it is off"""
+
+    return default if value is None else value
+
+
+class LaneTotals:
+    """Add up the runs of each configuration as the lanes finish them"""
+
+    def __init__(self, config_count):
+        self.config_count = config_count
+        self.runs = np.zeros(config_count, dtype=np.int64)
+        self.rolls = np.zeros(config_count, dtype=np.int64)
+        self.average_balances = np.zeros(config_count, dtype=np.float64)
+        self.final_balances = np.zeros(config_count, dtype=np.int64)
+        self.longest_runs = np.zeros(config_count, dtype=np.int64)
+        self.stop_counts = np.zeros((config_count, len(STOP_REASONS)),
+                                    dtype=np.int64)
+
+    def add(self, configs, rolls, balance_totals, final_balances, codes):
+        """Add finished runs, given the configuration, number of rolls,
+        total of every balance, final balance and stop code of each
+        """
+
+        count = self.config_count
+        self.runs += np.bincount(configs, minlength=count)
+        self.rolls += np.bincount(configs, weights=rolls,
+                                  minlength=count).astype(np.int64)
+        # Each run's average balance counts its starting balance too
+        self.average_balances += np.bincount(
+            configs, weights=balance_totals / (rolls + 1), minlength=count)
+        np.add.at(self.final_balances, configs, final_balances)
+        np.maximum.at(self.longest_runs, configs, rolls)
+        np.add.at(self.stop_counts, (configs, codes), 1)
+
+    def make_results(self):
+        """Return a LaneResults for each configuration"""
+
+        return [LaneResults(int(self.runs[config_num]),
+                            int(self.rolls[config_num]),
+                            float(self.average_balances[config_num]),
+                            int(self.final_balances[config_num]),
+                            int(self.longest_runs[config_num]),
+                            self.stop_counts[config_num].tolist())
+                for config_num in range(self.config_count)]
+
+
+class LaneResults:
+    """Contain the averages of the runs of one configuration simulated in
+    lanes, which are found the same way as those of AverageResults
+    """
+
+    def __init__(self, number_of_results, total_rolls, total_average_balance,
+                 total_final_balance, longest_run, stop_counts):
+        """stop_counts - the number of runs that stopped for each reason, in
+        the order of STOP_REASONS
+        """
+        self.number_of_results = number_of_results
+        self.total_rolls = total_rolls
+        self.longest_run = longest_run
+        self.stop_counts = dict(zip(STOP_REASONS, stop_counts))
+
+        runs = max(number_of_results, 1)
+        self.average_rolls_until_bankrupt = total_rolls // runs
+        self.overall_average_balance = total_average_balance // runs
+        self.average_final_balance = total_final_balance // runs
+        self.censored_runs = number_of_results - self.stop_counts["bankrupt"]
+
+    def get_total_rolls(self):
+        return self.total_rolls
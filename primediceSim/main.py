@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
-import time
+import logging
 
-from gui import Gui
-from configuration import Configuration
-from account import Account
-from simulation import Simulation
+from primediceSim.instrumentation import LoggingSink, set_instrument
+from primediceSim.configuration import Configuration
+from primediceSim.account import Account
+from primediceSim.simulation import Simulation
 
 
 class Program:
@@ -22,19 +22,25 @@ class Program:
     def run(self):
         """Create the gui, setting the program into motion"""
 
+        # Imported here because the gui loads tkinter and matplotlib, which
+        # take a while and are not needed until the window opens
+        from primediceSim.gui import Gui
+
         self.gui = Gui(self.sim)
 
 
 def main():
     """Call the experiment function"""
 
-    start_time = time.time()
-
-    program = Program()
-    program.run()
+    # Show the progress and timing of each simulation in the console, along
+    # with the total run time
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    instrument = LoggingSink()
+    set_instrument(instrument)
 
-    time_taken = str((time.time() - start_time))[:5]
-    print("\n[Time] Total run time: --- %s seconds ---" % time_taken)
+    with instrument.phase("program"):
+        program = Program()
+        program.run()
 
 if __name__ == "__main__":
     main()
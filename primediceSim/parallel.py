@@ -0,0 +1,124 @@
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from primediceSim.account import Account
+from primediceSim.aggregate import PartialResults
+from primediceSim.batch import BatchEngine
+from primediceSim.simulation import Simulation
+
+
+def split_iterations(iterations, chunk_size):
+    """Split the iterations into chunks of at most chunk_size runs each"""
+
+    full_chunks, leftover = divmod(iterations, chunk_size)
+    chunks = [chunk_size] * full_chunks
+    if leftover:
+        chunks.append(leftover)
+
+    return chunks
+
+
+def chunk_seeds(random_seed, chunk_count, first_chunk=0):
+    """Derive an independent random seed for each chunk from the user's seed.
+    The seeds depend only on the seed and the chunk number, so a seed gives the
+    same results no matter how many workers run the chunks, and the seeds of
+    later chunks can be found without the earlier ones.
+    """
+
+    entropy = np.random.SeedSequence(random_seed).entropy
+
+    # These are the same seeds that SeedSequence.spawn would give each chunk
+    return [int(np.random.SeedSequence(entropy, spawn_key=(chunk_num,))
+                .generate_state(1)[0])
+            for chunk_num in range(first_chunk, first_chunk + chunk_count)]
+
+
+def simulate_chunk(config, balance, iterations, random_seed, engine,
+                   track_medians=True, sketch=None, rng_backend="compat"):
+    """Simulate a chunk of runs in a worker and return their totals as a
+    PartialResults, rather than every balance history
+    """
+
+    account = Account(balance)
+    partial_results = PartialResults(track_medians=track_medians,
+                                     sketch=sketch)
+
+    if engine == "batch":
+        batch_engine = BatchEngine(config, account, random_seed=random_seed,
+                                   rng_backend=rng_backend)
+        histories = batch_engine.run(iterations)
+        partial_results.add_histories(histories,
+                                      histories.get_stop_reasons())
+    else:
+        simulation = Simulation(config, account, random_seed=random_seed,
+                                rng_backend=rng_backend)
+        sim_function = simulation.sim_function(engine)
+        for _ in range(iterations):
+            partial_results.add(sim_function())
+
+    return partial_results
+
+
+def run_parallel(config, account, random_seed=None, workers=None,
+                 chunk_size=1000, engine="python", track_medians=True,
+                 sketch=None, progress=None, first_chunk=0,
+                 partial_results=None, rng_backend="compat"):
+    """Run config.get_iterations() simulations across a pool of worker
+    processes and return the merged PartialResults.
+    workers - number of processes, None to use every core, or 0 to run the
+    chunks one after another in this process
+    track_medians - whether workers count balances for the median
+    sketch - optional BalanceSketch that workers count balances with, so the
+    counts sent back stay small
+    progress - optional function that is given the number of finished runs
+    each time a chunk finishes
+    first_chunk - the chunk number to start from, for continuing runs that
+    were simulated earlier
+    partial_results - optional PartialResults holding those earlier runs,
+    which the new chunks are merged into
+    rng_backend - how each chunk draws its rolls, one of RNG_BACKENDS from
+    the rolls module. Every chunk has its own seed, so chunks never share a
+    stream.
+    """
+
+    chunks = split_iterations(config.get_iterations(), chunk_size)
+    seeds = chunk_seeds(random_seed, len(chunks), first_chunk)
+    # Workers get their own copy, so later changes to the configuration by the
+    # caller do not affect chunks that are still waiting to run
+    config = copy.copy(config)
+
+    chunk_results = [None] * len(chunks)
+    finished = 0
+    if workers == 0:
+        for chunk_num, (chunk, seed) in enumerate(zip(chunks, seeds)):
+            chunk_results[chunk_num] = simulate_chunk(
+                config, account.get_balance(), chunk, seed, engine,
+                track_medians, sketch, rng_backend)
+            finished += chunk
+            if progress is not None:
+                progress(finished)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(simulate_chunk, config, account.get_balance(),
+                                chunk, seed, engine, track_medians,
+                                sketch, rng_backend): chunk_num
+                for chunk_num, (chunk, seed) in enumerate(zip(chunks, seeds))}
+
+            for future in as_completed(futures):
+                chunk_num = futures[future]
+                chunk_results[chunk_num] = future.result()
+                finished += chunks[chunk_num]
+                if progress is not None:
+                    progress(finished)
+
+    # Merge in chunk order so that the floating point totals do not depend on
+    # which worker finished first
+    if partial_results is None:
+        partial_results = PartialResults(track_medians=track_medians,
+                                         sketch=sketch)
+    partial_results.merge(*chunk_results)
+
+    return partial_results
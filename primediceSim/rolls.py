@@ -0,0 +1,144 @@
+import itertools
+import math
+import random
+
+# numpy is imported by the sources that use it, so that the compatible
+# source never has to wait for it to load
+
+# The ways that rolls can be drawn. "compat" gives exactly the rolls of
+# earlier versions for the same seed.
+RNG_BACKENDS = ["compat", "pcg64", "philox"]
+
+# Every roll is a whole number of hundredths, from 0 (0.00) to 9999 (99.99)
+ROLL_COUNT = 10000
+
+
+class CompatibleRolls:
+    """Draw rolls from the random module, the same way that
+    random.randrange(0, 10000) does, so a seed gives the same rolls as it
+    always has. The random module is shared by everything in the process, so
+    these rolls cannot be split into independent streams and should not be
+    drawn from several threads at once.
+    """
+
+    name = "compat"
+
+    def __init__(self, random_seed=None):
+        random.seed(random_seed)
+
+    def rolls(self):
+        """Return an endless iterator over the rolls"""
+
+        # randrange draws 14 random bits and tries again whenever they make
+        # a number that is too large. Building that from map and filter keeps
+        # the whole loop in C.
+        return filter(ROLL_COUNT.__gt__,
+                      map(random.getrandbits, itertools.repeat(14)))
+
+    def streaks(self, win_chance):
+        """Return an endless iterator over the number of rolls lost in a row
+        before each win, when each roll is won with the given chance, which
+        must be more than 0 and less than 1
+        """
+
+        # The number of losses before a win is geometric, and can be found
+        # from one uniform number by inverting its distribution
+        log_loss_chance = math.log1p(-win_chance)
+        return (int(math.log(1 - random.random()) / log_loss_chance) for _ in
+                itertools.repeat(None))
+
+
+class BlockRolls:
+    """Draw rolls from a numpy Generator in large blocks, and hand them out
+    one at a time from the block. Each source has its own generator, so
+    sources can be used from different threads, and independent sources can
+    be made with spawn or jumped.
+    """
+
+    def __init__(self, random_seed=None, backend="pcg64", block_size=65536,
+                 seed_sequence=None):
+        """backend - "pcg64" or "philox", the bit generator to draw with
+        block_size - the number of rolls drawn at once
+        seed_sequence - optional numpy SeedSequence to seed the generator
+        with instead of random_seed
+        """
+        import numpy as np
+
+        if seed_sequence is None:
+            seed_sequence = np.random.SeedSequence(random_seed)
+        self.name = backend
+        self.seed_sequence = seed_sequence
+        self.block_size = block_size
+        self.generator = make_generator(backend,
+                                        seed_sequence=seed_sequence)
+
+    def next_block(self):
+        """Draw the next block of rolls, as a list of ints"""
+
+        return self.generator.integers(0, ROLL_COUNT, size=self.block_size,
+                                       dtype="int16").tolist()
+
+    def rolls(self):
+        """Return an endless iterator over the rolls"""
+
+        return itertools.chain.from_iterable(iter(self.next_block, None))
+
+    def streaks(self, win_chance):
+        """Return an endless iterator over the number of rolls lost in a row
+        before each win, when each roll is won with the given chance, which
+        must be more than 0 and less than 1
+        """
+
+        def next_block():
+            # geometric counts the winning roll too
+            return (self.generator.geometric(win_chance,
+                                             size=self.block_size) -
+                    1).tolist()
+
+        return itertools.chain.from_iterable(iter(next_block, None))
+
+    def spawn(self, count):
+        """Return count new sources whose rolls are independent of this
+        source's and of each other's
+        """
+
+        return [BlockRolls(backend=self.name, block_size=self.block_size,
+                           seed_sequence=child) for child in
+                self.seed_sequence.spawn(count)]
+
+    def jumped(self, jumps=1):
+        """Return a new source that draws the rolls this source would draw
+        after jumps very large steps ahead, which never overlap with its own
+        """
+
+        source = BlockRolls(backend=self.name, block_size=self.block_size,
+                            seed_sequence=self.seed_sequence)
+        source.generator = type(self.generator)(
+            self.generator.bit_generator.jumped(jumps))
+
+        return source
+
+
+def make_generator(backend="pcg64", random_seed=None, seed_sequence=None):
+    """Return a numpy Generator that uses the given bit generator"""
+
+    import numpy as np
+
+    bit_generators = {"pcg64": np.random.PCG64, "philox": np.random.Philox}
+    if backend not in bit_generators:
+        raise ValueError("Unknown random number backend: %s" % backend)
+    if seed_sequence is None:
+        seed_sequence = np.random.SeedSequence(random_seed)
+
+    return np.random.Generator(bit_generators[backend](seed_sequence))
+
+
+def make_rolls(backend="compat", random_seed=None):
+    """Return a source of rolls for the given backend, one of RNG_BACKENDS"""
+
+    if backend == "compat":
+        return CompatibleRolls(random_seed)
+    if backend not in RNG_BACKENDS:
+        raise ValueError("Unknown random number backend: %s" % backend)
+
+    return BlockRolls(random_seed, backend=backend)
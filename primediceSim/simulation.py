@@ -1,20 +1,88 @@
-import random
-import copy
+import math
 import time
-import numpy as np
-import itertools
+
+from primediceSim.account import Account
+from primediceSim.configuration import STOP_REASONS
+from primediceSim.instrumentation import get_instrument
+from primediceSim.rolls import ROLL_COUNT, make_rolls
+from primediceSim.strategy import Martingale
+from primediceSim.streaks import expand_streaks
+
+# numpy, and the modules built on it, are imported by the methods that need
+# them, so that simulating single runs never has to wait for numpy to load
+
+# How many rolls a run makes between looking at the clock, when it has a
+# deadline
+CLOCK_CHECK_ROLLS = 1024
+
+# How many runs the batch engine simulates at once when the runs are
+# streamed, so that only the histories of one chunk are ever held together
+STREAM_CHUNK_SIZE = 1000
+
+# The highest chance of winning a roll for which the streak engine draws
+# streaks. Above it, a losing streak is on average under four rolls long, and
+# drawing each streak costs more than rolling one at a time.
+STREAK_MAX_WIN_CHANCE = 0.2
+
+
+def budget_exceeded(rolls, roll_limit, deadline):
+    """Return True if a run that has made the given number of rolls has used
+    up its roll limit, or has passed its deadline. The clock is only looked at
+    every CLOCK_CHECK_ROLLS rolls.
+    """
+
+    if roll_limit is not None and rolls >= roll_limit:
+        return True
+
+    return deadline is not None and rolls % CLOCK_CHECK_ROLLS == 0 and \
+        deadline_passed(deadline)
+
+
+def deadline_passed(deadline):
+    """Return True once the deadline has passed. The deadline is either a
+    time.monotonic() value or a function that returns True once the run
+    should stop, such as the is_set of a cancel event.
+    """
+
+    if callable(deadline):
+        return deadline()
+
+    return time.monotonic() >= deadline
 
 
 class Simulation:
     """Contain the simulation function and store the data of each simulation"""
 
-    def __init__(self, config, account, random_seed=None):
+    def __init__(self, config, account, random_seed=None, instrument=None,
+                 rng_backend="compat"):
+        """instrument - optional Instrument that is told how long each phase
+        of a run takes and how much was simulated. The default instrument from
+        the instrumentation module is used if it is not given.
+        rng_backend - how rolls are drawn, one of RNG_BACKENDS from the rolls
+        module. "compat" seeds the random module, which gives the same rolls
+        as earlier versions. "pcg64" and "philox" draw blocks of rolls from a
+        numpy generator kept by this simulation alone, which is faster and
+        safe to use alongside other threads.
+        """
         self.config = config
         self.account = account
+        self.instrument = instrument
 
         self.current_bet = config.get_base_bet()
+        # The betting strategy of the run being simulated, which is looked up
+        # again at the start of every run, and the state it keeps
+        self.strategy = config.get_strategy()
+        self.strategy_state = 0
         self.total_balance_lists = []
-        random.seed(random_seed)
+        self.random_seed = random_seed
+        self.rng_backend = rng_backend
+        # Every engine takes its rolls from the same stream, so a seed gives
+        # the same runs whichever one-run-at-a-time engine is used
+        self.roll_source = make_rolls(rng_backend, random_seed)
+        self.next_roll = self.roll_source.rolls().__next__
+        # The streak engine's lengths of losing streaks, kept with the win
+        # chance they were drawn for
+        self.streak_source = None
 
     def roll(self):
 
@@ -22,7 +90,7 @@ class Simulation:
         user or False if the roll was lost"""
 
         # Pick a random number between 0 and 100 out to two decimal places.
-        roll_value = random.randrange(0, 10000) / 100
+        roll_value = self.next_roll() / 100
         # print()
         # print("Roll under value:", self.config.get_roll_under_value())
         # print("Roll:", roll_value)
@@ -34,24 +102,34 @@ class Simulation:
         return win
 
     def increase_bet(self):
-        """Increase the current bet by the amount specified by the loss adder
-        amount.
+        """Change the current bet the way the betting strategy says to after
+        a lost roll, which by default increases it by the amount specified by
+        the loss adder amount.
         """
 
-        self.current_bet += \
-            self.current_bet * self.config.get_loss_adder_decimal()
+        self.next_bet(False)
 
     def reset_bet(self):
         """Change the current best back to the bet value from the
-        configuration.
+        configuration, and look up the betting strategy for the next run.
         """
 
         self.current_bet = self.config.get_base_bet()
+        self.strategy = self.config.get_strategy()
+        self.strategy_state = 0
 
-    def lose_roll(self):
-        """Simulate a lost roll by increasing the bet by the specified amount
+    def next_bet(self, won):
+        """Change the current bet the way the betting strategy says to after
+        a won or lost roll
         """
 
+        self.current_bet, self.strategy_state = self.strategy.next_bet(
+            self.config.get_base_bet(), self.current_bet, won,
+            self.strategy_state)
+
+    def lose_roll(self):
+        """Simulate a lost roll by increasing the bet"""
+
         self.increase_bet()
 
     def win_roll(self, account):
@@ -59,20 +137,36 @@ class Simulation:
 
         reward = self.current_bet * self.config.get_payout()
         account.add(reward)
-        self.reset_bet()
-
-    def single_sim(self):
-        """Simulate a single round of betting until bankruptcy.
+        self.next_bet(True)
+
+    def single_sim(self, roll_limit=None, deadline=None):
+        """Simulate a single round of betting until bankruptcy, or until one
+        of the configuration's stop conditions ends it.
+        roll_limit - optional number of rolls left in the budget of the whole
+        run, after which this simulation stops
+        deadline - optional time.monotonic() value after which this
+        simulation stops, or a function that returns True once it should stop
         Return a result object containing the results of that one simulation.
         """
 
         self.reset_bet()
-        sim_account = copy.copy(self.account)
+        # Every run changes its own account, so the simulation's account is
+        # never changed and may be a FrozenAccount
+        sim_account = Account(self.account.get_balance())
 
         # Create a list of the balance after each roll
         # Start out with initial amount for 0 graph point
         all_balances = [sim_account.get_balance()]
-        while sim_account.get_balance() >= self.current_bet:
+        while True:
+            rolls = len(all_balances) - 1
+            stop_reason = self.config.find_stop_reason(
+                sim_account.get_balance(), self.current_bet, rolls)
+            if stop_reason is None and \
+                    budget_exceeded(rolls, roll_limit, deadline):
+                stop_reason = "budget"
+            if stop_reason is not None:
+                break
+
             sim_account.subtract(self.current_bet)
 
             if self.roll():
@@ -82,13 +176,387 @@ class Simulation:
             all_balances.append(sim_account.get_balance())
 
         if len(all_balances) == 0:
-            print("[WARNING] The given configurations do not allow for a" +
-                  " single roll")
+            get_instrument(self.instrument).message(
+                "[WARNING] The given configurations do not allow for a"
+                " single roll")
 
-        sim_result = Results(balances=all_balances)
+        sim_result = Results(balances=all_balances, stop_reason=stop_reason)
 
         return sim_result
 
+    def hot_sim(self, roll_limit=None, deadline=None):
+        """Simulate a single round of betting until bankruptcy, giving exactly
+        the same result as single_sim but with every setting looked up once
+        per run instead of on every roll.
+        roll_limit and deadline are the same as for single_sim.
+        Return a result object containing the results of that one simulation.
+        """
+
+        strategy = self.config.get_strategy()
+        if type(strategy) is not Martingale:
+            # Only the auto-better's own strategy is written into the loop.
+            # Other strategies are asked for every bet, as single_sim does.
+            return self.single_sim(roll_limit, deadline)
+
+        threshold = self.config.get_roll_under_threshold()
+        base_bet = self.config.get_base_bet()
+        payout = self.config.get_payout()
+        loss_adder_decimal = strategy.loss_adder / 100
+        next_roll = self.next_roll
+
+        # Stop conditions that are off never stop the run
+        take_profit = self.config.get_take_profit()
+        if take_profit is None:
+            take_profit = math.inf
+        stop_loss = self.config.get_stop_loss()
+        if stop_loss is None:
+            stop_loss = -math.inf
+        rolls_allowed = min(limit for limit in
+                            (self.config.get_max_rolls(), roll_limit,
+                             math.inf) if limit is not None)
+
+        balance = self.account.get_balance()
+        current_bet = base_bet
+        all_balances = [balance]
+        append_balance = all_balances.append
+        rolls = 0
+        while True:
+            # Only look at the clock between stretches of rolls
+            stretch_end = rolls_allowed
+            if deadline is not None:
+                stretch_end = min(rolls + CLOCK_CHECK_ROLLS, rolls_allowed)
+
+            while balance >= current_bet and rolls < stretch_end and \
+                    stop_loss < balance < take_profit:
+                balance -= int(current_bet)
+
+                # The same stream of rolls as roll(), compared as whole
+                # hundredths against the threshold
+                if next_roll() < threshold:
+                    balance += int(current_bet * payout)
+                    current_bet = base_bet
+                else:
+                    current_bet += current_bet * loss_adder_decimal
+                append_balance(balance)
+                rolls += 1
+
+            if rolls < stretch_end or rolls >= rolls_allowed or \
+                    deadline_passed(deadline):
+                break
+
+        self.current_bet = current_bet
+
+        stop_reason = self.config.find_stop_reason(balance, current_bet, rolls)
+        if stop_reason is None:
+            stop_reason = "budget"
+
+        return Results(balances=all_balances, stop_reason=stop_reason)
+
+    def streak_sim(self, roll_limit=None, deadline=None,
+                   max_win_chance=STREAK_MAX_WIN_CHANCE):
+        """Simulate a single round of betting until bankruptcy, drawing how
+        many rolls are lost before each win instead of drawing every roll, and
+        taking the cost of a whole losing streak at once. The runs follow the
+        same odds as those of single_sim, but are not the same runs for the
+        same seed.
+        The balance after each roll is only worked out if the result's
+        get_balances is called. The number of rolls, the average balance and
+        the final balance are known without it.
+        roll_limit and deadline are the same as for single_sim, except that
+        the clock is looked at between streaks.
+        max_win_chance - the highest chance of winning a roll for which
+        streaks are drawn. Runs with more frequent wins are given to hot_sim,
+        which is faster for them.
+        Return a result object containing the results of that one simulation.
+        """
+
+        strategy = self.config.get_strategy()
+        threshold = self.config.get_roll_under_threshold()
+        if type(strategy) is not Martingale or strategy.loss_adder < 0 or \
+                not 0 < threshold < ROLL_COUNT or \
+                threshold / ROLL_COUNT > max_win_chance:
+            # Streaks only decide a run when every streak starts at the base
+            # bet and the bets never shrink, and some rolls have to be won
+            # and some lost
+            return self.hot_sim(roll_limit, deadline)
+
+        base_bet = self.config.get_base_bet()
+        payout = self.config.get_payout()
+        ladder = self.config.get_bet_ladder()
+        next_streak = self.find_next_streak(threshold / ROLL_COUNT)
+
+        # Stop conditions that are off never stop the run
+        take_profit = self.config.get_take_profit()
+        if take_profit is None:
+            take_profit = math.inf
+        stop_loss = self.config.get_stop_loss()
+        floor = -math.inf if stop_loss is None else stop_loss
+        rolls_allowed = min(limit for limit in
+                            (self.config.get_max_rolls(), roll_limit,
+                             math.inf) if limit is not None)
+
+        start_balance = balance = self.account.get_balance()
+        current_bet = base_bet
+        streaks = []
+        add_streak = streaks.append
+        total_balance = balance
+        rolls = 0
+        last_won = True
+        # The balance only goes up with a win, at the end of a streak, so the
+        # take profit is only reached between streaks
+        while balance >= base_bet and rolls < rolls_allowed and \
+                floor < balance < take_profit:
+            if deadline is not None and deadline_passed(deadline):
+                break
+
+            losses = next_streak()
+            played = min(ladder.horizon(balance, stop_loss, losses + 1),
+                         rolls_allowed - rolls)
+            lost = min(played, losses)
+            total_balance += lost * balance - ladder.cost_totals[lost]
+            rolls += played
+            add_streak(played)
+
+            if played <= losses:
+                # The run stopped before the streak was won
+                balance -= ladder.costs[lost]
+                current_bet = ladder.bets[lost]
+                last_won = False
+                break
+
+            bet = ladder.bets[losses]
+            balance += int(bet * payout) - ladder.costs[losses] - int(bet)
+            total_balance += balance
+
+        self.current_bet = current_bet
+
+        stop_reason = self.config.find_stop_reason(balance, current_bet, rolls)
+        if stop_reason is None:
+            stop_reason = "budget"
+
+        return StreakResults(start_balance, streaks, last_won, ladder, payout,
+                             total_balance / (rolls + 1), balance,
+                             stop_reason)
+
+    def find_next_streak(self, win_chance):
+        """Return a function that gives the length of the next losing
+        streak for the given chance of winning a roll, keeping it for the
+        runs after this one
+        """
+
+        if self.streak_source is None or \
+                self.streak_source[0] != win_chance:
+            self.streak_source = (
+                win_chance,
+                self.roll_source.streaks(win_chance).__next__)
+
+        return self.streak_source[1]
+
+    def simulate_runs(self, engine, progress_checks, screen, progress_bar,
+                      roll_budget=None, deadline=None):
+        """Simulate runs one at a time with the given engine, and yield the
+        result of each one as it finishes. Once the budget of rolls or time
+        is used up, the run that is going is stopped and no more are started.
+        The first run is always started, so there is at least one result.
+        """
+
+        sim_function = self.sim_function(engine)
+        instrument = get_instrument(self.instrument)
+        rolls_left = roll_budget
+        for sim_num in range(self.config.get_iterations()):
+            if sim_num and budget_exceeded(0, rolls_left, deadline):
+                break
+
+            self.print_progress(sim_num, progress_checks, screen,
+                                progress_bar)
+            if instrument.enabled:
+                start_time = time.perf_counter()
+            sim_result = sim_function(roll_limit=rolls_left,
+                                      deadline=deadline)
+            if instrument.enabled:
+                instrument.observe("run_seconds",
+                                   time.perf_counter() - start_time)
+                instrument.observe("run_rolls",
+                                   sim_result.get_rolls_until_bankrupt())
+            if rolls_left is not None:
+                rolls_left -= sim_result.get_rolls_until_bankrupt()
+
+            yield sim_result
+
+    def sim_function(self, engine):
+        """Return the method that simulates a single run for a one run at a
+        time engine
+        """
+
+        if engine == "python":
+            return self.single_sim
+        elif engine == "hot":
+            return self.hot_sim
+        elif engine == "streak":
+            return self.streak_sim
+        raise ValueError("Unknown simulation engine: %s" % engine)
+
+    def batch_sims(self, progress_checks, screen, progress_bar,
+                   roll_budget=None, deadline=None):
+        """Simulate every iteration at once with the batch engine.
+        Return a BalanceHistories with the balances of every simulation.
+        """
+
+        from primediceSim.batch import BatchEngine
+
+        iterations = self.config.get_iterations()
+        batch_engine = BatchEngine(self.config, self.account,
+                                   random_seed=self.random_seed,
+                                   rng_backend=self.rng_backend)
+
+        start_time = time.perf_counter()
+        histories = batch_engine.run(
+            iterations, progress=self.finished_progress(
+                progress_checks, screen, progress_bar),
+            roll_budget=roll_budget, deadline=deadline)
+        self.observe_batch(histories, time.perf_counter() - start_time)
+
+        return histories
+
+    def observe_batch(self, histories, seconds):
+        """Tell the instrument how long a run of the batch engine took, and
+        how many rolls each of its runs made. The runs move together, so
+        they have no time of their own.
+        """
+
+        instrument = get_instrument(self.instrument)
+        if instrument.enabled:
+            instrument.observe("batch_seconds", seconds)
+            for rolls in (histories.get_lengths() - 1).tolist():
+                instrument.observe("run_rolls", rolls)
+
+    def stream_runs(self, engine, progress_checks, screen, progress_bar,
+                    roll_budget=None, deadline=None,
+                    chunk_size=STREAM_CHUNK_SIZE):
+        """Simulate runs with the given engine, and yield the balance
+        history of each one and the reason it stopped as it finishes.
+        chunk_size - the number of runs the batch engine simulates at once.
+        Only the histories of one chunk are held in memory together.
+        """
+
+        if engine != "batch":
+            for sim_result in self.simulate_runs(
+                    engine, progress_checks, screen, progress_bar,
+                    roll_budget, deadline):
+                yield sim_result.get_balances(), sim_result.get_stop_reason()
+            return
+
+        from primediceSim.batch import BatchEngine
+        from primediceSim.parallel import split_iterations
+
+        iterations = self.config.get_iterations()
+        batch_engine = BatchEngine(self.config, self.account,
+                                   random_seed=self.random_seed,
+                                   rng_backend=self.rng_backend)
+        update_progress = self.finished_progress(progress_checks, screen,
+                                                 progress_bar)
+        finished = 0
+        rolls_left = roll_budget
+        for chunk in split_iterations(iterations, chunk_size):
+            if finished and budget_exceeded(0, rolls_left, deadline):
+                return
+
+            start_time = time.perf_counter()
+            histories = batch_engine.run(
+                chunk,
+                progress=lambda done: update_progress(finished + done),
+                roll_budget=rolls_left, deadline=deadline)
+            self.observe_batch(histories, time.perf_counter() - start_time)
+            finished += chunk
+            if rolls_left is not None:
+                rolls_left -= histories.size() - len(histories)
+
+            yield from zip(histories, histories.get_stop_reasons())
+
+    def streaming_sims(self, progress_checks, screen, progress_bar, engine,
+                       track_medians=False, sketch=None, output=None,
+                       roll_budget=None, deadline=None, precision=None,
+                       confidence=0.95, batch_size=100):
+        """Simulate every iteration, adding each run to running totals as it
+        finishes. Return the average of every simulation.
+        output - optional directory that the balance history of every run is
+        also written to, as it finishes.
+        precision - optional fraction of each mean that its confidence
+        interval has to be within. The precision is checked after every
+        batch_size runs, and no more runs are started once it is reached.
+        """
+
+        from primediceSim.aggregate import PartialResults
+        from primediceSim.histories import HistoryWriter
+
+        partial_results = PartialResults(track_medians=track_medians,
+                                         sketch=sketch)
+        writer = None
+        if output is not None:
+            writer = HistoryWriter(output, self.config, self.account,
+                                   random_seed=self.random_seed,
+                                   engine=engine,
+                                   rng_backend=self.rng_backend)
+
+        chunk_size = STREAM_CHUNK_SIZE
+        if precision is not None:
+            chunk_size = batch_size
+
+        for balances, stop_reason in self.stream_runs(
+                engine, progress_checks, screen, progress_bar, roll_budget,
+                deadline, chunk_size):
+            partial_results.add_balances(balances, stop_reason)
+            if writer is not None:
+                writer.append(balances, stop_reason)
+
+            if precision is not None and \
+                    partial_results.number_of_results % batch_size == 0 and \
+                    partial_results.precision_reached(precision, confidence):
+                break
+
+        if writer is not None:
+            writer.close()
+
+        return MergedResults(partial_results, instrument=self.instrument)
+
+    def parallel_sims(self, progress_checks, screen, progress_bar, engine,
+                      workers, track_medians=True, sketch=None):
+        """Split the iterations across a pool of worker processes.
+        Return the merged average of every simulation.
+        """
+
+        # Imported here because the parallel module builds on this one
+        from primediceSim.parallel import run_parallel
+
+        partial_results = run_parallel(
+            self.config, self.account, random_seed=self.random_seed,
+            workers=workers, engine=engine, track_medians=track_medians,
+            sketch=sketch, rng_backend=self.rng_backend,
+            progress=self.finished_progress(progress_checks, screen,
+                                            progress_bar))
+
+        return MergedResults(partial_results, instrument=self.instrument)
+
+    def finished_progress(self, progress_checks, screen, progress_bar):
+        """Return a function that updates the progress bar from the number of
+        finished runs.
+        """
+
+        # Runs finish out of order, so the progress bar follows the number of
+        # finished runs and is only moved when another checkpoint is reached
+        iterations = self.config.get_iterations()
+        progress_ticks = 100 / progress_checks
+        checks_done = [0]
+
+        def update_progress(finished):
+            checks = finished * progress_checks // iterations
+            if checks > checks_done[0]:
+                progress_bar.step(progress_ticks * (checks - checks_done[0]))
+                screen.update()
+                checks_done[0] = checks
+
+        return update_progress
+
     def print_progress(self, sim_num, progress_checks, screen, progress_bar):
         """Print the current progress of the simulation.
         progress_checks is the amount of progress checks
@@ -117,17 +585,75 @@ class Simulation:
         return progress_checks
 
     def print_settings(self):
-        """Print the settings that are being accessed by the simulation"""
+        """Print the settings that are being accessed by the simulation,
+        through the instrument's messages
+        """
 
-        print("\n[MESSAGE] Running new simulation\n")
-        print("Balance:", self.account.get_balance(), "\n")
-        print("Base bet:", self.config.get_base_bet())
-        print("Payout:", self.config.get_payout())
-        print("Iterations:", self.config.get_iterations())
-        print("Loss adder:", self.config.get_loss_adder(), "\n")
+        message = get_instrument(self.instrument).message
+        message("\n[MESSAGE] Running new simulation\n")
+        message("Balance: %s \n" % self.account.get_balance())
+        message("Base bet: %s" % self.config.get_base_bet())
+        message("Payout: %s" % self.config.get_payout())
+        message("Iterations: %s" % self.config.get_iterations())
+        message("Loss adder: %s \n" % self.config.get_loss_adder())
+
+    def run(self, progress_bar, screen, progress_checks=50, engine="python",
+            workers=0, streaming=False, median_error=None, cache=None,
+            output=None, roll_budget=None, time_budget=None, precision=None,
+            confidence=0.95, batch_size=100):
+        """Run several simulations and return the average of them all.
+        engine - "python" to simulate each run one roll at a time, "hot" to do
+        the same with every setting looked up once per run, which gives the
+        same results faster, "streak" to draw the length of each losing
+        streak instead of each roll, which follows the same odds and is much
+        faster when wins are rare, and rolls one at a time as "hot" does when
+        they are not, or "batch" to simulate every run at once with numpy
+        arrays.
+        workers - number of processes to split the runs across, None to use
+        every core, or 0 to run everything in this process.
+        streaming - add each run to running totals as soon as it finishes
+        instead of keeping every balance history. Memory then only grows with
+        the longest run, but median balances are not calculated unless
+        median_error is also given.
+        median_error - find medians and other percentiles approximately, to
+        within this fraction of each balance, using a small sketch of the
+        balances rather than every one of them.
+        cache - optional ResultCache. Seeded results are then taken from it
+        when the same settings were run before, and saved to it otherwise.
+        output - optional directory to write the balance history of every run
+        to as it finishes, instead of keeping them in memory. The batch engine
+        writes them a chunk of runs at a time. They can be opened again later
+        with MergedResults.from_file. Only runs simulated in this process can
+        be written, so workers must be 0 and no cache can be given.
+        roll_budget - the most rolls to make over every run together
+        time_budget - the most seconds to spend simulating
+        Once either budget is used up, the runs that are still going are
+        stopped and counted as stopped by the budget, and no more runs are
+        started. The budgets only apply to runs simulated in this process
+        without a cache. Runs can also be stopped early by the stop conditions
+        of the configuration.
+        precision - run adaptively: simulate batch_size runs at a time, and
+        stop once the confidence intervals of the average rolls until
+        bankruptcy and of the average balance are both within this fraction
+        of their means, at the given confidence level between 0 and 1. The
+        configuration's iterations are then the most runs to simulate. The
+        intervals reached and whether the precision was met are kept on the
+        returned results. Adaptive runs are only simulated in this process
+        without a cache.
+        """
 
-    def run(self, progress_bar, screen, progress_checks=50):
-        """Run several simulations and return the average of them all"""
+        if output is not None and (workers != 0 or cache is not None):
+            raise ValueError("Histories can only be written by simulations "
+                             "run in this process without a cache")
+        has_budget = roll_budget is not None or time_budget is not None
+        if has_budget and (workers != 0 or cache is not None):
+            raise ValueError("Budgets can only be given to simulations run "
+                             "in this process without a cache")
+        if precision is not None and (workers != 0 or cache is not None):
+            raise ValueError("Adaptive simulations can only be run in this "
+                             "process without a cache")
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least 1")
 
         progress_checks = self.verify_progress_checks(progress_checks)
 
@@ -136,32 +662,101 @@ class Simulation:
 
         self.print_settings()
 
-        print("[Progress] Running simulations...\n")
-        start_time = time.time()
-
-        # Keep a running total of rolls from all simulations to calculate
-        # overall average.
-        total_rolls_result = 0
-        # Keep a running total of average balance from all simulations to
-        # calculate overall average.
-        total_balance_result = 0
-        self.total_balance_lists = []
-        each_sim_result = []
+        instrument = get_instrument(self.instrument)
+        with instrument.phase("simulation", engine=engine, workers=workers,
+                              balance=self.account.get_balance(),
+                              base_bet=self.config.get_base_bet(),
+                              payout=self.config.get_payout(),
+                              iterations=self.config.get_iterations(),
+                              loss_adder=self.config.get_loss_adder(),
+                              max_rolls=self.config.get_max_rolls(),
+                              take_profit=self.config.get_take_profit(),
+                              stop_loss=self.config.get_stop_loss(),
+                              roll_budget=roll_budget,
+                              time_budget=time_budget, precision=precision,
+                              confidence=confidence):
+            deadline = None
+            if time_budget is not None:
+                deadline = time.monotonic() + time_budget
+            sim_result = self.simulate(progress_bar, screen, progress_checks,
+                                       engine, workers, streaming,
+                                       median_error, cache, output,
+                                       roll_budget, deadline, precision,
+                                       confidence, batch_size)
+            if precision is not None:
+                sim_result.set_precision_target(precision, confidence)
+
+        if instrument.enabled:
+            instrument.count("runs_completed", sim_result.number_of_results)
+            instrument.count("runs_censored", sim_result.censored_runs)
+            instrument.count("rolls_simulated", sim_result.get_total_rolls())
+            instrument.count("bytes_retained",
+                             sim_result.get_retained_bytes())
 
-        iterations = self.config.get_iterations()
-        for sim_num in range(iterations):
-            self.print_progress(sim_num, progress_checks, screen, progress_bar)
-            sim_result = self.single_sim()
-            each_sim_result.append(sim_result)
-            total_rolls_result += sim_result.get_rolls_until_bankrupt()
-            total_balance_result += sim_result.get_average_balance()
-            self.total_balance_lists.append(sim_result.get_balances())
-
-        sim_result = AverageResults(each_sim_result)
         sim_result.print_results()
 
-        time_taken = str((time.time() - start_time))[:5]
-        print("[Time] Time taken: --- %s seconds ---" % time_taken, "\n")
+        return sim_result
+
+    def simulate(self, progress_bar, screen, progress_checks, engine, workers,
+                 streaming, median_error, cache, output, roll_budget=None,
+                 deadline=None, precision=None, confidence=0.95,
+                 batch_size=100):
+        """Simulate every iteration in the way chosen by run, and return the
+        average of every simulation
+        """
+
+        from primediceSim.histories import BalanceHistories
+        from primediceSim.sketch import BalanceSketch
+
+        self.total_balance_lists = []
+
+        sketch = None
+        if median_error is not None:
+            sketch = BalanceSketch(median_error)
+        track_medians = not streaming or sketch is not None
+
+        if cache is not None:
+            sim_result = MergedResults(cache.run(
+                self.config, self.account, self.random_seed, engine=engine,
+                workers=workers, track_medians=track_medians,
+                median_error=median_error, rng_backend=self.rng_backend,
+                progress=self.finished_progress(progress_checks, screen,
+                                                progress_bar)),
+                instrument=self.instrument)
+        elif workers != 0:
+            sim_result = self.parallel_sims(progress_checks, screen,
+                                            progress_bar, engine, workers,
+                                            track_medians, sketch)
+        elif streaming or sketch is not None or output is not None or \
+                precision is not None:
+            sim_result = self.streaming_sims(progress_checks, screen,
+                                             progress_bar, engine,
+                                             track_medians, sketch, output,
+                                             roll_budget, deadline, precision,
+                                             confidence, batch_size)
+        else:
+            if engine == "batch":
+                histories = self.batch_sims(progress_checks, screen,
+                                            progress_bar, roll_budget,
+                                            deadline)
+            else:
+                # Each run's balances are moved into one shared array as soon
+                # as the run finishes, rather than kept as a list of ints
+                histories = BalanceHistories()
+                for sim_result in self.simulate_runs(
+                        engine, progress_checks, screen, progress_bar,
+                        roll_budget, deadline):
+                    histories.append(sim_result.get_balances(),
+                                     sim_result.get_stop_reason())
+
+            # Every result looks at its own part of the shared array
+            self.total_balance_lists = list(histories)
+            each_sim_result = [
+                Results(balances=balances, stop_reason=stop_reason) for
+                balances, stop_reason in zip(self.total_balance_lists,
+                                             histories.get_stop_reasons())]
+            sim_result = AverageResults(each_sim_result, histories=histories,
+                                        instrument=self.instrument)
 
         return sim_result
 
@@ -169,11 +764,22 @@ class Simulation:
 class AverageResults:
     """Contain the average of the results of multiple simulations"""
 
-    def __init__(self, results_list):
+    def __init__(self, results_list, histories=None, instrument=None):
+        """histories - optional BalanceHistories that already holds the
+        balances of every result, in the same order. One is made from the
+        results if it is not given.
+        instrument - optional Instrument that is told how long each average
+        takes to find
+        """
+        self.instrument = get_instrument(instrument)
         self.results_list = results_list
         self.number_of_results = len(self.results_list)
-        self.total_balances_list = [result.get_balances() for result in
-                                    self.results_list]
+        if histories is None:
+            from primediceSim.histories import BalanceHistories
+
+            histories = BalanceHistories.from_lists(
+                [result.get_balances() for result in self.results_list])
+        self.histories = histories
 
         self.overall_average_balance = self.find_average_bal()
         self.average_rolls_until_bankrupt = \
@@ -181,6 +787,51 @@ class AverageResults:
         self.average_balances = self.find_average_balances()
         self.median_balances = self.find_median_balances()
         self.num_of_rolls = len(self.average_balances)
+        self.stop_counts = self.find_stop_counts()
+        self.censored_runs = self.find_censored_runs()
+        self.average_final_balance = self.find_average_final_balance()
+
+        # Only set by adaptive runs, through set_precision_target
+        self.precision = None
+        self.confidence = None
+        self.confidence_intervals = None
+        self.precision_reached = None
+
+    def set_precision_target(self, precision, confidence=0.95):
+        """Find the confidence intervals of the means, and whether they are
+        within the given fraction of the means
+        """
+
+        from primediceSim.aggregate import relative_half_width
+
+        self.precision = precision
+        self.confidence = confidence
+        self.confidence_intervals = self.find_confidence_intervals(confidence)
+        self.precision_reached = all(
+            relative_half_width(interval) <= precision for interval in
+            self.confidence_intervals.values())
+
+    def find_confidence_intervals(self, confidence=0.95):
+        """Find the confidence intervals of the mean rolls until bankruptcy
+        and of the mean average balance of the runs
+        """
+
+        from primediceSim.aggregate import confidence_interval
+
+        rolls = [result.get_rolls_until_bankrupt() for result in
+                 self.results_list]
+        average_balances = [result.get_average_balance() for result in
+                            self.results_list]
+
+        return {
+            "average_rolls_until_bankrupt": confidence_interval(
+                sum(rolls), sum(roll * roll for roll in rolls),
+                self.number_of_results, confidence),
+            "overall_average_balance": confidence_interval(
+                sum(average_balances),
+                sum(balance * balance for balance in average_balances),
+                self.number_of_results, confidence),
+        }
 
     def find_average_bal(self):
         """Calculate the average balance of all rolls before bankruptcy of
@@ -207,79 +858,208 @@ class AverageResults:
 
         return average
 
-    def find_average_balances(self):
-        """Find the average balances from the list of results"""
+    def find_stop_counts(self):
+        """Count the runs that ended for each of the reasons in STOP_REASONS
+        """
+
+        stop_counts = {reason: 0 for reason in STOP_REASONS}
+        for result in self.results_list:
+            stop_counts[result.get_stop_reason()] += 1
 
-        print("[Progress] Calculating average balances...")
-        start_time = time.time()
+        return stop_counts
 
-        # Produce a lists of lists that are all of the same length by adding
-        # zeros to the end of any list that is too short.
-        # Then, add the corresponding values of each list together to produce
-        # one list of sums
+    def find_censored_runs(self):
+        """Count the runs that were stopped before going bankrupt"""
 
-        sum_list = [sum(balances) for balances in
-                    itertools.zip_longest(*self.total_balances_list,
-                                          fillvalue=0)]
+        return self.number_of_results - self.stop_counts["bankrupt"]
 
-        # Take the list of sums, and divide each one by the number of data
-        # points to produce a mean value for each sum
-        num_of_balances = len(self.total_balances_list)
-        average_list = [total_balance // num_of_balances for
-                        total_balance in sum_list]
-        print("[Progress] Average balances calculated")
-        time_taken = str((time.time() - start_time))[:5]
-        print("[Time] Time taken: --- %s seconds ---" % time_taken, "\n")
+    def find_average_final_balance(self):
+        """Calculate the average balance that each run ended with"""
 
-        return average_list
+        total = 0
+        for result in self.results_list:
+            total += result.get_final_balance()
 
-    def find_median_balances(self):
-        """Find the median balances from the list of results"""
+        return total // self.number_of_results
 
-        print("[Progress] Calculating median balances...")
-        start_time = time.time()
+    def find_average_balances(self):
+        """Find the average balances from the list of results"""
 
-        equal_length_total_balances = itertools.zip_longest(
-            *self.total_balances_list, fillvalue=0)
+        # Runs that are shorter than the longest one count as zeros once they
+        # have ended
+        with self.instrument.phase("average_balances"):
+            return self.histories.find_average_balances()
 
-        grouped_balances = zip(equal_length_total_balances)
-        median_balances = []
-        for balances in grouped_balances:
-            median = int(np.median(balances))
-            median_balances.append(median)
-            # Stop calculating medians once they reach 0
-            if median == 0:
-                break
-        print("[Progress] Median balances calculated")
-        time_taken = str((time.time() - start_time))[:5]
-        print("[Time] Time taken: --- %s seconds ---" % time_taken, "\n")
+    def find_median_balances(self):
+        """Find the median balances from the list of results"""
 
-        return median_balances
+        # Medians stop being calculated once they reach 0
+        with self.instrument.phase("median_balances"):
+            return self.histories.find_median_balances()
 
     def get_average_balances(self):
         return self.average_balances
 
+    def get_total_rolls(self):
+        """Return the number of rolls made over every simulation"""
+
+        # Each history also holds the starting balance
+        return self.histories.size() - len(self.histories)
+
+    def get_retained_bytes(self):
+        """Return the memory taken up by the balances that are kept"""
+
+        return self.histories.balances.nbytes
+
     def get_median_balances(self):
         return self.median_balances
 
+    def get_percentile_balances(self, percentile):
+        """Find the given percentile, between 0 and 100, of the balances at
+        each roll number
+        """
+
+        return self.histories.find_percentile_balances(percentile)
+
     def print_results(self):
-        """Print out the results saved with explaining labels"""
-        print("\n[Results] Average rolls until bankruptcy: " +
-              str(self.average_rolls_until_bankrupt))
-        print("[Results] Average balance during run: " +
-              str(self.overall_average_balance))
+        """Print out the results saved with explaining labels, through the
+        instrument's messages
+        """
+
+        message = self.instrument.message
+        message("\n[Results] Average rolls until bankruptcy: " +
+                str(self.average_rolls_until_bankrupt))
+        message("[Results] Average balance during run: " +
+                str(self.overall_average_balance))
+        if self.censored_runs:
+            # Runs that were stopped early would have gone on to make more
+            # rolls, so the average rolls is only a lower bound
+            message("[Results] Runs stopped before bankruptcy: " +
+                    str(self.censored_runs))
+            message("[Results] Runs ended by each condition: " +
+                    ", ".join("%s %d" % (reason, count) for reason, count in
+                              self.stop_counts.items() if count))
+            message("[Results] Average final balance: " +
+                    str(self.average_final_balance))
+        if self.confidence_intervals is not None:
+            message("[Results] Iterations used: " +
+                    str(self.number_of_results))
+            for name, (low, high) in self.confidence_intervals.items():
+                message("[Results] %d%% confidence interval of %s: %.2f to "
+                        "%.2f" % (round(self.confidence * 100),
+                                  name.replace("_", " "), low, high))
+            if not self.precision_reached:
+                message("[WARNING] The requested precision was not reached "
+                        "before the iterations or budget ran out")
+
+        message("\n======================================================")
+
+
+class MergedResults(AverageResults):
+    """Contain the average of the results of multiple simulations, taken
+    from the running totals kept by a PartialResults instead of every result
+    """
+
+    def __init__(self, partial_results, instrument=None):
+        self.instrument = get_instrument(instrument)
+        self.partial_results = partial_results
+        self.results_list = []
+        self.number_of_results = partial_results.number_of_results
+        self.histories = None
+
+        self.overall_average_balance = self.find_average_bal()
+        self.average_rolls_until_bankrupt = \
+            self.find_average_rolls_until_bankrupt()
+        self.average_balances = self.find_average_balances()
+        self.median_balances = self.find_median_balances()
+        self.num_of_rolls = len(self.average_balances)
+        self.stop_counts = self.find_stop_counts()
+        self.censored_runs = self.find_censored_runs()
+        self.average_final_balance = self.find_average_final_balance()
+
+        self.precision = None
+        self.confidence = None
+        self.confidence_intervals = None
+        self.precision_reached = None
+
+    @classmethod
+    def from_file(cls, path, median_error=None, chunk_balances=1 << 24,
+                  instrument=None):
+        """Open the histories written to a directory by Simulation.run and
+        find their averages a chunk at a time, without reading every history
+        into memory or simulating them again.
+        median_error - find medians approximately, to within this fraction of
+        each balance, which keeps the memory used for them small
+        chunk_balances - the number of balances to read in one go
+        """
+
+        from primediceSim.histories import MappedHistories
+        from primediceSim.sketch import BalanceSketch
+
+        histories = MappedHistories(path, chunk_balances=chunk_balances)
+        sketch = None
+        if median_error is not None:
+            sketch = BalanceSketch(median_error)
+
+        with get_instrument(instrument).phase("read_histories", path=path):
+            partial_results = histories.summarize(sketch=sketch)
+        merged_results = cls(partial_results, instrument=instrument)
+        merged_results.histories = histories
+
+        return merged_results
+
+    def find_average_bal(self):
+        return self.partial_results.find_average_bal()
+
+    def find_average_rolls_until_bankrupt(self):
+        return self.partial_results.find_average_rolls_until_bankrupt()
 
-        print("\n======================================================")
+    def find_stop_counts(self):
+        return self.partial_results.find_stop_counts()
+
+    def find_average_final_balance(self):
+        return self.partial_results.find_average_final_balance()
+
+    def find_confidence_intervals(self, confidence=0.95):
+        return self.partial_results.find_confidence_intervals(confidence)
+
+    def find_average_balances(self):
+        with self.instrument.phase("average_balances"):
+            return self.partial_results.find_average_balances()
+
+    def find_median_balances(self):
+        with self.instrument.phase("median_balances"):
+            return self.partial_results.find_median_balances()
+
+    def get_total_rolls(self):
+        return self.partial_results.total_rolls
+
+    def get_retained_bytes(self):
+        return self.partial_results.get_retained_bytes()
+
+    def get_runs_remaining(self):
+        return self.partial_results.find_runs_remaining()
+
+    def get_percentile_balances(self, percentile):
+        return self.partial_results.find_percentile_balances(percentile)
 
 
 class Results:
     """Contain the results of a simulation"""
 
-    def __init__(self, balances):
+    def __init__(self, balances, stop_reason="bankrupt"):
+        """stop_reason - the reason from STOP_REASONS that the run ended"""
         self.balances = balances
+        self.stop_reason = stop_reason
         # Initial balance does't count when counting the total rolls
-        self.rolls_until_bankrupt = len(balances[1:])
-        self.average_balance = np.mean(balances)
+        self.rolls_until_bankrupt = max(len(balances) - 1, 0)
+        # Lists are averaged without numpy, so that simulating single runs
+        # never has to load it. Histories kept in numpy arrays average
+        # themselves.
+        if hasattr(balances, "mean"):
+            self.average_balance = balances.mean()
+        else:
+            self.average_balance = sum(balances) / len(balances)
 
     def get_rolls_until_bankrupt(self):
         return self.rolls_until_bankrupt
@@ -292,3 +1072,38 @@ class Results:
 
     def get_balances(self):
         return self.balances
+
+    def get_stop_reason(self):
+        return self.stop_reason
+
+    def get_final_balance(self):
+        return self.balances[-1]
+
+
+class StreakResults(Results):
+    """Contain the results of a simulation made by the streak engine, which
+    keeps the number of rolls in each streak rather than every balance
+    """
+
+    def __init__(self, start_balance, streaks, last_won, ladder, payout,
+                 average_balance, final_balance, stop_reason="bankrupt"):
+        """streaks - the number of rolls in each streak, which was won on
+        its last roll except for the last streak when last_won is False
+        ladder - the BetLadder that the streaks were lost on
+        """
+        self.start_balance = start_balance
+        self.streaks = streaks
+        self.last_won = last_won
+        self.ladder = ladder
+        self.payout = payout
+        self.stop_reason = stop_reason
+        self.rolls_until_bankrupt = sum(streaks)
+        self.average_balance = average_balance
+        self.final_balance = final_balance
+
+    def get_balances(self):
+        return expand_streaks(self.start_balance, self.streaks,
+                              self.last_won, self.ladder, self.payout)
+
+    def get_final_balance(self):
+        return self.final_balance
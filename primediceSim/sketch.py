@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+
+
+class BalanceSketch:
+    """Sort balances into logarithmically sized buckets, so that the
+    distribution of balances can be kept in a small, mergeable table.
+    Any balance read back from a bucket is within relative_error of every
+    balance that was put into it.
+    """
+
+    def __init__(self, relative_error=0.01):
+        """relative_error - the largest allowed error, as a fraction of the
+        balance, between 0 and 1
+        """
+        if not 0 < relative_error < 1:
+            raise ValueError("The relative error must be between 0 and 1")
+
+        self.relative_error = relative_error
+        # Each bucket covers balances from gamma^(k - 1) to gamma^k
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma = math.log(self.gamma)
+
+    def __eq__(self, other):
+        return isinstance(other, BalanceSketch) and \
+            self.relative_error == other.relative_error
+
+    def bucket(self, balances):
+        """Return the bucket key of each balance.
+        Zero has the key 0, and the keys of negative balances are the negated
+        keys of their positive values, so keys sort in the same order as the
+        balances.
+        """
+
+        balances = np.asarray(balances, dtype=np.int64)
+        magnitudes = np.abs(balances)
+
+        keys = np.zeros(balances.shape, dtype=np.int64)
+        nonzero = magnitudes > 0
+        # Whole balances are at least 1, so their bucket number is never
+        # negative and 1 is added to keep them apart from the zero bucket
+        keys[nonzero] = np.ceil(
+            np.log(magnitudes[nonzero]) / self.log_gamma).astype(np.int64) + 1
+
+        return np.sign(balances) * keys
+
+    def value(self, keys):
+        """Return the balance that stands for every balance in each bucket"""
+
+        keys = np.asarray(keys, dtype=np.int64)
+        magnitudes = np.abs(keys) - 1
+
+        # The point that is the same relative distance from both edges of the
+        # bucket
+        values = 2 * self.gamma ** magnitudes.astype(np.float64) / \
+            (self.gamma + 1)
+
+        return np.where(keys == 0, 0.0, np.sign(keys) * values)
@@ -0,0 +1,291 @@
+# numpy is imported by the methods that work on arrays, so that choosing a
+# strategy never has to wait for numpy to load
+
+
+class Strategy:
+    """Decide the next bet of a run from the last bet and whether it won.
+    Every strategy starts each run at the base bet with a state of 0. The
+    state is a single whole number per run, such as the number of losses in a
+    row, so that the batch engine can keep it for every run in one array.
+    Strategies only hold their settings, in slots, and never the state of a
+    run, so one strategy can be shared by every run.
+
+    Subclasses give next_bet, and should also give next_bets so that the
+    batch engine can move every run at once rather than one at a time.
+    """
+
+    __slots__ = ()
+
+    # The name that make_strategy knows the strategy by
+    name = None
+
+    # Strategies that never look at the state are spared from keeping it
+    uses_state = True
+
+    def next_bet(self, base_bet, bet, won, state):
+        """Return the bet to make after a roll of the given bet was won or
+        lost, and the new state of the run
+        """
+
+        raise NotImplementedError
+
+    def next_bets(self, base_bet, bets, won, states):
+        """Do the same as next_bet for every run at once, given numpy arrays
+        of the bets, whether they won and the states. Return arrays of the new
+        bets and states.
+        This works for any strategy but goes through the runs one at a time.
+        """
+
+        import numpy as np
+
+        new_bets = np.empty(bets.size, dtype=np.float64)
+        new_states = np.empty(states.size, dtype=np.int64)
+        for run_num in range(bets.size):
+            new_bets[run_num], new_states[run_num] = self.next_bet(
+                base_bet, float(bets[run_num]), bool(won[run_num]),
+                int(states[run_num]))
+
+        return new_bets, new_states
+
+    def get_settings(self):
+        """Return the settings of the strategy, which make_strategy can use
+        to make it again
+        """
+
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def describe(self):
+        """Return the name and settings of the strategy"""
+
+        return dict(self.get_settings(), name=self.name)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and \
+            self.get_settings() == other.get_settings()
+
+    def __hash__(self):
+        return hash((self.name, tuple(sorted(self.get_settings().items()))))
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join(
+            "%s=%r" % item for item in self.get_settings().items()))
+
+
+def increase(bet, percent):
+    """Increase a bet by a percent, or go back to the base bet if the percent
+    is None. Return None in that case, so the caller can use the base bet.
+    """
+
+    if percent is None:
+        return None
+    return bet + bet * (percent / 100)
+
+
+class Martingale(Strategy):
+    """Go back to the base bet after a win, and increase the bet by the loss
+    adder percent after a loss. This is what the auto-better does.
+    """
+
+    __slots__ = ("loss_adder",)
+    name = "martingale"
+    uses_state = False
+
+    def __init__(self, loss_adder=100):
+        self.loss_adder = loss_adder
+
+    def next_bet(self, base_bet, bet, won, state):
+        if won:
+            return base_bet, state
+        return bet + bet * (self.loss_adder / 100), state
+
+    def next_bets(self, base_bet, bets, won, states):
+        import numpy as np
+
+        return np.where(won, base_bet,
+                        bets + bets * (self.loss_adder / 100)), states
+
+
+class PercentAdjust(Strategy):
+    """Change the bet by a percent after each win and after each loss, as the
+    on win and on loss settings of the auto-better do.
+    on_win - percent to increase the bet by after a win, or None to go back to
+    the base bet
+    on_loss - percent to increase the bet by after a loss, or None to go back
+    to the base bet
+    reset_after - go back to the base bet after this many losses in a row, or
+    None to never do so
+    The state is the number of losses in a row.
+    """
+
+    __slots__ = ("on_win", "on_loss", "reset_after")
+    name = "percent"
+
+    def __init__(self, on_win=None, on_loss=100, reset_after=None):
+        self.on_win = on_win
+        self.on_loss = on_loss
+        self.reset_after = reset_after
+
+    def next_bet(self, base_bet, bet, won, state):
+        if won:
+            new_bet = increase(bet, self.on_win)
+            state = 0
+        else:
+            state += 1
+            if self.reset_after is not None and state >= self.reset_after:
+                new_bet = None
+                state = 0
+            else:
+                new_bet = increase(bet, self.on_loss)
+
+        if new_bet is None:
+            new_bet = base_bet
+
+        return new_bet, state
+
+    def next_bets(self, base_bet, bets, won, states):
+        import numpy as np
+
+        new_bets = np.empty(bets.size, dtype=np.float64)
+        for mask, percent in ((won, self.on_win), (~won, self.on_loss)):
+            if percent is None:
+                new_bets[mask] = base_bet
+            else:
+                new_bets[mask] = bets[mask] + bets[mask] * (percent / 100)
+
+        states = np.where(won, 0, states + 1)
+        if self.reset_after is not None:
+            reset = states >= self.reset_after
+            new_bets[reset] = base_bet
+            states[reset] = 0
+
+        return new_bets, states
+
+
+# The Fibonacci numbers that bets are multiplied by. Later ones could never be
+# afforded, so runs that reach the end stay there until they go bankrupt.
+FIBONACCI = [1, 1]
+while len(FIBONACCI) < 90:
+    FIBONACCI.append(FIBONACCI[-1] + FIBONACCI[-2])
+
+
+class Fibonacci(Strategy):
+    """Bet the base bet times a Fibonacci number, moving one number up after
+    a loss and two numbers down after a win.
+    The state is the position in the Fibonacci numbers.
+    """
+
+    __slots__ = ()
+    name = "fibonacci"
+
+    def next_bet(self, base_bet, bet, won, state):
+        if won:
+            state = max(state - 2, 0)
+        else:
+            state = min(state + 1, len(FIBONACCI) - 1)
+
+        return base_bet * FIBONACCI[state], state
+
+    def next_bets(self, base_bet, bets, won, states):
+        import numpy as np
+
+        states = np.where(won, np.maximum(states - 2, 0),
+                          np.minimum(states + 1, len(FIBONACCI) - 1))
+        multipliers = np.array(FIBONACCI, dtype=np.float64)[states]
+
+        return base_bet * multipliers, states
+
+
+class DAlembert(Strategy):
+    """Add a step to the bet after a loss and take it away after a win,
+    never going below the base bet.
+    step - the amount to add or take away, or None to use the base bet
+    """
+
+    __slots__ = ("step",)
+    name = "dalembert"
+    uses_state = False
+
+    def __init__(self, step=None):
+        self.step = step
+
+    def next_bet(self, base_bet, bet, won, state):
+        step = base_bet if self.step is None else self.step
+        if won:
+            return max(bet - step, base_bet), state
+        return bet + step, state
+
+    def next_bets(self, base_bet, bets, won, states):
+        import numpy as np
+
+        step = base_bet if self.step is None else self.step
+
+        return np.where(won, np.maximum(bets - step, base_bet),
+                        bets + step), states
+
+
+class Paroli(Strategy):
+    """Increase the bet by the win adder percent after each win, and go back
+    to the base bet after a loss or once target_wins wins in a row have been
+    made.
+    The state is the number of wins in a row.
+    """
+
+    __slots__ = ("target_wins", "win_adder")
+    name = "paroli"
+
+    def __init__(self, target_wins=3, win_adder=100):
+        self.target_wins = target_wins
+        self.win_adder = win_adder
+
+    def next_bet(self, base_bet, bet, won, state):
+        if not won:
+            return base_bet, 0
+
+        state += 1
+        if state >= self.target_wins:
+            return base_bet, 0
+        return bet + bet * (self.win_adder / 100), state
+
+    def next_bets(self, base_bet, bets, won, states):
+        import numpy as np
+
+        states = np.where(won, states + 1, 0)
+        finished = states >= self.target_wins
+        states[finished] = 0
+        raised = won & ~finished
+
+        return np.where(raised, bets + bets * (self.win_adder / 100),
+                        base_bet), states
+
+
+STRATEGIES = {strategy.name: strategy for strategy in
+              [Martingale, PercentAdjust, Fibonacci, DAlembert, Paroli]}
+
+
+def make_strategy(name, **settings):
+    """Make one of the built in strategies from its name and settings"""
+
+    if name not in STRATEGIES:
+        raise ValueError("Unknown betting strategy: %s" % name)
+
+    return STRATEGIES[name](**settings)
+
+
+def parse_strategy(text):
+    """Make a strategy from text such as "paroli" or
+    "percent:on_win=50,on_loss=100,reset_after=5". Settings that are "none"
+    are turned off.
+    """
+
+    name, _, settings_text = text.partition(":")
+    settings = {}
+    for setting in filter(None, settings_text.split(",")):
+        key, _, value = setting.partition("=")
+        if value.lower() == "none":
+            settings[key.strip()] = None
+        else:
+            number = float(value)
+            settings[key.strip()] = int(number) if number.is_integer() \
+                else number
+
+    return make_strategy(name.strip(), **settings)
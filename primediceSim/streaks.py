@@ -0,0 +1,114 @@
+import bisect
+import functools
+import math
+import threading
+
+
+class BetLadder:
+    """The bets of a losing streak under the Martingale strategy, and what
+    they cost together. Every streak starts at the base bet, so the same
+    ladder serves every streak of every run of every configuration with the
+    same base bet and loss adder, and is only made longer when a balance
+    could go further down it than any before.
+    bets[i] - the bet of roll i of a streak, counting from 0
+    costs[i] - the balance taken by the first i rolls of a streak
+    cost_totals[i] - costs[1] + ... + costs[i], used to add up the balances
+    after each of the first i rolls without going through them
+    needs[i] - the least whole balance that can make the first i + 1 rolls of
+    a streak, which only ever grows, so it can be searched
+    """
+
+    def __init__(self, base_bet, loss_adder_decimal):
+        self.base_bet = base_bet
+        self.loss_adder_decimal = loss_adder_decimal
+        self.bets = [base_bet]
+        self.costs = [0]
+        self.cost_totals = [0]
+        self.needs = [math.ceil(base_bet)]
+        # Set once a bet is too large for a float. The ladder then ends with
+        # that bet, which no balance can pay.
+        self.overflowed = False
+        # Ladders are shared, so only one thread may make one longer at once
+        self.lock = threading.Lock()
+
+    def extend(self, balance, length=None):
+        """Work out the rolls of a streak that the balance can make, but no
+        more than length of them
+        """
+
+        bets = self.bets
+        needs = self.needs
+        if self.overflowed or needs[-1] > balance or \
+                (length is not None and len(bets) >= length):
+            return
+
+        with self.lock:
+            costs = self.costs
+            cost_totals = self.cost_totals
+            while not self.overflowed and needs[-1] <= balance and \
+                    (length is None or len(bets) < length):
+                bet = bets[-1]
+                # The same sums as the engines that roll one at a time make
+                new_bet = bet + bet * self.loss_adder_decimal
+                cost = costs[-1] + int(bet)
+                costs.append(cost)
+                cost_totals.append(cost_totals[-1] + cost)
+                bets.append(new_bet)
+                # The needs are added last, since other threads go by them
+                # to find which rolls are ready
+                if math.isfinite(new_bet):
+                    # A whole balance can pay a bet once it reaches the bet
+                    # rounded up
+                    needs.append(cost + math.ceil(new_bet))
+                else:
+                    needs.append(math.inf)
+                    self.overflowed = True
+
+    def horizon(self, balance, stop_loss=None, limit=None):
+        """Return how many rolls of a losing streak, starting at the base
+        bet, can be made from the balance before the bet is more than what is
+        left or what is left reaches the stop loss, but no more than limit.
+        """
+
+        self.extend(balance, limit)
+
+        rolls = bisect.bisect_right(self.needs, balance)
+        if stop_loss is not None:
+            rolls = min(rolls, bisect.bisect_left(self.costs,
+                                                  balance - stop_loss))
+        if limit is not None:
+            rolls = min(rolls, limit)
+
+        return rolls
+
+
+@functools.lru_cache(maxsize=64)
+def find_bet_ladder(base_bet, loss_adder_decimal):
+    """Return the BetLadder of the given settings, which is shared by every
+    engine, run and configuration that asks for the same settings
+    """
+
+    return BetLadder(base_bet, loss_adder_decimal)
+
+
+def expand_streaks(balance, streaks, last_won, ladder, payout):
+    """Return the balance after every roll of a run, starting with the given
+    balance, from the number of rolls in each of its streaks. Every streak is
+    lost until its last roll, which is won, except that the last streak of
+    the run was all lost if last_won is False.
+    """
+
+    costs = ladder.costs
+    balances = [balance]
+    for streak_num, rolls in enumerate(streaks):
+        won = last_won or streak_num < len(streaks) - 1
+        losses = rolls - 1 if won else rolls
+        balances.extend([balance - cost for cost in costs[1:losses + 1]])
+        if won:
+            bet = ladder.bets[losses]
+            balance += int(bet * payout) - costs[losses] - int(bet)
+            balances.append(balance)
+        else:
+            balance -= costs[losses]
+
+    return balances
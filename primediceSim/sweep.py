@@ -0,0 +1,197 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from primediceSim.account import Account
+from primediceSim.aggregate import PartialResults
+from primediceSim.batch import BatchEngine, SharedRolls
+from primediceSim.configuration import (Configuration,
+                                        FrozenConfiguration)
+from primediceSim.parallel import split_iterations
+
+
+def simulate_task(threshold, points, chunk, chunk_num, random_seed,
+                  rng_backend="pcg64"):
+    """Simulate one chunk of runs of some of the grid points that share a
+    roll under threshold, giving them all the same rolls. Return the
+    PartialResults and the longest run of each point, in the same order.
+    """
+
+    payouts, loss_adders, base_bets, balances = zip(*points)
+    configs = FrozenConfiguration.from_columns({
+        "base_bet": base_bets,
+        "payout": payouts,
+        "iterations": [chunk] * len(points),
+        "loss_adder": loss_adders,
+    })
+
+    # The seed only depends on the threshold and the chunk number, so a
+    # chunk is given the same rolls whichever task simulates it. These are
+    # the seeds that SeedSequence.spawn would give each chunk.
+    chunk_seed = np.random.SeedSequence([random_seed, threshold],
+                                        spawn_key=(chunk_num,))
+    # Rolls for the chunk are drawn once and reused by every point
+    shared_rolls = SharedRolls(chunk, random_seed=chunk_seed,
+                               rng_backend=rng_backend)
+
+    point_results = []
+    for config, balance in zip(configs, balances):
+        batch_engine = BatchEngine(config, Account(balance),
+                                   shared_rolls=shared_rolls)
+        histories = batch_engine.run(chunk)
+
+        partial_results = PartialResults(track_medians=False)
+        partial_results.add_histories(histories)
+        point_results.append((partial_results,
+                              int(histories.get_lengths().max()) - 1))
+
+    return point_results
+
+
+def make_row(threshold, point, iterations, partial_results, longest_run):
+    """Return the summary row of a grid point from the totals of its runs"""
+
+    payout, loss_adder, base_bet, balance = point
+    return {
+        "payout": payout,
+        "loss_adder": loss_adder,
+        "base_bet": base_bet,
+        "balance": balance,
+        "roll_under_threshold": threshold,
+        "iterations": iterations,
+        "average_rolls_until_bankrupt":
+            partial_results.find_average_rolls_until_bankrupt(),
+        "overall_average_balance": partial_results.find_average_bal(),
+        "longest_run": longest_run,
+    }
+
+
+def split_points(points, slices):
+    """Split the points into at most the given number of slices of about
+    the same size
+    """
+
+    size = -(-len(points) // slices)
+    return [points[start:start + size] for start in
+            range(0, len(points), size)]
+
+
+class Sweep:
+    """Simulate every combination of a grid of settings, remembering the
+    results of each point so that growing the grid only simulates the new
+    points
+    """
+
+    def __init__(self, iterations=100, random_seed=0, workers=None,
+                 chunk_size=1000, rng_backend="pcg64"):
+        """random_seed - seed that the rolls of every point are drawn from,
+        or None to pick one. Points with the same roll under value are given
+        the same rolls.
+        workers - number of processes, None to use every core, or 0 to run
+        everything in this process
+        rng_backend - the bit generator to draw the rolls with, one of
+        RNG_BACKENDS from the rolls module
+        """
+        self.iterations = iterations
+        self.rng_backend = rng_backend
+        if random_seed is None:
+            # Pick one seed for the whole sweep, so points added later are
+            # still given the same rolls as the points before them
+            random_seed = np.random.SeedSequence().entropy
+        self.random_seed = random_seed
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+        # The summary row of every finished point, by its settings
+        self.finished = {}
+
+    def run(self, payouts, loss_adders, base_bets, balances):
+        """Simulate every combination of the given values and return one
+        summary row for each, as a list of dictionaries
+        """
+
+        points = list(itertools.product(payouts, loss_adders, base_bets,
+                                        balances))
+        # A value given twice gives the same point twice, which is only
+        # simulated once
+        new_points = list(dict.fromkeys(point for point in points if point
+                                        not in self.finished))
+
+        for row in self.simulate(self.group_points(new_points)):
+            point = (row["payout"], row["loss_adder"], row["base_bet"],
+                     row["balance"])
+            self.finished[point] = row
+
+        return [self.finished[point] for point in points]
+
+    @staticmethod
+    def group_points(points):
+        """Group the points by roll under threshold, which only depends on the
+        payout
+        """
+
+        thresholds = {}
+        groups = {}
+        for point in points:
+            payout = point[0]
+            if payout not in thresholds:
+                thresholds[payout] = Configuration(
+                    base_bet=1, payout=payout).get_roll_under_threshold()
+            groups.setdefault(thresholds[payout], []).append(point)
+
+        return groups
+
+    def make_tasks(self, groups):
+        """Split the groups of points into tasks of one chunk of runs each.
+        When there are too few groups and chunks to give every worker a
+        task, such as with a single payout, the points of each group are
+        split up as well.
+        """
+
+        chunks = split_iterations(self.iterations, self.chunk_size)
+        slices = 1
+        if self.workers != 0 and groups:
+            worker_count = self.workers or os.cpu_count() or 1
+            slices = -(-worker_count // (len(groups) * len(chunks)))
+
+        return [(threshold, point_slice, chunk, chunk_num, self.random_seed,
+                 self.rng_backend)
+                for threshold, points in groups.items()
+                for point_slice in split_points(points, slices)
+                for chunk_num, chunk in enumerate(chunks)]
+
+    def simulate(self, groups):
+        """Simulate each group of points, in this process or across a pool of
+        workers, and return every summary row
+        """
+
+        tasks = self.make_tasks(groups)
+
+        if not tasks:
+            task_results = []
+        elif self.workers == 0:
+            task_results = [simulate_task(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                task_results = list(executor.map(simulate_task, *zip(*tasks)))
+
+        # The chunks of each point are collected in chunk order, so that the
+        # floating point totals do not depend on how the points were split
+        chunk_results = {}
+        for task, point_results in zip(tasks, task_results):
+            threshold, points = task[:2]
+            for point, result in zip(points, point_results):
+                chunk_results.setdefault((threshold, point), []).append(
+                    result)
+
+        rows = []
+        for (threshold, point), results in chunk_results.items():
+            partial_results = PartialResults(track_medians=False)
+            partial_results.merge(*[result[0] for result in results])
+            longest_run = max(result[1] for result in results)
+            rows.append(make_row(threshold, point, self.iterations,
+                                 partial_results, longest_run))
+
+        return rows
@@ -0,0 +1,21 @@
+import random
+
+
+class ReplayRolls:
+    """Hand out the same rolls that Simulation.roll makes with a given seed"""
+
+    def __init__(self, random_seed):
+        self.random = random.Random(random_seed)
+
+    def integers(self, low, high, size):
+        return [self.random.randrange(low, high) for _ in range(size)]
+
+
+class FakeProgressBar:
+    """Stand in for the progress bar and screen of the gui"""
+
+    def step(self, amount):
+        pass
+
+    def update(self):
+        pass
@@ -1,5 +1,9 @@
+import pickle
 from unittest import TestCase
-from primediceSim.account import Account
+
+import numpy as np
+
+from primediceSim.account import Account, FrozenAccount
 
 
 class TestAdd(TestCase):
@@ -64,3 +68,43 @@ class TestSubtract(TestCase):
         self.assertEqual(account.get_balance(), 15,
                          "The balance was not appropriately subtracted from"
                          " when a float of 5.5 was subtracted")
+
+
+class TestFrozenAccount(TestCase):
+    """Ensure that a frozen account keeps its balance and can be used as a
+    key
+    """
+
+    def test_cannot_change(self):
+        account = FrozenAccount(20)
+        with self.assertRaises(AttributeError,
+                               msg="A frozen balance was changed"):
+            account.balance = 5
+        self.assertFalse(hasattr(account, "add"),
+                         "A frozen account can be added to")
+
+    def test_equal_and_hash(self):
+        self.assertEqual(FrozenAccount(20), FrozenAccount(20.0),
+                         "Accounts with the same balance differ")
+        self.assertEqual(len({FrozenAccount(20), FrozenAccount(20),
+                              FrozenAccount(30)}), 2,
+                         "Equal accounts were kept apart in a set")
+        self.assertEqual(pickle.loads(pickle.dumps(FrozenAccount(20))),
+                         FrozenAccount(20),
+                         "A pickled account has a different balance")
+
+    def test_freeze_and_thaw(self):
+        account = Account(20).freeze()
+        self.assertEqual(account, FrozenAccount(20),
+                         "A frozen Account has a different balance")
+        thawed = account.thaw()
+        thawed.add(5)
+        self.assertEqual(account.get_balance(), 20,
+                         "Changing a thawed account changed the frozen one")
+
+    def test_from_column(self):
+        accounts = FrozenAccount.from_column(np.array([10, 20]))
+        self.assertEqual(accounts, [FrozenAccount(10), FrozenAccount(20)],
+                         "The column did not make the right accounts")
+        self.assertIs(type(accounts[0].get_balance()), int,
+                      "A numpy value was kept in an account")
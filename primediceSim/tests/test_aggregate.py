@@ -0,0 +1,167 @@
+import math
+import statistics
+from unittest import TestCase
+from primediceSim.aggregate import (PartialResults, confidence_interval,
+                                    relative_half_width)
+from primediceSim.simulation import Results, AverageResults
+
+
+class TestPartialResults(TestCase):
+    """Ensure that the totals kept by PartialResults give the same averages
+    as AverageResults
+    """
+
+    def assert_same_as_average_results(self, histories):
+        average_result = AverageResults([Results(balances) for balances in
+                                         histories])
+        partial_results = PartialResults()
+        for balances in histories:
+            partial_results.add(Results(balances))
+
+        self.assertEqual(partial_results.find_average_bal(),
+                         average_result.overall_average_balance,
+                         "Average balance differs from AverageResults")
+        self.assertEqual(partial_results.find_average_rolls_until_bankrupt(),
+                         average_result.average_rolls_until_bankrupt,
+                         "Average rolls differ from AverageResults")
+        self.assertEqual(partial_results.find_average_balances(),
+                         average_result.get_average_balances(),
+                         "Average balances differ from AverageResults")
+        self.assertEqual(partial_results.find_median_balances(),
+                         average_result.get_median_balances(),
+                         "Median balances differ from AverageResults")
+        self.assertEqual(partial_results.find_confidence_intervals(),
+                         average_result.find_confidence_intervals(),
+                         "Confidence intervals differ from AverageResults")
+
+    def test_single_result(self):
+        self.assert_same_as_average_results([[5, 6, 7, 5, 7]])
+
+    def test_multiple_results(self):
+        self.assert_same_as_average_results([[5, 8, 10, 9, 12],
+                                             [4, 6, 5, 12],
+                                             [0, 7, 15]])
+
+    def test_float_median(self):
+        self.assert_same_as_average_results([[3, 5, 4, 1, 7],
+                                             [4, 5, 10, 1]])
+
+    def test_zeroes(self):
+        self.assert_same_as_average_results(
+            [[5, 8, 10, 9, 12, 14, 16, 14, 13, 10, 6],
+             [4, 6, 5, 12],
+             [0, 7, 15]])
+
+
+class TestConfidenceInterval(TestCase):
+    """Ensure that confidence intervals are found from running totals"""
+
+    def test_matches_statistics(self):
+        values = [3, 8, 1, 12, 7, 5, 9, 4]
+        low, high = confidence_interval(sum(values),
+                                        sum(value * value for value in values),
+                                        len(values), 0.9)
+        half_width = statistics.NormalDist().inv_cdf(0.95) * \
+            statistics.stdev(values) / math.sqrt(len(values))
+        mean = statistics.mean(values)
+        self.assertAlmostEqual(low, mean - half_width,
+                               msg="Wrong lower end of the interval")
+        self.assertAlmostEqual(high, mean + half_width,
+                               msg="Wrong upper end of the interval")
+
+    def test_too_few_values(self):
+        self.assertEqual(relative_half_width(confidence_interval(5, 25, 1)),
+                         math.inf, "One value gave a finite interval")
+
+    def test_identical_values(self):
+        self.assertEqual(relative_half_width(confidence_interval(20, 100, 4)),
+                         0, "Identical values gave an interval with a width")
+
+
+class TestMerge(TestCase):
+    """Ensure that merging PartialResults is the same as adding every result
+    to one of them
+    """
+
+    def test_merge(self):
+        histories = [[5, 8, 10, 9, 12], [4, 6, 5, 12], [0, 7, 15],
+                     [3, 5, 4, 1, 7], [4, 5, 10, 1]]
+        whole = PartialResults()
+        whole.add_histories(histories)
+
+        first = PartialResults()
+        first.add_histories(histories[:2])
+        second = PartialResults()
+        second.add_histories(histories[2:])
+        first.merge(second)
+
+        self.assertEqual(first.find_average_balances(),
+                         whole.find_average_balances(),
+                         "Merged average balances differ")
+        self.assertEqual(first.find_median_balances(),
+                         whole.find_median_balances(),
+                         "Merged median balances differ")
+        self.assertEqual(first.find_average_rolls_until_bankrupt(),
+                         whole.find_average_rolls_until_bankrupt(),
+                         "Merged average rolls differ")
+
+    def test_merge_empty(self):
+        partial_results = PartialResults()
+        partial_results.add_histories([[5, 6, 7]])
+        partial_results.merge(PartialResults())
+        self.assertEqual(partial_results.find_median_balances(), [5, 6, 7],
+                         "Merging an empty PartialResults changed the"
+                         " medians")
+
+
+class TestStreaming(TestCase):
+    """Ensure that results can be added one at a time without keeping their
+    histories
+    """
+
+    def setUp(self):
+        self.histories = [[5, 8, 10, 9, 12], [4, 6, 5, 12], [0, 7, 15]]
+
+    def test_without_medians(self):
+        partial_results = PartialResults(track_medians=False)
+        partial_results.add_histories(self.histories)
+
+        self.assertEqual(partial_results.find_average_balances(),
+                         [3, 7, 10, 7, 4],
+                         "Average balances were incorrectly calculated"
+                         " without tracking medians")
+        self.assertEqual(partial_results.find_median_balances(), [],
+                         "Medians were returned when they were not tracked")
+        self.assertEqual(partial_results.pending_histories, [],
+                         "Histories were kept when medians were not tracked")
+
+    def test_runs_remaining(self):
+        partial_results = PartialResults()
+        partial_results.add_histories(self.histories)
+        self.assertEqual(partial_results.find_runs_remaining(),
+                         [3, 3, 3, 2, 1],
+                         "Runs remaining at each roll were miscounted")
+
+    def test_pending_limit(self):
+        whole = PartialResults()
+        whole.add_histories(self.histories)
+
+        # Count the pending histories after nearly every one is added
+        partial_results = PartialResults(pending_limit=4)
+        partial_results.add_histories(self.histories)
+
+        self.assertEqual(partial_results.find_median_balances(),
+                         whole.find_median_balances(),
+                         "Medians changed when histories were counted in"
+                         " several goes")
+
+    def test_merge_without_medians(self):
+        first = PartialResults()
+        first.add_histories(self.histories)
+        second = PartialResults(track_medians=False)
+        second.add_histories(self.histories)
+        first.merge(second)
+
+        self.assertEqual(first.find_median_balances(), [],
+                         "Medians were returned after merging results that"
+                         " did not track them")
@@ -0,0 +1,124 @@
+import contextlib
+import io
+from unittest import TestCase
+import numpy as np
+from primediceSim.analytic import AnalyticSolver
+from primediceSim.batch import BatchEngine
+from primediceSim.configuration import Configuration
+from primediceSim.account import Account
+from primediceSim.instrumentation import MemorySink
+from primediceSim.strategy import Paroli
+
+
+class TestSolve(TestCase):
+    """Ensure that the analytic solver finds the expected results exactly"""
+
+    def test_no_rolls(self):
+        config = Configuration(base_bet=10, payout=2)
+        results = AnalyticSolver(config, Account(balance=5)).solve()
+        self.assertEqual(results.get_average_rolls_until_bankrupt(), 0,
+                         "Rolls were expected when the first bet could not"
+                         " be afforded")
+        self.assertEqual(results.get_average_balances(), [5],
+                         "Balances were expected after no rolls")
+
+    def test_single_bet(self):
+        # With a balance of 1, the first roll either wins and pays 2 or loses
+        # everything
+        config = Configuration(base_bet=1, payout=2, loss_adder=100)
+        results = AnalyticSolver(config, Account(balance=1),
+                                 max_rolls=10).solve()
+        self.assertAlmostEqual(results.get_average_balances()[1], 0.99,
+                               msg="Average balance after the first roll was"
+                                   " incorrectly calculated")
+
+    def test_chances_add_up(self):
+        config = Configuration(base_bet=3, payout=1.5, loss_adder=50)
+        results = AnalyticSolver(config, Account(balance=60)).solve()
+        final_balances, final_chances = \
+            results.get_final_balance_distribution()
+        self.assertAlmostEqual(final_chances.sum() +
+                               results.get_unfinished_chance(), 1,
+                               msg="Chances of every outcome did not add up"
+                                   " to 1")
+
+    def test_matches_simulation(self):
+        config = Configuration(base_bet=3, payout=1.5, loss_adder=50)
+        account = Account(balance=60)
+        results = AnalyticSolver(config, account).solve()
+
+        histories = BatchEngine(config, account, random_seed=2).run(20000)
+        rolls = np.mean([history.size - 1 for history in histories])
+        self.assertLess(abs(rolls - results.average_rolls_until_bankrupt),
+                        0.05 * results.average_rolls_until_bankrupt,
+                        "Simulated rolls until bankruptcy were far from the"
+                        " expected value")
+
+    def test_stop_conditions(self):
+        config = Configuration(base_bet=3, payout=1.5, loss_adder=50,
+                               take_profit=70.2, stop_loss=10.5, max_rolls=40)
+        account = Account(balance=60)
+        results = AnalyticSolver(config, account).solve()
+
+        histories = BatchEngine(config, account, random_seed=2).run(20000)
+        rolls = np.mean([history.size - 1 for history in histories])
+        self.assertLess(abs(rolls - results.average_rolls_until_bankrupt),
+                        0.05 * results.average_rolls_until_bankrupt,
+                        "Simulated rolls with stop conditions were far from"
+                        " the expected value")
+        _, final_chances = results.get_final_balance_distribution()
+        self.assertEqual(results.get_unfinished_chance(), 0,
+                         "Runs were still going after the most rolls")
+        self.assertAlmostEqual(final_chances.sum(), 1,
+                               msg="Chances of every outcome did not add up"
+                                   " to 1")
+
+    def test_stop_conditions_shorten_runs(self):
+        unlimited = AnalyticSolver(
+            Configuration(base_bet=3, payout=1.5, loss_adder=50),
+            Account(balance=20)).solve()
+        limited = AnalyticSolver(
+            Configuration(base_bet=3, payout=1.5, loss_adder=50,
+                          take_profit=25, max_rolls=5),
+            Account(balance=20)).solve()
+        self.assertLessEqual(limited.average_rolls_until_bankrupt, 5,
+                             "Runs were expected to outlast the most rolls")
+        self.assertLess(limited.average_rolls_until_bankrupt,
+                        unlimited.average_rolls_until_bankrupt,
+                        "The stop conditions did not shorten the runs")
+
+    def test_stopped_before_rolling(self):
+        config = Configuration(base_bet=3, payout=1.5, take_profit=25)
+        results = AnalyticSolver(config, Account(balance=60)).solve()
+        self.assertEqual(results.get_average_rolls_until_bankrupt(), 0,
+                         "Rolls were expected past the take profit")
+
+    def test_messages(self):
+        config = Configuration(base_bet=10, payout=2)
+        sink = MemorySink()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            AnalyticSolver(config, Account(balance=5),
+                           instrument=sink).solve().print_results()
+        self.assertEqual(output.getvalue(), "",
+                         "The results printed past their instrument")
+        self.assertTrue(any(text.startswith("[Results]") for text in
+                            sink.messages),
+                        "The results were not sent as messages")
+
+    def test_other_strategy(self):
+        config = Configuration(base_bet=1, payout=2, strategy=Paroli())
+        with self.assertRaises(ValueError):
+            AnalyticSolver(config, Account(20))
+
+    def test_negative_loss_adder(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=-50)
+        with self.assertRaises(ValueError,
+                               msg="A shrinking bet was not rejected"):
+            AnalyticSolver(config, Account(100))
+
+    def test_no_base_bet(self):
+        config = Configuration(base_bet=0, payout=2, loss_adder=100)
+        with self.assertRaises(ValueError,
+                               msg="A base bet of 0 was not rejected"):
+            AnalyticSolver(config, Account(100))
@@ -0,0 +1,75 @@
+from unittest import TestCase
+
+import numpy as np
+
+from primediceSim.account import Account
+from primediceSim.bankrolls import BankrollSimulation
+from primediceSim.configuration import Configuration
+from primediceSim.simulation import Simulation
+from primediceSim.tests.helpers import ReplayRolls
+
+
+class TestBankrollSimulation(TestCase):
+    """Ensure that every starting balance is simulated with the same rolls,
+    following the same rules as single_sim
+    """
+
+    def setUp(self):
+        self.config = Configuration(base_bet=1, payout=2, iterations=50,
+                                    loss_adder=200)
+        self.balances = [20, 50, 130]
+
+    def test_matches_single_sim(self):
+        for random_seed in range(5):
+            results = BankrollSimulation(
+                self.config, self.balances,
+                rng=ReplayRolls(random_seed)).run(iterations=1)
+            for balance in self.balances:
+                simulation = Simulation(config=self.config,
+                                        account=Account(balance),
+                                        random_seed=random_seed)
+                self.assertEqual(
+                    results[balance].histories[0].tolist(),
+                    simulation.single_sim().get_balances(),
+                    "Bankroll of %d differs from single_sim" % balance)
+
+    def test_results(self):
+        results = BankrollSimulation(self.config, self.balances,
+                                     random_seed=2).run()
+        self.assertEqual(list(results), self.balances,
+                         "Results are missing for some balances")
+        for balance, sim_result in results.items():
+            self.assertEqual(sim_result.number_of_results, 50,
+                             "Wrong number of runs for a balance")
+            self.assertEqual(sim_result.get_average_balances()[0], balance,
+                             "Runs did not start at their balance")
+
+    def test_common_rolls(self):
+        results = BankrollSimulation(self.config, [40, 90],
+                                     random_seed=5).run()
+        for low, high in zip(results[40].histories, results[90].histories):
+            # Both bankrolls win and lose the same rolls until the smaller
+            # one stops
+            rolls = low.size - 1
+            self.assertEqual((np.diff(low) > 0).tolist(),
+                             (np.diff(high[:rolls + 1]) > 0).tolist(),
+                             "Bankrolls of the same run had different rolls")
+
+    def test_no_balances(self):
+        with self.assertRaises(ValueError):
+            BankrollSimulation(self.config, [])
+        with self.assertRaises(ValueError):
+            BankrollSimulation(self.config, np.array([], dtype=np.int64))
+
+    def test_array_balances(self):
+        results = BankrollSimulation(self.config, np.array(self.balances),
+                                     random_seed=2).run()
+        self.assertEqual(list(results), self.balances,
+                         "Results are missing for some array balances")
+        self.assertIs(type(list(results)[0]), int,
+                      "Results were kept by numpy balances")
+
+    def test_duplicate_balances(self):
+        with self.assertRaises(ValueError,
+                               msg="A repeated balance was accepted"):
+            BankrollSimulation(self.config, [100, 100])
@@ -0,0 +1,161 @@
+from unittest import TestCase
+
+import numpy as np
+
+from primediceSim.batch import BatchEngine, GroupedRolls, SharedRolls
+from primediceSim.configuration import Configuration
+from primediceSim.account import Account
+from primediceSim.simulation import Simulation
+from primediceSim.strategy import DAlembert, Fibonacci, Paroli, PercentAdjust
+from primediceSim.tests.helpers import ReplayRolls
+
+
+class TestRun(TestCase):
+    """Ensure that the batch engine follows the same betting rules as
+    single_sim
+    """
+
+    def assert_matches_single_sim(self, config, balance, random_seed):
+        simulation = Simulation(config=config, account=Account(balance),
+                                random_seed=random_seed)
+        expected = simulation.single_sim().get_balances()
+
+        batch_engine = BatchEngine(config, Account(balance), block_size=1,
+                                   rng=ReplayRolls(random_seed))
+        history = batch_engine.run(iterations=1)[0]
+        self.assertEqual(history.tolist(), expected,
+                         "Batch engine balances differ from single_sim")
+
+    def test_base_bet_1(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100)
+        self.assert_matches_single_sim(config, balance=5, random_seed=4)
+
+    def test_stop_conditions(self):
+        for config in (Configuration(base_bet=1, payout=2, max_rolls=7),
+                       Configuration(base_bet=1, payout=2, take_profit=60),
+                       Configuration(base_bet=1, payout=2, stop_loss=45)):
+            self.assert_matches_single_sim(config, balance=50, random_seed=2)
+
+    def test_frac_loss_adder(self):
+        config = Configuration(base_bet=3, payout=1.5, loss_adder=50)
+        self.assert_matches_single_sim(config, balance=200, random_seed=8)
+
+    def test_high_payout(self):
+        config = Configuration(base_bet=2, payout=7.7, loss_adder=20)
+        self.assert_matches_single_sim(config, balance=300, random_seed=3)
+
+    def test_strategies(self):
+        for strategy in (Fibonacci(), DAlembert(), Paroli(),
+                         PercentAdjust(on_win=20, reset_after=3)):
+            config = Configuration(base_bet=1, payout=2, strategy=strategy)
+            self.assert_matches_single_sim(config, balance=40, random_seed=5)
+
+    def test_runs_end_bankrupt(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100)
+        batch_engine = BatchEngine(config, Account(50), random_seed=1)
+        histories = batch_engine.run(iterations=200)
+
+        self.assertEqual(len(histories), 200,
+                         "A history was not returned for every run")
+        for history in histories:
+            self.assertEqual(history[0], 50,
+                             "History did not start at the balance")
+
+    def test_seeded(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100)
+        first = BatchEngine(config, Account(50), random_seed=7).run(20)
+        second = BatchEngine(config, Account(50), random_seed=7).run(20)
+        self.assertEqual([history.tolist() for history in first],
+                         [history.tolist() for history in second],
+                         "The same seed gave different histories")
+
+    def test_stop_reasons(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100,
+                               max_rolls=20, take_profit=55)
+        histories = BatchEngine(config, Account(50), random_seed=3).run(100)
+
+        for history, stop_reason in zip(histories,
+                                        histories.get_stop_reasons()):
+            if stop_reason == "max_rolls":
+                self.assertEqual(history.size - 1, 20,
+                                 "A run stopped by its roll limit made the"
+                                 " wrong number of rolls")
+            elif stop_reason == "take_profit":
+                self.assertGreaterEqual(history[-1], 55,
+                                        "A run stopped for profit did not"
+                                        " reach the take profit balance")
+            else:
+                self.assertEqual(stop_reason, "bankrupt",
+                                 "A run stopped for an unexpected reason")
+
+    def test_roll_budget(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100)
+        histories = BatchEngine(config, Account(50), random_seed=3).run(
+            40, roll_budget=100)
+
+        self.assertLessEqual(histories.size() - len(histories), 100,
+                             "The runs made more rolls than the budget")
+        self.assertIn("budget", histories.get_stop_reasons(),
+                      "No run was stopped by the budget")
+
+    def test_no_rolls(self):
+        config = Configuration(base_bet=10, payout=2)
+        histories = BatchEngine(config, Account(5)).run(iterations=3)
+        self.assertEqual([history.tolist() for history in histories],
+                         [[5], [5], [5]],
+                         "Runs that could not afford a bet were not kept at"
+                         " their starting balance")
+
+
+class TestGroupedRolls(TestCase):
+    """Ensure that runs in the same place of each group get the same rolls"""
+
+    def test_same_rolls(self):
+        grouped_rolls = GroupedRolls(4, random_seed=1)
+        runs = np.array([0, 2, 3, 4, 6, 11])
+        for roll_num in range(5):
+            rolls = grouped_rolls.get_rolls(roll_num, runs)
+            self.assertEqual((rolls[0], rolls[1], rolls[2]),
+                             (rolls[3], rolls[4], rolls[5]),
+                             "Runs in the same place got different rolls")
+
+    def test_start_balances(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100)
+        histories = BatchEngine(config, None, random_seed=3).run(
+            3, start_balances=[5, 0, 9])
+        self.assertEqual([history[0] for history in histories], [5, 0, 9],
+                         "Runs did not start at their own balances")
+
+
+class TestSharedRolls(TestCase):
+    """Ensure that shared rolls are the same every time they are asked for,
+    without keeping every block of them
+    """
+
+    def test_same_rolls(self):
+        runs = np.arange(4)
+        kept = SharedRolls(4, random_seed=3, block_rows=2)
+        drawn_again = SharedRolls(4, random_seed=3, block_rows=2,
+                                  kept_blocks=0)
+        first = [kept.get_rolls(roll_num, runs).tolist() for roll_num in
+                 range(10)]
+        for _ in range(2):
+            self.assertEqual([drawn_again.get_rolls(roll_num, runs).tolist()
+                              for roll_num in range(10)], first,
+                             "Rolls changed when they were drawn again")
+
+    def test_bounded_blocks(self):
+        shared_rolls = SharedRolls(4, random_seed=3, block_rows=2,
+                                   kept_blocks=2)
+        for roll_num in range(40):
+            shared_rolls.get_rolls(roll_num, np.arange(4))
+        self.assertEqual(len(shared_rolls.blocks), 2,
+                         "Blocks past the kept ones were kept")
+
+    def test_backend(self):
+        runs = np.arange(50)
+        pcg64 = SharedRolls(50, random_seed=3).get_rolls(0, runs)
+        philox = SharedRolls(50, random_seed=3,
+                             rng_backend="philox").get_rolls(0, runs)
+        self.assertFalse((pcg64 == philox).all(),
+                         "The backend was not used to draw the rolls")
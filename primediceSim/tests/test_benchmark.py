@@ -0,0 +1,111 @@
+import copy
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from primediceSim.benchmark import (benchmark_case, compare, main,
+                                    measure_import)
+
+
+class TestBenchmarkCase(TestCase):
+    """Ensure that every phase of a case is measured"""
+
+    def test_phases(self):
+        case = benchmark_case(payout=3, loss_adder=200, balance=20,
+                              iterations=5, engines=("hot", "batch"))
+        self.assertEqual(sorted(case["phases"]),
+                         ["average_balances", "average_results",
+                          "median_balances", "run_batch", "run_hot",
+                          "single_sim"], "Wrong phases measured")
+        self.assertGreater(case["phases"]["single_sim"]["peak_bytes"], 0,
+                           "Peak memory was not measured")
+        self.assertIn("rolls_per_second", case["phases"]["run_hot"],
+                      "Roll rate was not recorded")
+
+    def test_rare_wins(self):
+        case = benchmark_case(payout=12, loss_adder=10, balance=500,
+                              iterations=20, engines=("hot", "streak"),
+                              track_memory=False)
+        self.assertEqual(sorted(case["speedups"]), ["hot", "streak"],
+                         "Wrong speedups recorded")
+        self.assertGreater(case["speedups"]["streak"],
+                           case["speedups"]["hot"],
+                           "The streak engine should be fastest when wins "
+                           "are rare")
+
+
+class TestStartup(TestCase):
+    """Ensure that the core simulation API imports quickly, without loading
+    numpy or the GUI
+    """
+
+    def test_simulation_import(self):
+        measurement = measure_import("primediceSim.simulation", repeats=3)
+        self.assertEqual(measurement["heavy_modules"], [],
+                         "Importing the simulation loaded heavy modules")
+        # Far above the usual import time, so only a heavy import trips it
+        self.assertLess(measurement["seconds"], 0.15,
+                        "Importing the simulation took too long")
+
+    def test_startup_command(self):
+        self.assertEqual(main(["startup", "--max-seconds", "5"]), 0,
+                         "The startup check failed")
+
+
+class TestCompare(TestCase):
+    """Ensure that regressions are found only when they pass the tolerance"""
+
+    def setUp(self):
+        self.baseline = {"cases": [{
+            "name": "case",
+            "phases": {"single_sim": {"seconds": 1.0, "peak_bytes": 1000}},
+        }]}
+
+    def slowed(self, seconds, peak_bytes=1000):
+        current = copy.deepcopy(self.baseline)
+        current["cases"][0]["phases"]["single_sim"] = {
+            "seconds": seconds, "peak_bytes": peak_bytes}
+        return current
+
+    def test_no_regression(self):
+        self.assertEqual(compare(self.baseline, self.slowed(1.1)), [],
+                         "A change within the tolerance was flagged")
+
+    def test_slower(self):
+        self.assertEqual(len(compare(self.baseline, self.slowed(1.5))), 1,
+                         "A slower phase was not flagged")
+
+    def test_more_memory(self):
+        self.assertEqual(len(compare(self.baseline,
+                                     self.slowed(1.0, peak_bytes=2000))), 1,
+                         "A phase using more memory was not flagged")
+
+    def test_new_heavy_import(self):
+        current = self.slowed(1.0)
+        current["cases"][0]["phases"]["single_sim"]["heavy_modules"] = \
+            ["numpy"]
+        self.assertEqual(len(compare(self.baseline, current)), 1,
+                         "A new heavy import was not flagged")
+
+    def test_short_phases_ignored(self):
+        self.baseline["cases"][0]["phases"]["single_sim"]["seconds"] = 0.001
+        self.assertEqual(compare(self.baseline, self.slowed(0.003)), [],
+                         "Noise in a very short phase was flagged")
+
+    def test_compare_command(self):
+        directory = tempfile.mkdtemp()
+        try:
+            baseline_path = os.path.join(directory, "baseline.json")
+            current_path = os.path.join(directory, "current.json")
+            with open(baseline_path, "w") as baseline_file:
+                json.dump(self.baseline, baseline_file)
+            with open(current_path, "w") as current_file:
+                json.dump(self.slowed(2.0), current_file)
+
+            self.assertEqual(main(["compare", baseline_path, baseline_path]),
+                             0, "Identical results were flagged")
+            self.assertEqual(main(["compare", baseline_path, current_path]),
+                             1, "The regression was not reported")
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from primediceSim.cache import ResultCache
+from primediceSim.parallel import run_parallel
+from primediceSim.configuration import Configuration
+from primediceSim.account import Account
+
+
+class TestResultCache(TestCase):
+    """Ensure that results are stored, reused and extended correctly"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResultCache(self.directory)
+        self.account = Account(balance=20)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_config(self, iterations):
+        return Configuration(base_bet=1, payout=2, iterations=iterations,
+                             loss_adder=100)
+
+    def test_reused(self):
+        first = self.cache.run(self.make_config(30), self.account,
+                               random_seed=4, workers=0, chunk_size=10)
+        second = self.cache.run(self.make_config(30), self.account,
+                                random_seed=4, workers=0, chunk_size=10)
+        self.assertEqual(first.find_average_balances(),
+                         second.find_average_balances(),
+                         "Cached results differ from the simulated ones")
+        self.assertEqual(len(os.listdir(self.directory)), 1,
+                         "The same settings were stored more than once")
+
+    def test_key_ignores_number_type(self):
+        config = self.make_config(30)
+        float_config = Configuration(base_bet=1.0, payout=2.0, iterations=30,
+                                     loss_adder=100.0)
+        self.assertEqual(
+            ResultCache.make_key(config, 20, 4, "python", 10, True, None),
+            ResultCache.make_key(float_config, 20, 4, "python", 10, True,
+                                 None),
+            "The same settings gave different keys")
+
+    def test_extended(self):
+        self.cache.run(self.make_config(20), self.account, random_seed=4,
+                       workers=0, chunk_size=10)
+        extended = self.cache.run(self.make_config(35), self.account,
+                                  random_seed=4, workers=0, chunk_size=10)
+        fresh = run_parallel(self.make_config(35), self.account,
+                             random_seed=4, workers=0, chunk_size=10)
+
+        self.assertEqual(extended.number_of_results, 35,
+                         "Extended results do not hold every run")
+        self.assertEqual(extended.find_average_balances(),
+                         fresh.find_average_balances(),
+                         "Extended results differ from a fresh run")
+        self.assertEqual(extended.find_median_balances(),
+                         fresh.find_median_balances(),
+                         "Extended medians differ from a fresh run")
+        self.assertEqual(extended.total_average_balance,
+                         fresh.total_average_balance,
+                         "Extended totals differ from a fresh run")
+
+    def test_evict(self):
+        cache = ResultCache(self.directory, max_bytes=1)
+        cache.run(self.make_config(10), self.account, random_seed=4,
+                  workers=0, chunk_size=10)
+        self.assertEqual(os.listdir(self.directory), [],
+                         "Results were kept beyond the size limit")
+
+    def test_unseeded(self):
+        self.cache.run(self.make_config(10), self.account, random_seed=None,
+                       workers=0, chunk_size=10)
+        self.assertEqual(os.listdir(self.directory), [],
+                         "Results without a seed were stored")
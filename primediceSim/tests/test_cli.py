@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from primediceSim.cli import main, parse_number, load_batch
+
+
+class TestParseNumber(TestCase):
+    """Ensure that whole numbers stay ints"""
+
+    def test_whole(self):
+        self.assertIsInstance(parse_number("2"), int, "2 should be an int")
+
+    def test_fraction(self):
+        self.assertEqual(parse_number("1.5"), 1.5, "1.5 was read wrongly")
+
+    def test_decimal_point(self):
+        self.assertIsInstance(parse_number("2.0"), float,
+                              "2.0 should stay a float")
+
+
+class TestMain(TestCase):
+    """Ensure that the command line writes every output format"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = ["--balance", "20", "--iterations", "10",
+                         "--seed", "3", "--loss-adder", "100"]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_json(self):
+        main(self.settings + ["--output", self.path("results.json")])
+        with open(self.path("results.json")) as results_file:
+            results = json.load(results_file)["results"]
+
+        self.assertEqual(len(results), 1, "Wrong number of results")
+        self.assertEqual(results[0]["balance"], 20,
+                         "Settings were not recorded")
+        self.assertEqual(results[0]["average_balances"][0], 20,
+                         "Average balances should start at the balance")
+        self.assertEqual(len(results[0]["average_balances"]),
+                         results[0]["num_of_rolls"],
+                         "Wrong number of average balances")
+
+    def test_engines_agree(self):
+        main(self.settings + ["--engine", "python", "--output",
+                              self.path("python.json")])
+        main(self.settings + ["--engine", "hot", "--output",
+                              self.path("hot.json")])
+        with open(self.path("python.json")) as python_file, \
+                open(self.path("hot.json")) as hot_file:
+            python_results = json.load(python_file)["results"][0]
+            hot_results = json.load(hot_file)["results"][0]
+
+        self.assertEqual(python_results["median_balances"],
+                         hot_results["median_balances"],
+                         "The engines gave different results")
+
+    def test_batch_csv(self):
+        with open(self.path("batch.csv"), "w") as batch_file:
+            batch_file.write("payout,loss_adder,balance\n2,100,30\n"
+                             "3,200,40\n")
+        main(self.settings + ["--batch", self.path("batch.csv"),
+                              "--output", self.path("results.npz")])
+
+        results = np.load(self.path("results.npz"))
+        self.assertEqual(results["payout"].tolist(), [2, 3],
+                         "The batch settings were not used")
+        self.assertEqual(results["iterations"].tolist(), [10, 10],
+                         "The command line settings were not used")
+        self.assertEqual(results["average_balances_1"][0], 40,
+                         "Wrong curve stored for the second configuration")
+
+    def test_csv_output(self):
+        main(self.settings + ["--output", self.path("results.csv")])
+        with open(self.path("results.csv")) as results_file:
+            lines = results_file.read().splitlines()
+
+        self.assertTrue(lines[0].startswith("config,balance"),
+                        "The header row is missing")
+        self.assertGreater(len(lines), 2, "No rolls were written")
+
+    def test_unknown_batch_setting(self):
+        with open(self.path("batch.json"), "w") as batch_file:
+            json.dump([{"payout": 2, "colour": "red"}], batch_file)
+        with self.assertRaises(ValueError):
+            load_batch(self.path("batch.json"))
+
+    def test_balances(self):
+        main(self.settings + ["--balances", "10,40", "--output",
+                              self.path("results.json")])
+        with open(self.path("results.json")) as results_file:
+            results = json.load(results_file)["results"]
+
+        self.assertEqual([summary["balance"] for summary in results],
+                         [10, 40], "Wrong balances were simulated")
+        self.assertEqual([summary["average_balances"][0] for summary in
+                          results], [10, 40],
+                         "Average balances should start at each balance")
+
+    def test_balances_with_workers(self):
+        with self.assertRaises(SystemExit):
+            main(self.settings + ["--balances", "10,40", "--workers", "2"])
+
+    def test_duplicate_balances(self):
+        with self.assertRaises(SystemExit):
+            main(self.settings + ["--balances", "10,10"])
+
+    def test_no_gui_imports(self):
+        code = ("import sys\n"
+                "import primediceSim.cli\n"
+                "print(sorted(name for name in ('tkinter', 'matplotlib')"
+                " if name in sys.modules))")
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=os.path.join(os.path.dirname(__file__), "..", ".."))
+        self.assertEqual(output.decode().strip(), "[]",
+                         "The command line imported the GUI")
@@ -0,0 +1,96 @@
+import contextlib
+import io
+from unittest import TestCase
+
+import numpy as np
+
+from primediceSim.account import Account
+from primediceSim.batch import AntitheticRolls, BatchEngine, SharedRolls
+from primediceSim.compare import Comparison
+from primediceSim.configuration import Configuration
+from primediceSim.instrumentation import MemorySink
+
+
+class TestComparison(TestCase):
+    """Ensure that paired comparisons estimate the difference between two
+    configurations with less noise than independent runs
+    """
+
+    def setUp(self):
+        self.config_a = Configuration(base_bet=1, payout=2, loss_adder=200)
+        self.config_b = Configuration(base_bet=1, payout=2.5, loss_adder=200)
+        self.account = Account(30)
+
+    def test_same_configuration(self):
+        comparison = Comparison(self.config_a, self.config_a, self.account,
+                                random_seed=1).run(200)
+        for metric, row in comparison.items():
+            self.assertEqual(row["difference"], 0,
+                             "Common rolls gave a configuration a different"
+                             " %s to itself" % metric)
+            self.assertEqual(row["interval"], (0, 0),
+                             "The interval of an exact difference has a"
+                             " width")
+
+    def test_messages(self):
+        sink = MemorySink()
+        comparison = Comparison(self.config_a, self.config_b, self.account,
+                                random_seed=1, instrument=sink)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            comparison.print_results(comparison.run(20))
+        self.assertEqual(output.getvalue(), "",
+                         "The comparison printed past its instrument")
+        self.assertEqual(len(sink.messages), 3,
+                         "A line was not sent for every measurement")
+
+    def test_independent_rolls(self):
+        comparison = Comparison(self.config_a, self.config_a, self.account,
+                                random_seed=1, common_rolls=False).run(200)
+        self.assertNotEqual(comparison["rolls_until_bankrupt"]["difference"],
+                            0, "Independent rolls gave identical runs")
+
+    def test_variance_reduction(self):
+        for options in ({}, {"antithetic": True},
+                        {"control_variates": True}):
+            comparison = Comparison(self.config_a, self.config_b,
+                                    self.account, random_seed=2,
+                                    **options).run(400)
+            self.assertGreater(
+                comparison["final_balance"]["variance_reduction"], 1,
+                "%s did not reduce the variance" % (options or "Common rolls"))
+
+    def test_seeded(self):
+        first = Comparison(self.config_a, self.config_b, self.account,
+                           random_seed=3, antithetic=True).run(50)
+        second = Comparison(self.config_a, self.config_b, self.account,
+                            random_seed=3, antithetic=True).run(50)
+        self.assertEqual(first, second, "The same seed gave different results")
+
+
+class TestControls(TestCase):
+    """Ensure that the batch engine's control variates measure luck"""
+
+    def test_mirrored_rolls(self):
+        shared_rolls = SharedRolls(5, random_seed=1)
+        runs = np.arange(5)
+        self.assertEqual((AntitheticRolls(shared_rolls).get_rolls(3, runs) +
+                          shared_rolls.get_rolls(3, runs)).tolist(),
+                         [9999] * 5, "Mirrored rolls do not add up to 9999")
+
+    def test_controls_average_zero(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=200)
+        batch_engine = BatchEngine(config, Account(30), random_seed=4,
+                                   track_controls=True)
+        batch_engine.run(4000)
+        controls = batch_engine.controls
+        standard_error = controls.std() / np.sqrt(controls.size)
+        self.assertLess(abs(controls.mean()), 4 * standard_error,
+                        "The controls do not average to zero")
+
+    def test_untracked(self):
+        config = Configuration(base_bet=1, payout=2)
+        batch_engine = BatchEngine(config, Account(30), random_seed=4)
+        batch_engine.run(10)
+        self.assertIsNone(batch_engine.controls,
+                          "Controls were kept without being asked for")
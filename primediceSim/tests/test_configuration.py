@@ -1,5 +1,11 @@
+import copy
+import pickle
 from unittest import TestCase
-from primediceSim.configuration import Configuration
+
+import numpy as np
+
+from primediceSim.configuration import (Configuration,
+                                        FrozenConfiguration)
 
 
 class TestCalcRollUnderValue(TestCase):
@@ -61,3 +67,165 @@ class TestSetPayout(TestCase):
         self.assertEqual(config.get_roll_under_value(), 33.0,
                          "Roll under value was not also set when set_payout"
                          " was called")
+
+
+class TestCalcRollUnderThreshold(TestCase):
+    """Ensure that the whole-roll threshold agrees with comparing each roll to
+    the roll under value
+    """
+
+    def check_every_roll(self, payout):
+        config = Configuration(base_bet=1, payout=payout)
+        threshold = config.get_roll_under_threshold()
+        for roll in range(10000):
+            self.assertEqual(roll < threshold,
+                             roll / 100 < config.get_roll_under_value(),
+                             "Threshold disagreed on roll %d" % roll)
+
+    def test_mid_payout(self):
+        self.check_every_roll(2)
+
+    def test_minimum_payout(self):
+        # The roll under value of 97.82 is itself a winning roll
+        self.check_every_roll(1.01202)
+
+    def test_set_payout(self):
+        config = Configuration(base_bet=1, payout=2)
+        config.set_payout(3)
+        self.assertEqual(config.get_roll_under_threshold(), 3300,
+                         "Threshold was not updated when set_payout was"
+                         " called")
+
+
+class TestFindStopReason(TestCase):
+    """Ensure that runs are stopped for the right reason"""
+
+    def setUp(self):
+        self.config = Configuration(base_bet=1, payout=2, max_rolls=10,
+                                    take_profit=300, stop_loss=50)
+
+    def test_keep_rolling(self):
+        self.assertIsNone(self.config.find_stop_reason(100, 4, 3),
+                          "A run inside every limit was stopped")
+
+    def test_bankrupt_first(self):
+        self.assertEqual(self.config.find_stop_reason(40, 64, 10), "bankrupt",
+                         "A run that cannot afford its bet was not counted"
+                         " as bankrupt")
+
+    def test_take_profit(self):
+        self.assertEqual(self.config.find_stop_reason(300, 1, 3),
+                         "take_profit", "Reaching the take profit balance"
+                         " did not stop the run")
+
+    def test_stop_loss(self):
+        self.assertEqual(self.config.find_stop_reason(50, 1, 3), "stop_loss",
+                         "Falling to the stop loss balance did not stop the"
+                         " run")
+
+    def test_max_rolls(self):
+        self.assertEqual(self.config.find_stop_reason(100, 1, 10),
+                         "max_rolls", "Reaching the most rolls did not stop"
+                         " the run")
+
+    def test_no_conditions(self):
+        config = Configuration(base_bet=1, payout=2)
+        self.assertFalse(config.has_stop_conditions(),
+                         "A configuration without limits has stop"
+                         " conditions")
+        self.assertIsNone(config.find_stop_reason(10 ** 9, 1, 10 ** 9),
+                          "A configuration without limits stopped a run")
+
+
+class TestFrozenConfiguration(TestCase):
+    """Make sure that a frozen configuration acts as a configuration that
+    cannot be changed, and can be used as a key
+    """
+
+    def setUp(self):
+        self.config = FrozenConfiguration(base_bet=1, payout=3,
+                                          iterations=10, loss_adder=50,
+                                          stop_loss=20)
+
+    def test_same_values(self):
+        config = Configuration(base_bet=1, payout=3, iterations=10,
+                               loss_adder=50, stop_loss=20)
+        for getter in ["get_base_bet", "get_payout", "get_iterations",
+                       "get_loss_adder", "get_loss_adder_decimal",
+                       "get_roll_under_value", "get_roll_under_threshold",
+                       "get_max_rolls", "get_take_profit", "get_stop_loss"]:
+            self.assertEqual(getattr(self.config, getter)(),
+                             getattr(config, getter)(),
+                             "%s differs from that of a Configuration" %
+                             getter)
+
+    def test_cannot_change(self):
+        with self.assertRaises(AttributeError,
+                               msg="A frozen setting was changed"):
+            self.config.payout = 2
+        with self.assertRaises(AttributeError,
+                               msg="A frozen setting was deleted"):
+            del self.config.base_bet
+        with self.assertRaises(AttributeError,
+                               msg="A frozen configuration was given a new"
+                                   " attribute"):
+            self.config.extra = 1
+
+    def test_equal_and_hash(self):
+        same = FrozenConfiguration(base_bet=1.0, payout=3, iterations=10,
+                                   loss_adder=50, stop_loss=20)
+        other = self.config.replace(payout=2)
+        self.assertEqual(self.config, same,
+                         "Configurations with the same settings differ")
+        self.assertEqual(hash(self.config), hash(same),
+                         "Configurations with the same settings hash"
+                         " differently")
+        self.assertNotEqual(self.config, other,
+                            "Configurations with different payouts are equal")
+        self.assertEqual(len({self.config, same, other}), 2,
+                         "Equal configurations were kept apart in a set")
+
+    def test_replace(self):
+        config = self.config.replace(payout=2, stop_loss=None)
+        self.assertIsInstance(config, FrozenConfiguration,
+                              "Replacing settings did not give a frozen"
+                              " configuration")
+        self.assertEqual(config.get_roll_under_value(), 49.5,
+                         "The roll under value did not follow the payout")
+        self.assertIsNone(config.get_stop_loss(),
+                          "The stop loss was not replaced")
+        self.assertEqual(self.config.get_payout(), 3,
+                         "Replacing settings changed the original")
+
+    def test_freeze_and_thaw(self):
+        config = Configuration(base_bet=1, payout=3, iterations=10,
+                               loss_adder=50, stop_loss=20)
+        self.assertEqual(config.freeze(), self.config,
+                         "A frozen Configuration has different settings")
+        thawed = self.config.thaw()
+        self.assertIsInstance(thawed, Configuration,
+                              "Thawing did not give a Configuration")
+        self.assertEqual(thawed.get_settings(), self.config.get_settings(),
+                         "A thawed configuration has different settings")
+
+    def test_copy_and_pickle(self):
+        self.assertEqual(copy.copy(self.config), self.config,
+                         "A copied configuration has different settings")
+        self.assertEqual(pickle.loads(pickle.dumps(self.config)),
+                         self.config,
+                         "A pickled configuration has different settings")
+
+    def test_from_columns(self):
+        configs = FrozenConfiguration.from_columns({
+            "base_bet": [1, 2],
+            "payout": np.array([2.0, 3.0]),
+        })
+        self.assertEqual(configs, [FrozenConfiguration(base_bet=1, payout=2),
+                                   FrozenConfiguration(base_bet=2, payout=3)],
+                         "The columns did not make the right configurations")
+        self.assertIs(type(configs[0].get_payout()), float,
+                      "A numpy value was kept in a configuration")
+        with self.assertRaises(ValueError,
+                               msg="An unknown setting was accepted"):
+            FrozenConfiguration.from_columns({"base_bet": [1], "payout": [2],
+                                              "colour": [1]})
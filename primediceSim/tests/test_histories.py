@@ -0,0 +1,181 @@
+import itertools
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from primediceSim.account import Account
+from primediceSim.configuration import Configuration
+from primediceSim.histories import (BalanceHistories, HistoryWriter,
+                                    MappedHistories, STOP_REASON_DTYPE)
+
+
+def slow_percentiles(histories, percentile):
+    """Find the percentile balances one roll number at a time"""
+    percentile_balances = []
+    for balances in itertools.zip_longest(*histories, fillvalue=0):
+        percentile_balances.append(int(np.percentile(balances, percentile)))
+        if percentile_balances[-1] == 0:
+            break
+    return percentile_balances
+
+
+class TestBalanceHistories(TestCase):
+    """Ensure that the histories are stored and reduced correctly"""
+
+    def setUp(self):
+        self.histories = [[5, 8, 10, 9, 12],
+                          [4, 6, 5, 12],
+                          [3, -2, 7, 15],
+                          [7]]
+
+    def test_from_lists(self):
+        storage = BalanceHistories.from_lists(self.histories)
+        self.assertEqual(len(storage), 4, "Wrong number of runs")
+        self.assertEqual(storage.size(), 14, "Wrong number of balances")
+        self.assertEqual([history.tolist() for history in storage],
+                         self.histories, "Histories changed when stored")
+        self.assertEqual(storage[-1].tolist(), [7],
+                         "Negative index gave the wrong run")
+
+    def test_views(self):
+        storage = BalanceHistories.from_lists(self.histories)
+        storage[1][0] = 100
+        self.assertEqual(storage.balances[5], 100,
+                         "Run history is not a view into the storage")
+
+    def test_out_of_range(self):
+        storage = BalanceHistories.from_lists(self.histories)
+        with self.assertRaises(IndexError):
+            storage[4]
+
+    def test_append_grows(self):
+        storage = BalanceHistories(capacity=2)
+        for history in self.histories:
+            storage.append(history)
+        self.assertEqual([history.tolist() for history in storage],
+                         self.histories, "Histories changed when appended")
+        self.assertEqual(storage.get_lengths().tolist(), [5, 4, 4, 1],
+                         "Wrong run lengths")
+
+    def test_offset_arrays(self):
+        offsets = np.array([0, 5, 9], dtype=np.int64)
+        storage = BalanceHistories.from_buffer(
+            np.arange(9), offsets, np.array([0, 1], dtype=STOP_REASON_DTYPE))
+        storage.append([1, 2], "max_rolls")
+        self.assertEqual(storage.offsets.dtype, np.int64,
+                         "Offsets are not kept as an int64 array")
+        self.assertEqual(storage.stop_reasons.dtype, STOP_REASON_DTYPE,
+                         "Stop reasons are not kept as a code array")
+        self.assertEqual(storage.offsets.tolist(), [0, 5, 9, 11],
+                         "Wrong offsets after appending")
+        self.assertEqual(storage.get_stop_reasons(),
+                         ["bankrupt", "max_rolls", "max_rolls"],
+                         "Wrong stop reasons after appending")
+        self.assertEqual(offsets.tolist(), [0, 5, 9],
+                         "Appending changed the offsets it was given")
+
+    def test_append_doubles_runs(self):
+        storage = BalanceHistories(run_capacity=1)
+        capacities = set()
+        for _ in range(1000):
+            storage.append([1])
+            capacities.add(storage.offset_buffer.size)
+        self.assertEqual(len(storage), 1000, "Wrong number of runs")
+        self.assertLessEqual(len(capacities), 11,
+                             "The offsets grew more often than by doubling")
+
+    def test_average_balances(self):
+        storage = BalanceHistories.from_lists(self.histories)
+        expected = [sum(balances) // 4 for balances in
+                    itertools.zip_longest(*self.histories, fillvalue=0)]
+        self.assertEqual(storage.find_average_balances(), expected,
+                         "Wrong average balances")
+
+    def test_percentile_balances(self):
+        rng = np.random.default_rng(1)
+        histories = [rng.integers(-20, 100, size=rng.integers(1, 30)).tolist()
+                     for _ in range(25)]
+        storage = BalanceHistories.from_lists(histories)
+        for percentile in [0, 10, 25, 50, 75, 90, 100]:
+            self.assertEqual(storage.find_percentile_balances(percentile),
+                             slow_percentiles(histories, percentile),
+                             "Wrong %d percentile balances" % percentile)
+
+    def test_get_runs(self):
+        storage = BalanceHistories.from_lists(self.histories)
+        runs = storage.get_runs(1, 3)
+        self.assertEqual([history.tolist() for history in runs],
+                         self.histories[1:3], "Wrong runs were taken")
+        runs[0][0] = 100
+        self.assertEqual(storage[1][0], 100,
+                         "The runs taken are not a view into the storage")
+
+    def test_median_stops_at_zero(self):
+        storage = BalanceHistories.from_lists([[10, 6, 0], [10, 0],
+                                               [10, 12, 14, 3]])
+        self.assertEqual(storage.find_median_balances(), [10, 6, 0],
+                         "Median should stop once it reaches zero")
+
+
+class TestHistoryFiles(TestCase):
+    """Ensure that histories written to disk are read back unchanged"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.histories = [[5, 8, 10, 9, 12],
+                          [4, 6, 5, 12],
+                          [3, -2, 7, 15],
+                          [7]]
+        self.stop_reasons = ["take_profit", "bankrupt", "max_rolls",
+                             "bankrupt"]
+        config = Configuration(base_bet=1, payout=2, iterations=4,
+                               loss_adder=100, max_rolls=3, take_profit=12)
+        with HistoryWriter(self.directory, config, Account(20),
+                           random_seed=3) as writer:
+            for history, stop_reason in zip(self.histories,
+                                            self.stop_reasons):
+                writer.append(history, stop_reason)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_back(self):
+        storage = MappedHistories(self.directory)
+        self.assertEqual([history.tolist() for history in storage],
+                         self.histories, "Histories changed on disk")
+
+    def test_configuration(self):
+        config, account = MappedHistories(
+            self.directory).make_configuration()
+        self.assertEqual((config.get_payout(), config.get_iterations(),
+                          account.get_balance()), (2, 4, 20),
+                         "Settings changed on disk")
+        self.assertEqual((config.get_max_rolls(), config.get_take_profit(),
+                          config.get_stop_loss()), (3, 12, None),
+                         "Stop conditions changed on disk")
+
+    def test_stop_reasons(self):
+        storage = MappedHistories(self.directory)
+        self.assertEqual(storage.get_stop_reasons(), self.stop_reasons,
+                         "Stop reasons changed on disk")
+        self.assertEqual(storage.summarize().find_stop_counts()["bankrupt"],
+                         2, "Stop reasons were miscounted in chunks")
+
+    def test_chunked_reductions(self):
+        in_memory = BalanceHistories.from_lists(self.histories)
+        # A chunk smaller than any run still takes one run at a time
+        for chunk_balances in [1, 6, 100]:
+            storage = MappedHistories(self.directory,
+                                      chunk_balances=chunk_balances)
+            self.assertEqual(storage.find_average_balances(),
+                             in_memory.find_average_balances(),
+                             "Wrong average balances read in chunks")
+            self.assertEqual(storage.find_median_balances(),
+                             in_memory.find_median_balances(),
+                             "Wrong median balances read in chunks")
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            MappedHistories(self.directory).append([1])
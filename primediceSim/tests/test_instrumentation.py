@@ -0,0 +1,135 @@
+import contextlib
+import io
+import json
+from unittest import TestCase
+from primediceSim.instrumentation import (Instrument, MemorySink,
+                                          JsonLinesSink, CombinedInstrument,
+                                          get_instrument, set_instrument)
+from primediceSim.simulation import Simulation
+from primediceSim.configuration import Configuration
+from primediceSim.account import Account
+from primediceSim.tests.helpers import FakeProgressBar
+
+
+class TestSinks(TestCase):
+    """Ensure that each instrument keeps the events it is given"""
+
+    def test_default_ignores_events(self):
+        instrument = Instrument()
+        self.assertFalse(instrument.enabled,
+                         "The default instrument should do nothing")
+        with instrument.phase("nothing"):
+            instrument.count("nothing")
+
+    def test_memory_sink(self):
+        sink = MemorySink()
+        for _ in range(3):
+            with sink.phase("work", size=2):
+                sink.count("items", 2)
+        sink.observe("length", 5)
+
+        self.assertEqual(sink.get_counter("items"), 6, "Counts were lost")
+        self.assertEqual(sink.summarize_timings()["work"]["count"], 3,
+                         "Phase timings were lost")
+        self.assertEqual(sink.values["length"], [5], "Values were lost")
+
+    def test_json_lines_sink(self):
+        output = io.StringIO()
+        sink = JsonLinesSink(output)
+        with sink.phase("work", size=2):
+            sink.count("items")
+
+        events = [json.loads(line) for line in
+                  output.getvalue().splitlines()]
+        self.assertEqual([event["event"] for event in events],
+                         ["phase_started", "count", "phase_finished"],
+                         "Wrong events written")
+        self.assertEqual(events[0]["fields"], {"size": 2},
+                         "Phase details were not written")
+
+    def test_combined(self):
+        first = MemorySink()
+        second = MemorySink()
+        combined = CombinedInstrument(first, Instrument(), second)
+        combined.count("items", 4)
+        self.assertEqual((first.get_counter("items"),
+                          second.get_counter("items")), (4, 4),
+                         "Events were not passed on to every instrument")
+
+    def test_set_default(self):
+        sink = MemorySink()
+        previous = set_instrument(sink)
+        try:
+            self.assertIs(get_instrument(), sink,
+                          "The default instrument was not replaced")
+        finally:
+            set_instrument(previous)
+
+
+class TestSimulationEvents(TestCase):
+    """Ensure that simulations report their phases and counts"""
+
+    def run_simulation(self, **kwargs):
+        config = Configuration(base_bet=1, payout=2, iterations=20,
+                               loss_adder=100)
+        sink = MemorySink()
+        simulation = Simulation(config, Account(20), random_seed=3,
+                                instrument=sink)
+        progress = FakeProgressBar()
+        results = simulation.run(progress, progress, **kwargs)
+        return sink, results
+
+    def test_kept_results(self):
+        sink, results = self.run_simulation()
+        self.assertEqual(sorted(sink.timings),
+                         ["average_balances", "median_balances",
+                          "simulation"], "Wrong phases reported")
+        self.assertEqual(sink.get_counter("runs_completed"), 20,
+                         "Wrong number of runs counted")
+        self.assertEqual(sink.get_counter("rolls_simulated"),
+                         sum(len(balances) - 1 for balances in
+                             results.histories),
+                         "Wrong number of rolls counted")
+        self.assertGreater(sink.get_counter("bytes_retained"), 0,
+                           "Retained memory was not counted")
+
+    def test_run_values(self):
+        for engine in ("python", "hot", "batch"):
+            sink, results = self.run_simulation(engine=engine)
+            self.assertEqual(sum(sink.values["run_rolls"]),
+                             results.get_total_rolls(),
+                             "The %s engine observed the wrong rolls per"
+                             " run" % engine)
+            self.assertEqual(len(sink.values["run_rolls"]), 20,
+                             "The %s engine did not observe every run" %
+                             engine)
+        python_sink, _ = self.run_simulation()
+        self.assertEqual(len(python_sink.values["run_seconds"]), 20,
+                         "The time of each run was not observed")
+        self.assertIn("batch_seconds", sink.values,
+                      "The time of the batch engine was not observed")
+
+    def test_messages(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            sink, _ = self.run_simulation()
+        self.assertEqual(output.getvalue(), "",
+                         "A simulation printed past its instrument")
+        self.assertIn("Payout: 2", sink.messages,
+                      "The settings were not sent as messages")
+        self.assertTrue(any(text.startswith("[Results]") for text in
+                            sink.messages),
+                        "The results were not sent as messages")
+
+    def test_message_output(self):
+        output = io.StringIO()
+        Instrument(message_output=output).message("hello")
+        self.assertEqual(output.getvalue(), "hello\n",
+                         "The message was not printed to its output")
+
+    def test_streaming_results(self):
+        kept_sink, _ = self.run_simulation()
+        sink, _ = self.run_simulation(streaming=True)
+        self.assertEqual(sink.get_counter("rolls_simulated"),
+                         kept_sink.get_counter("rolls_simulated"),
+                         "Streaming counted a different number of rolls")
@@ -0,0 +1,70 @@
+from unittest import TestCase
+
+from primediceSim.account import Account
+from primediceSim.configuration import Configuration
+from primediceSim.lanes import LaneEngine
+from primediceSim.simulation import AverageResults, Simulation
+from primediceSim.strategy import Fibonacci
+from primediceSim.tests.helpers import ReplayRolls
+
+
+class TestLaneEngine(TestCase):
+    """Ensure that configurations simulated side by side give the same
+    averages as simulating each one on its own
+    """
+
+    def setUp(self):
+        self.configs = [
+            Configuration(base_bet=1, payout=2, iterations=6,
+                          loss_adder=200),
+            Configuration(base_bet=3, payout=1.5, iterations=6,
+                          loss_adder=50, take_profit=260),
+            Configuration(base_bet=2, payout=7.7, iterations=6,
+                          loss_adder=20, stop_loss=150, max_rolls=40),
+            Configuration(base_bet=10, payout=2, iterations=6),
+        ]
+        self.balances = [60, 200, 300, 5]
+
+    def test_matches_single_sim(self):
+        # With one lane the runs are simulated one after another, drawing
+        # rolls in the same order as single_sim
+        results = LaneEngine(self.configs, self.balances, lanes=1,
+                             rng=ReplayRolls(4)).run()
+
+        simulations = [Simulation(config, Account(balance)) for
+                       config, balance in zip(self.configs, self.balances)]
+        # Every simulation seeds the random module, so the seed that the
+        # runs share is given last
+        next_roll = Simulation(self.configs[0], Account(1),
+                               random_seed=4).next_roll
+        for config, simulation, lane_results in zip(self.configs,
+                                                    simulations, results):
+            simulation.next_roll = next_roll
+            expected = AverageResults([simulation.single_sim() for _ in
+                                       range(config.get_iterations())])
+            for name in ("number_of_results", "average_rolls_until_bankrupt",
+                         "overall_average_balance", "average_final_balance",
+                         "stop_counts", "censored_runs"):
+                self.assertEqual(getattr(lane_results, name),
+                                 getattr(expected, name),
+                                 "Lanes gave a different %s" % name)
+
+    def test_refill(self):
+        results = LaneEngine(self.configs, self.balances, random_seed=1,
+                             lanes=3).run(iterations=50)
+        self.assertEqual([lane_results.number_of_results for lane_results in
+                          results], [50] * 4,
+                         "Runs were lost when lanes were refilled")
+        self.assertEqual(results[3].stop_counts["bankrupt"], 50,
+                         "Runs that could not afford a bet were not counted")
+        self.assertEqual(results[3].average_rolls_until_bankrupt, 0,
+                         "Runs that could not afford a bet rolled")
+
+    def test_other_strategy(self):
+        config = Configuration(base_bet=1, payout=2, strategy=Fibonacci())
+        with self.assertRaises(ValueError):
+            LaneEngine([config], [50])
+
+    def test_missing_balance(self):
+        with self.assertRaises(ValueError):
+            LaneEngine(self.configs, self.balances[:2])
@@ -0,0 +1,69 @@
+from unittest import TestCase
+from primediceSim.parallel import split_iterations, chunk_seeds, run_parallel
+from primediceSim.configuration import Configuration
+from primediceSim.account import Account
+
+
+class TestSplitIterations(TestCase):
+    """Ensure that iterations are split into chunks correctly"""
+
+    def test_even_split(self):
+        self.assertEqual(split_iterations(300, 100), [100, 100, 100],
+                         "Iterations were not split evenly")
+
+    def test_leftover(self):
+        self.assertEqual(split_iterations(250, 100), [100, 100, 50],
+                         "Leftover iterations were not given their own chunk")
+
+    def test_small(self):
+        self.assertEqual(split_iterations(5, 100), [5],
+                         "Iterations fewer than a chunk were not kept")
+
+
+class TestChunkSeeds(TestCase):
+    """Ensure that each chunk gets its own reproducible seed"""
+
+    def test_reproducible(self):
+        self.assertEqual(chunk_seeds(10, 4), chunk_seeds(10, 4),
+                         "The same seed gave different chunk seeds")
+
+    def test_independent(self):
+        self.assertEqual(len(set(chunk_seeds(10, 4))), 4,
+                         "Chunks were given the same seed")
+
+
+class TestRunParallel(TestCase):
+    """Ensure that a seed gives the same results whatever the number of
+    workers
+    """
+
+    def test_worker_count(self):
+        config = Configuration(base_bet=1, payout=2, iterations=60,
+                               loss_adder=100)
+        account = Account(balance=20)
+
+        one_worker = run_parallel(config, account, random_seed=3, workers=1,
+                                  chunk_size=25)
+        two_workers = run_parallel(config, account, random_seed=3,
+                                   workers=2, chunk_size=25)
+
+        self.assertEqual(one_worker.number_of_results, 60,
+                         "Not every iteration was simulated")
+        self.assertEqual(one_worker.find_average_balances(),
+                         two_workers.find_average_balances(),
+                         "Average balances depend on the number of workers")
+        self.assertEqual(one_worker.find_median_balances(),
+                         two_workers.find_median_balances(),
+                         "Median balances depend on the number of workers")
+        self.assertEqual(one_worker.find_average_bal(),
+                         two_workers.find_average_bal(),
+                         "Average balance depends on the number of workers")
+
+    def test_batch_engine(self):
+        config = Configuration(base_bet=1, payout=2, iterations=40,
+                               loss_adder=100)
+        partial_results = run_parallel(config, Account(balance=20),
+                                       random_seed=3, workers=2,
+                                       chunk_size=15, engine="batch")
+        self.assertEqual(partial_results.number_of_results, 40,
+                         "Not every iteration was simulated")
@@ -136,3 +136,25 @@ class TestFindMedianBalances(TestCase):
                          [4, 7, 10, 9, 0],
                          "Median balances were incorrectly calculated when"
                          "data contained several ending medians of 0")
+
+
+class TestGetPercentileBalances(TestCase):
+    """Ensure that percentiles of the balances are correctly calculated"""
+
+    def test_median(self):
+        sample_results = [Results([5, 8, 10, 9, 12]),
+                          Results([4, 6, 5, 12]),
+                          Results([0, 7, 15])]
+        average_result = AverageResults(sample_results)
+        self.assertEqual(average_result.get_percentile_balances(50),
+                         average_result.get_median_balances(),
+                         "The 50th percentile was not the median")
+
+    def test_high_percentile(self):
+        sample_results = [Results([5, 8, 10, 9, 12]),
+                          Results([4, 6, 5, 12]),
+                          Results([0, 7, 15])]
+        average_result = AverageResults(sample_results)
+        self.assertEqual(average_result.get_percentile_balances(100),
+                         [5, 8, 15, 12, 12],
+                         "The 100th percentile was not the highest balance")
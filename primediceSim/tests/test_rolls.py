@@ -0,0 +1,73 @@
+import itertools
+import random
+from unittest import TestCase
+
+from primediceSim.rolls import BlockRolls, CompatibleRolls, make_rolls
+
+
+def take(source, count):
+    return list(itertools.islice(source.rolls(), count))
+
+
+class TestCompatibleRolls(TestCase):
+    """Ensure that the compatible rolls are the ones earlier versions drew"""
+
+    def test_same_as_randrange(self):
+        random.seed(8)
+        expected = [random.randrange(0, 10000) for _ in range(500)]
+        self.assertEqual(take(CompatibleRolls(8), 500), expected,
+                         "Compatible rolls differ from random.randrange")
+
+
+    def test_streaks(self):
+        assert_streaks(self, CompatibleRolls(8))
+
+
+def assert_streaks(test, source):
+    # One roll in five is won, so four are lost before each win on average
+    streaks = list(itertools.islice(source.streaks(0.2), 20000))
+    test.assertEqual(min(streaks), 0, "No streak was won on its first roll")
+    test.assertAlmostEqual(sum(streaks) / len(streaks), 4, delta=0.15,
+                           msg="Streaks have the wrong average length")
+
+
+class TestBlockRolls(TestCase):
+    """Ensure that rolls drawn in blocks are seeded and independent"""
+
+    def test_seeded(self):
+        self.assertEqual(take(BlockRolls(3, block_size=7), 30),
+                         take(BlockRolls(3, block_size=7), 30),
+                         "The same seed gave different rolls")
+
+    def test_range(self):
+        rolls = take(BlockRolls(3, backend="philox", block_size=1000), 5000)
+        self.assertTrue(all(0 <= roll < 10000 for roll in rolls),
+                        "Rolls fell outside 0.00 to 99.99")
+        self.assertGreater(len(set(rolls)), 3000,
+                           "Rolls did not spread over the range")
+
+    def test_streaks(self):
+        for backend in ("pcg64", "philox"):
+            assert_streaks(self, BlockRolls(3, backend=backend))
+
+    def test_backends_differ(self):
+        self.assertNotEqual(take(BlockRolls(3), 20),
+                            take(BlockRolls(3, backend="philox"), 20),
+                            "PCG64 and Philox gave the same rolls")
+
+    def test_spawn(self):
+        first, second = BlockRolls(3).spawn(2)
+        self.assertNotEqual(take(first, 20), take(second, 20),
+                            "Spawned sources gave the same rolls")
+
+    def test_jumped(self):
+        for backend in ("pcg64", "philox"):
+            source = BlockRolls(3, backend=backend)
+            self.assertNotEqual(take(source.jumped(), 20),
+                                take(BlockRolls(3, backend=backend), 20),
+                                "A jumped %s source gave the same rolls" %
+                                backend)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            make_rolls("lcg")
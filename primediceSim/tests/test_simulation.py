@@ -1,7 +1,17 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
 from unittest import TestCase
-from primediceSim.simulation import Simulation
-from primediceSim.configuration import Configuration
-from primediceSim.account import Account
+from primediceSim.simulation import Simulation, MergedResults, StreakResults
+from primediceSim.configuration import (Configuration,
+                                        FrozenConfiguration)
+from primediceSim.account import Account, FrozenAccount
+from primediceSim.rolls import CompatibleRolls
+from primediceSim.strategy import Fibonacci
+from primediceSim.tests.helpers import FakeProgressBar
 
 
 class TestRoll(TestCase):
@@ -261,6 +271,249 @@ class TestSingleSim(TestCase):
                          " base_bet=2")
 
 
+    def test_frozen_settings(self):
+        config = FrozenConfiguration(base_bet=1, payout=2, iterations=1,
+                                     loss_adder=100)
+        simulation = Simulation(config=config, account=FrozenAccount(5),
+                                random_seed=4)
+        sim_result = simulation.single_sim()
+
+        self.assertEqual(sim_result.get_balances(),
+                         [5, 6, 5, 7, 6, 4, 8, 9, 10, 11, 10, 8, 12, 13, 14,
+                          13, 11, 7], "Frozen settings gave a different "
+                                      "sequence of balances")
+
+
+    def test_strategy_looked_up_once(self):
+        lookups = []
+
+        class CountingConfiguration(Configuration):
+            def get_strategy(self):
+                lookups.append(True)
+                return super().get_strategy()
+
+        config = CountingConfiguration(base_bet=1, payout=2, iterations=1,
+                                       loss_adder=100)
+        simulation = Simulation(config=config, account=Account(balance=50),
+                                random_seed=4)
+        lookups.clear()
+        sim_result = simulation.single_sim()
+
+        self.assertGreater(sim_result.get_rolls_until_bankrupt(), 1,
+                           "The run was too short to test")
+        self.assertEqual(len(lookups), 1,
+                         "The strategy was looked up more than once a run")
+
+    def test_strategy_changed_between_runs(self):
+        config = Configuration(base_bet=1, payout=2, iterations=1,
+                               loss_adder=100)
+        simulation = Simulation(config=config, account=Account(balance=50),
+                                random_seed=4)
+        simulation.single_sim()
+        config.set_strategy(Fibonacci())
+        simulation.single_sim()
+        self.assertIs(simulation.strategy, config.get_strategy(),
+                      "A changed strategy was not used by the next run")
+
+
+class TestNumpyFree(TestCase):
+    """Ensure that simulating single runs never loads numpy"""
+
+    def test_single_runs(self):
+        code = ("import sys\n"
+                "from primediceSim.simulation import Simulation\n"
+                "from primediceSim.configuration import Configuration\n"
+                "from primediceSim.account import Account\n"
+                "config = Configuration(base_bet=1, payout=8,"
+                " loss_adder=15)\n"
+                "simulation = Simulation(config, Account(100),"
+                " random_seed=1)\n"
+                "for engine in ('python', 'hot', 'streak'):\n"
+                "    simulation.sim_function(engine)().get_average_balance()\n"
+                "print('numpy' in sys.modules)")
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=os.path.join(os.path.dirname(__file__), "..", ".."))
+        self.assertEqual(output.decode().strip(), "False",
+                         "Simulating single runs imported numpy")
+
+
+class TestHotSim(TestCase):
+    """Ensure that the hot loop gives exactly the same runs as single_sim"""
+
+    def assert_same_runs(self, config, balance, rng_backend="compat"):
+        for seed in range(5):
+            simulation = Simulation(config=config,
+                                    account=Account(balance=balance),
+                                    random_seed=seed,
+                                    rng_backend=rng_backend)
+            expected = [simulation.single_sim().get_balances() for _ in
+                        range(10)]
+            hot_simulation = Simulation(config=config,
+                                        account=Account(balance=balance),
+                                        random_seed=seed,
+                                        rng_backend=rng_backend)
+            hot = [hot_simulation.hot_sim().get_balances() for _ in
+                   range(10)]
+            self.assertEqual(hot, expected,
+                             "Hot loop runs differ from single_sim runs")
+
+    def test_integer_settings(self):
+        self.assert_same_runs(Configuration(base_bet=1, payout=2,
+                                            loss_adder=100), 50)
+
+    def test_frozen_settings(self):
+        self.assert_same_runs(FrozenConfiguration(base_bet=1, payout=2,
+                                                  loss_adder=100), 50)
+
+    def test_fractional_settings(self):
+        self.assert_same_runs(Configuration(base_bet=3, payout=1.01202,
+                                            loss_adder=37.5), 60)
+
+    def test_high_payout(self):
+        self.assert_same_runs(Configuration(base_bet=2, payout=9.3,
+                                            loss_adder=13), 300)
+
+    def test_block_rolls(self):
+        for rng_backend in ("pcg64", "philox"):
+            self.assert_same_runs(Configuration(base_bet=1, payout=2,
+                                                loss_adder=100), 50,
+                                  rng_backend)
+
+    def test_independent_streams(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100)
+        alone = Simulation(config=config, account=Account(balance=50),
+                           random_seed=2, rng_backend="pcg64")
+        expected = [alone.hot_sim().get_balances() for _ in range(5)]
+
+        first = Simulation(config=config, account=Account(balance=50),
+                           random_seed=2, rng_backend="pcg64")
+        second = Simulation(config=config, account=Account(balance=50),
+                            random_seed=9, rng_backend="pcg64")
+        interleaved = []
+        for _ in range(5):
+            interleaved.append(first.hot_sim().get_balances())
+            second.hot_sim()
+        self.assertEqual(interleaved, expected,
+                         "Another simulation changed the rolls of a"
+                         " simulation with its own generator")
+
+    def test_strategy(self):
+        self.assert_same_runs(Configuration(base_bet=1, payout=2,
+                                            strategy=Fibonacci()), 50)
+
+    def test_stop_conditions(self):
+        self.assert_same_runs(Configuration(base_bet=1, payout=2,
+                                            loss_adder=100, max_rolls=15,
+                                            take_profit=56, stop_loss=40), 50)
+
+    def test_roll_limit(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100,
+                               max_rolls=30)
+        for sim_function in ("single_sim", "hot_sim"):
+            simulation = Simulation(config=config, account=Account(10 ** 6),
+                                    random_seed=1)
+            result = getattr(simulation, sim_function)(roll_limit=12)
+            self.assertEqual(result.get_rolls_until_bankrupt(), 12,
+                             "The run did not stop at its roll limit")
+            self.assertEqual(result.get_stop_reason(), "budget",
+                             "A run stopped by its roll limit was not"
+                             " counted as stopped by the budget")
+
+
+def rolled_streaks(random_seed, threshold):
+    """Yield the losing streaks of the rolls that the hot loop draws"""
+    rolls = CompatibleRolls(random_seed).rolls()
+    while True:
+        losses = 0
+        while next(rolls) >= threshold:
+            losses += 1
+        yield losses
+
+
+class TestStreakSim(TestCase):
+    """Ensure that the streak engine gives the same run as the hot loop when
+    it is given the losing streaks of the same rolls
+    """
+
+    def assert_same_run(self, config, balance):
+        threshold = config.get_roll_under_threshold()
+        for seed in range(20):
+            hot_simulation = Simulation(config=config,
+                                        account=Account(balance=balance),
+                                        random_seed=seed)
+            expected = hot_simulation.hot_sim()
+
+            simulation = Simulation(config=config,
+                                    account=Account(balance=balance))
+            simulation.streak_source = (
+                threshold / 10000, rolled_streaks(seed, threshold).__next__)
+            # Streaks are drawn whatever the chance of winning, so the
+            # engine itself is tested
+            result = simulation.streak_sim(max_win_chance=1)
+
+            self.assertEqual(result.get_balances(), expected.get_balances(),
+                             "Streak engine run differs from the hot loop")
+            self.assertEqual(result.get_stop_reason(),
+                             expected.get_stop_reason(),
+                             "Streak engine run stopped for another reason")
+            self.assertEqual(result.get_final_balance(),
+                             expected.get_final_balance(),
+                             "Wrong final balance without the balances")
+            self.assertAlmostEqual(result.get_average_balance(),
+                                   expected.get_average_balance(),
+                                   msg="Wrong average balance without the"
+                                       " balances")
+
+    def test_integer_settings(self):
+        self.assert_same_run(Configuration(base_bet=1, payout=2,
+                                           loss_adder=100), 200)
+
+    def test_fractional_settings(self):
+        self.assert_same_run(Configuration(base_bet=3, payout=1.01202,
+                                           loss_adder=37.5), 60)
+
+    def test_stop_conditions(self):
+        self.assert_same_run(Configuration(base_bet=1, payout=5,
+                                           loss_adder=30, max_rolls=60,
+                                           take_profit=260, stop_loss=150),
+                             200)
+
+    def test_same_odds(self):
+        config = Configuration(base_bet=1, payout=10, loss_adder=15,
+                               take_profit=400)
+        averages = []
+        for sim_function in ("hot_sim", "streak_sim"):
+            simulation = Simulation(config=config, account=Account(200),
+                                    random_seed=4, rng_backend="pcg64")
+            rolls = [getattr(simulation, sim_function)()
+                     .get_rolls_until_bankrupt() for _ in range(2000)]
+            averages.append(sum(rolls) / len(rolls))
+        self.assertAlmostEqual(averages[0], averages[1],
+                               delta=averages[0] / 10,
+                               msg="The streak engine has different odds")
+
+    def test_frequent_wins(self):
+        config = Configuration(base_bet=1, payout=2, loss_adder=100)
+        expected = Simulation(config=config, account=Account(50),
+                              random_seed=3).hot_sim()
+        result = Simulation(config=config, account=Account(50),
+                            random_seed=3).streak_sim()
+        self.assertNotIsInstance(result, StreakResults,
+                                 "Streaks were drawn for frequent wins")
+        self.assertEqual(result.get_balances(), expected.get_balances(),
+                         "Frequent wins should be rolled one at a time")
+
+    def test_strategy(self):
+        config = Configuration(base_bet=1, payout=2, strategy=Fibonacci())
+        expected = Simulation(config=config, account=Account(50),
+                              random_seed=3).hot_sim().get_balances()
+        result = Simulation(config=config, account=Account(50),
+                            random_seed=3).streak_sim()
+        self.assertEqual(result.get_balances(), expected,
+                         "Other strategies should be rolled one at a time")
+
+
 class TestVerifyProgressChecks(TestCase):
     """Ensure that the progress_checks amount is appropriately verified"""
 
@@ -299,3 +552,201 @@ class TestVerifyProgressChecks(TestCase):
             progress_checks=200), 200, "Progress check value was changed when"
                                         " the iterations value was the same as"
                                         " the progress checks value.")
+
+
+class TestRun(TestCase):
+    """Ensure that the different ways of running the simulations agree"""
+
+    def setUp(self):
+        self.config = Configuration(base_bet=1, payout=2, iterations=30,
+                                    loss_adder=100)
+
+    def run_simulation(self, **kwargs):
+        simulation = Simulation(config=self.config, account=Account(20),
+                                random_seed=6)
+        progress = FakeProgressBar()
+        return simulation.run(progress, progress, **kwargs)
+
+    def test_streaming(self):
+        kept = self.run_simulation()
+        streamed = self.run_simulation(streaming=True)
+
+        self.assertEqual(streamed.get_average_balances(),
+                         kept.get_average_balances(),
+                         "Streaming changed the average balances")
+        self.assertEqual(streamed.average_rolls_until_bankrupt,
+                         kept.average_rolls_until_bankrupt,
+                         "Streaming changed the average rolls until"
+                         " bankruptcy")
+        self.assertEqual(streamed.overall_average_balance,
+                         kept.overall_average_balance,
+                         "Streaming changed the overall average balance")
+
+    def streamed_peak(self, iterations, write=False, **kwargs):
+        """Return the most memory that a streamed run of the given number of
+        iterations took, and its results. The histories are also written to
+        a directory if write is True, and the results are then those read
+        back from it.
+        """
+
+        # The modules that streaming loads are loaded before measuring
+        self.config.set_iterations(10)
+        self.run_simulation(streaming=True, **kwargs)
+
+        self.config.set_iterations(iterations)
+        directory = tempfile.mkdtemp()
+        try:
+            if write:
+                kwargs["output"] = directory
+            tracemalloc.start()
+            try:
+                results = self.run_simulation(streaming=True, **kwargs)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            if write:
+                results = MergedResults.from_file(directory)
+        finally:
+            shutil.rmtree(directory)
+
+        return peak, results
+
+    def test_streaming_batch_memory(self):
+        self.config.set_loss_adder(200)
+        small_peak, _ = self.streamed_peak(1000, engine="batch")
+        large_peak, large = self.streamed_peak(8000, engine="batch")
+
+        # The batch engine runs in chunks, so eight times the runs should not
+        # take anywhere near eight times the memory
+        self.assertLess(large_peak, small_peak * 2,
+                        "Streaming the batch engine held every history at"
+                        " once")
+        # Less than a single balance per run is kept
+        self.assertLess(large.get_retained_bytes(), 8000 * 8,
+                        "Streaming the batch engine kept every history")
+        self.assertEqual(large.number_of_results, 8000,
+                         "Streaming the batch engine lost runs")
+
+    def test_output(self):
+        kept = self.run_simulation()
+        directory = tempfile.mkdtemp()
+        try:
+            written = self.run_simulation(output=directory)
+            reopened = MergedResults.from_file(directory, chunk_balances=50)
+
+            for results in (written, reopened):
+                self.assertEqual(results.get_average_balances(),
+                                 kept.get_average_balances(),
+                                 "Writing histories changed the average"
+                                 " balances")
+                self.assertEqual(results.get_median_balances(),
+                                 kept.get_median_balances(),
+                                 "Writing histories changed the median"
+                                 " balances")
+                self.assertEqual(results.average_rolls_until_bankrupt,
+                                 kept.average_rolls_until_bankrupt,
+                                 "Writing histories changed the average rolls"
+                                 " until bankruptcy")
+        finally:
+            shutil.rmtree(directory)
+
+    def test_output_batch_memory(self):
+        self.config.set_loss_adder(200)
+        small_peak, _ = self.streamed_peak(1000, write=True, engine="batch")
+        large_peak, large = self.streamed_peak(8000, write=True,
+                                               engine="batch")
+
+        # Histories are written a chunk at a time, so they never all have to
+        # fit in memory at once
+        self.assertLess(large_peak, small_peak * 2,
+                        "Writing batch engine histories held every history"
+                        " at once")
+        self.assertEqual(large.number_of_results, 8000,
+                         "Not every batch engine history was written")
+
+    def test_output_with_workers(self):
+        with self.assertRaises(ValueError):
+            self.run_simulation(output="unused", workers=2)
+
+    def test_hot_engine(self):
+        kept = self.run_simulation()
+        hot = self.run_simulation(engine="hot")
+        self.assertEqual(hot.get_average_balances(),
+                         kept.get_average_balances(),
+                         "The hot engine changed the average balances")
+
+    def test_streak_engine(self):
+        results = self.run_simulation(engine="streak")
+        self.assertEqual(results.number_of_results, 30,
+                         "The streak engine gave the wrong number of runs")
+        self.assertEqual(len(results.get_average_balances()),
+                         results.num_of_rolls,
+                         "The streak engine runs were not expanded")
+
+    def test_stop_counts(self):
+        self.config.set_max_rolls(8)
+        self.config.set_take_profit(24)
+        kept = self.run_simulation()
+        streamed = self.run_simulation(streaming=True)
+
+        for results in (kept, streamed):
+            self.assertEqual(sum(results.stop_counts.values()), 30,
+                             "Not every run was counted as stopping")
+            self.assertEqual(results.censored_runs,
+                             30 - results.stop_counts["bankrupt"],
+                             "Censored runs were miscounted")
+            self.assertGreater(results.stop_counts["max_rolls"], 0,
+                               "No run reached its roll limit")
+        self.assertEqual(streamed.stop_counts, kept.stop_counts,
+                         "Streaming changed the stop counts")
+        self.assertEqual(streamed.average_final_balance,
+                         kept.average_final_balance,
+                         "Streaming changed the average final balance")
+
+    def test_roll_budget(self):
+        for engine in ("python", "batch"):
+            results = self.run_simulation(engine=engine, roll_budget=50)
+            self.assertLessEqual(results.get_total_rolls(), 50,
+                                 "The %s engine made more rolls than the"
+                                 " budget" % engine)
+            self.assertGreater(results.stop_counts["budget"], 0,
+                               "No %s run was stopped by the budget" % engine)
+
+    def test_budget_with_workers(self):
+        with self.assertRaises(ValueError):
+            self.run_simulation(roll_budget=10, workers=2)
+
+    def test_adaptive(self):
+        self.config.set_iterations(5000)
+        self.config.set_loss_adder(200)
+        for engine in ("hot", "batch"):
+            results = self.run_simulation(engine=engine, precision=0.1,
+                                          batch_size=50)
+            self.assertTrue(results.precision_reached,
+                            "The %s engine did not reach the precision" %
+                            engine)
+            self.assertLess(results.number_of_results, 5000,
+                            "The %s engine did not stop early" % engine)
+            self.assertEqual(results.number_of_results % 50, 0,
+                             "The %s engine stopped partway through a batch"
+                             % engine)
+            low, high = results.confidence_intervals[
+                "average_rolls_until_bankrupt"]
+            self.assertTrue(low <= results.average_rolls_until_bankrupt + 1
+                            and results.average_rolls_until_bankrupt <= high,
+                            "The average rolls are outside their interval")
+
+    def test_adaptive_out_of_iterations(self):
+        results = self.run_simulation(precision=0.0001)
+        self.assertFalse(results.precision_reached,
+                         "An unreachable precision was reached")
+        self.assertEqual(results.number_of_results, 30,
+                         "Every iteration was not used")
+
+    def test_adaptive_with_workers(self):
+        with self.assertRaises(ValueError):
+            self.run_simulation(precision=0.1, workers=2)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            self.run_simulation(engine="abacus")
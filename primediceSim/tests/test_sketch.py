@@ -0,0 +1,88 @@
+from unittest import TestCase
+import numpy as np
+from primediceSim.sketch import BalanceSketch
+from primediceSim.aggregate import PartialResults
+
+
+class TestBucket(TestCase):
+    """Ensure that balances are put into buckets that keep their order and
+    their value to within the relative error
+    """
+
+    def setUp(self):
+        self.sketch = BalanceSketch(relative_error=0.01)
+
+    def test_within_error(self):
+        balances = np.arange(1, 100000)
+        values = self.sketch.value(self.sketch.bucket(balances))
+        errors = np.abs(values - balances) / balances
+        self.assertLessEqual(errors.max(), 0.01,
+                             "A bucket value was further from its balance"
+                             " than the relative error")
+
+    def test_order(self):
+        balances = np.array([-50, -3, 0, 1, 2, 40, 40000])
+        keys = self.sketch.bucket(balances)
+        self.assertTrue(np.all(np.diff(keys) > 0),
+                        "Bucket keys were not in the same order as the"
+                        " balances")
+
+    def test_zero(self):
+        self.assertEqual(self.sketch.bucket([0]).tolist(), [0],
+                         "Zero was not given its own bucket")
+        self.assertEqual(self.sketch.value([0]).tolist(), [0],
+                         "The zero bucket did not stand for zero")
+
+    def test_invalid_error(self):
+        with self.assertRaises(ValueError):
+            BalanceSketch(relative_error=1.5)
+
+
+class TestSketchPercentiles(TestCase):
+    """Ensure that percentiles found with a sketch are within the relative
+    error of the exact ones
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.histories = [rng.integers(1, 5000, size=rng.integers(5, 30))
+                          for _ in range(300)]
+
+    def test_percentiles(self):
+        exact = PartialResults()
+        exact.add_histories(self.histories)
+        sketched = PartialResults(sketch=BalanceSketch(0.01))
+        sketched.add_histories(self.histories)
+
+        for percentile in (5, 25, 50, 75, 95):
+            exact_balances = exact.find_percentile_balances(percentile)
+            sketched_balances = sketched.find_percentile_balances(percentile)
+            self.assertEqual(len(exact_balances), len(sketched_balances),
+                             "Sketch stopped at a different roll number")
+            for exact_balance, sketched_balance in zip(exact_balances,
+                                                       sketched_balances):
+                # Allow for rounding to a whole balance as well
+                self.assertLessEqual(
+                    abs(exact_balance - sketched_balance),
+                    0.01 * exact_balance + 1,
+                    "Percentile %d was outside the relative error" %
+                    percentile)
+
+    def test_exact_percentiles(self):
+        exact = PartialResults()
+        exact.add_histories(self.histories[:3])
+        padded = np.zeros((3, max(len(history) for history in
+                                  self.histories[:3])))
+        for row, history in zip(padded, self.histories[:3]):
+            row[:len(history)] = history
+
+        expected = [int(np.percentile(column, 25)) for column in padded.T]
+        self.assertEqual(exact.find_percentile_balances(25),
+                         expected[:len(exact.find_percentile_balances(25))],
+                         "Exact percentiles differ from np.percentile")
+
+    def test_merge_different_sketches(self):
+        first = PartialResults(sketch=BalanceSketch(0.01))
+        second = PartialResults(sketch=BalanceSketch(0.05))
+        with self.assertRaises(ValueError):
+            first.merge(second)
@@ -0,0 +1,115 @@
+from unittest import TestCase
+
+import numpy as np
+
+from primediceSim.strategy import (DAlembert, Fibonacci, Martingale,
+                                   Paroli, PercentAdjust, Strategy,
+                                   make_strategy, parse_strategy)
+
+BUILT_IN = [Martingale(), Martingale(37.5), PercentAdjust(),
+            PercentAdjust(on_win=50, on_loss=None),
+            PercentAdjust(on_win=None, on_loss=100, reset_after=3),
+            Fibonacci(), DAlembert(), DAlembert(step=2.5), Paroli(),
+            Paroli(target_wins=2, win_adder=50)]
+
+
+class Countdown(Strategy):
+    """A strategy with only a scalar next_bet, which counts losses"""
+
+    __slots__ = ()
+    name = "countdown"
+
+    def next_bet(self, base_bet, bet, won, state):
+        if won:
+            return base_bet, 0
+        return bet + 1, state + 1
+
+
+class TestNextBets(TestCase):
+    """Ensure that moving every run at once gives the same bets as moving
+    them one at a time
+    """
+
+    def assert_same_bets(self, strategy):
+        rng = np.random.default_rng(1)
+        runs = 20
+        bets = np.full(runs, 3.0)
+        states = np.zeros(runs, dtype=np.int64)
+        scalar = [(3.0, 0)] * runs
+        for _ in range(40):
+            won = rng.random(runs) < 0.45
+            bets, states = strategy.next_bets(3, bets, won, states)
+            scalar = [strategy.next_bet(3, bet, bool(run_won), state) for
+                      (bet, state), run_won in zip(scalar, won)]
+            self.assertEqual(bets.tolist(), [bet for bet, _ in scalar],
+                             "%r gave different bets at once" % strategy)
+            if strategy.uses_state:
+                self.assertEqual(states.tolist(),
+                                 [state for _, state in scalar],
+                                 "%r gave different states at once" %
+                                 strategy)
+
+    def test_built_in(self):
+        for strategy in BUILT_IN:
+            self.assert_same_bets(strategy)
+
+    def test_scalar_only(self):
+        self.assert_same_bets(Countdown())
+
+
+class TestStrategies(TestCase):
+    """Ensure that the built in strategies bet as they are described"""
+
+    def bets_after(self, strategy, results, base_bet=2):
+        bet, state = base_bet, 0
+        bets = []
+        for won in results:
+            bet, state = strategy.next_bet(base_bet, bet, won, state)
+            bets.append(bet)
+        return bets
+
+    def test_martingale(self):
+        self.assertEqual(self.bets_after(Martingale(100),
+                                         [False, False, True]),
+                         [4, 8, 2], "Martingale did not double on losses")
+
+    def test_reset_after(self):
+        self.assertEqual(self.bets_after(PercentAdjust(reset_after=2),
+                                         [False, False, False]),
+                         [4, 2, 4], "The bet did not reset after two losses")
+
+    def test_fibonacci(self):
+        self.assertEqual(self.bets_after(Fibonacci(),
+                                         [False, False, False, True]),
+                         [2, 4, 6, 2], "Fibonacci bets are wrong")
+
+    def test_dalembert(self):
+        self.assertEqual(self.bets_after(DAlembert(),
+                                         [False, False, True, True]),
+                         [4, 6, 4, 2], "D'Alembert bets are wrong")
+
+    def test_paroli(self):
+        self.assertEqual(self.bets_after(Paroli(target_wins=3),
+                                         [True, True, True, True, False]),
+                         [4, 8, 2, 4, 2], "Paroli bets are wrong")
+
+
+class TestMakeStrategy(TestCase):
+    """Ensure that strategies can be made from their names and settings"""
+
+    def test_describe(self):
+        for strategy in BUILT_IN:
+            self.assertEqual(make_strategy(**strategy.describe()), strategy,
+                             "%r was not made again from its description" %
+                             strategy)
+
+    def test_parse(self):
+        self.assertEqual(parse_strategy("percent:on_win=none,on_loss=50,"
+                                        "reset_after=4"),
+                         PercentAdjust(on_win=None, on_loss=50,
+                                       reset_after=4),
+                         "The strategy was parsed wrongly")
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            make_strategy("labouchere")
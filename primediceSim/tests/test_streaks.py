@@ -0,0 +1,86 @@
+from unittest import TestCase
+
+from primediceSim.configuration import Configuration
+from primediceSim.strategy import Fibonacci
+from primediceSim.streaks import BetLadder, expand_streaks, find_bet_ladder
+
+
+class TestBetLadder(TestCase):
+    """Ensure that the ladder holds the bets and costs of a losing streak"""
+
+    def test_bets(self):
+        ladder = BetLadder(1, 1.0)
+        ladder.extend(100, 5)
+        self.assertEqual(ladder.bets, [1, 2, 4, 8, 16], "Wrong bets")
+        self.assertEqual(ladder.costs, [0, 1, 3, 7, 15], "Wrong costs")
+        self.assertEqual(ladder.cost_totals, [0, 1, 4, 11, 26],
+                         "Wrong totals of the costs")
+        self.assertEqual(ladder.needs, [1, 3, 7, 15, 31],
+                         "Wrong balances needed")
+
+    def test_stops_past_balance(self):
+        ladder = BetLadder(1, 1.0)
+        ladder.extend(10)
+        self.assertEqual(len(ladder.bets), 4,
+                         "Ladder grew past what the balance could pay")
+
+    def test_horizon(self):
+        ladder = BetLadder(1, 1.0)
+        self.assertEqual(ladder.horizon(100, limit=3), 3,
+                         "An affordable streak was cut short")
+        # Losing 1 + 2 + 4 + 8 + 16 + 32 leaves 37, which cannot pay a bet
+        # of 64
+        self.assertEqual(ladder.horizon(100), 6,
+                         "Wrong number of rolls before bankruptcy")
+        # Losing 1 + 2 + 4 + 8 leaves 85, which is below the stop loss
+        self.assertEqual(ladder.horizon(100, stop_loss=90), 4,
+                         "Wrong number of rolls before the stop loss")
+        self.assertEqual(ladder.horizon(0), 0,
+                         "An empty balance made a roll")
+
+    def test_same_as_stepping(self):
+        ladder = BetLadder(3, 0.375)
+        for balance in range(0, 500, 7):
+            left = balance
+            bet = 3
+            rolls = 0
+            while left >= bet:
+                left -= int(bet)
+                bet += bet * 0.375
+                rolls += 1
+            self.assertEqual(ladder.horizon(balance), rolls,
+                             "Wrong horizon for a balance of %d" % balance)
+
+    def test_overflow(self):
+        ladder = BetLadder(1, 1e300)
+        self.assertEqual(ladder.horizon(10 ** 400), 2,
+                         "A bet too large for a float was made")
+        self.assertTrue(ladder.overflowed, "The overflow was not noticed")
+        self.assertEqual(ladder.costs[-1], 1 + int(1e300),
+                         "The cost before the overflow is wrong")
+
+    def test_shared(self):
+        first = Configuration(base_bet=1, payout=2, loss_adder=50)
+        second = Configuration(base_bet=1, payout=5, loss_adder=50)
+        self.assertIs(first.get_bet_ladder(), second.get_bet_ladder(),
+                      "Configurations with the same bets have two ladders")
+        self.assertIs(find_bet_ladder(1, 0.5), first.get_bet_ladder(),
+                      "The ladder was not reused")
+
+    def test_other_strategy(self):
+        config = Configuration(base_bet=1, payout=2, strategy=Fibonacci())
+        with self.assertRaises(ValueError):
+            config.get_bet_ladder()
+
+
+class TestExpandStreaks(TestCase):
+    """Ensure that streaks are turned back into the balance of every roll"""
+
+    def test_expand(self):
+        ladder = BetLadder(1, 1.0)
+        ladder.extend(100)
+        # Lose 1 and win 2, win 1, then lose 1, 2 and 4
+        self.assertEqual(expand_streaks(10, [2, 1, 3], False, ladder, 2),
+                         [10, 9, 11, 12, 11, 9, 5], "Wrong balances")
+        self.assertEqual(expand_streaks(10, [2], True, ladder, 2),
+                         [10, 9, 11], "Wrong balances of a won streak")
@@ -0,0 +1,107 @@
+from unittest import TestCase
+from primediceSim.sweep import Sweep
+
+
+class TestRun(TestCase):
+    """Ensure that a sweep simulates every point of the grid once"""
+
+    def setUp(self):
+        self.sweep = Sweep(iterations=20, random_seed=1, workers=0)
+
+    def test_every_point(self):
+        rows = self.sweep.run(payouts=[2, 3], loss_adders=[100, 200],
+                              base_bets=[1], balances=[20, 40])
+        self.assertEqual(len(rows), 8,
+                         "A row was not returned for every point")
+        self.assertEqual([(row["payout"], row["loss_adder"], row["balance"])
+                          for row in rows[:2]],
+                         [(2, 100, 20), (2, 100, 40)],
+                         "Rows were not in grid order")
+
+    def test_memoized(self):
+        first_rows = self.sweep.run(payouts=[2], loss_adders=[100],
+                                    base_bets=[1], balances=[20])
+        groups = []
+        original_simulate = self.sweep.simulate
+
+        def record_simulate(point_groups):
+            groups.append(point_groups)
+            return original_simulate(point_groups)
+
+        self.sweep.simulate = record_simulate
+        rows = self.sweep.run(payouts=[2], loss_adders=[100], base_bets=[1],
+                              balances=[20, 40])
+
+        self.assertEqual(sum(len(points) for points in groups[0].values()), 1,
+                         "Finished points were simulated again")
+        self.assertIs(rows[0], first_rows[0],
+                      "A finished point's row was not reused")
+
+    def test_repeated_values(self):
+        groups = []
+        original_simulate = self.sweep.simulate
+
+        def record_simulate(point_groups):
+            groups.append(point_groups)
+            return original_simulate(point_groups)
+
+        self.sweep.simulate = record_simulate
+        rows = self.sweep.run(payouts=[2, 2], loss_adders=[100],
+                              base_bets=[1], balances=[20])
+
+        self.assertEqual(sum(len(points) for points in groups[0].values()), 1,
+                         "A repeated point was simulated twice")
+        self.assertEqual(len(rows), 2, "A row was not returned for every"
+                                       " value given")
+        self.assertIs(rows[0], rows[1],
+                      "The repeated point was given two rows")
+
+    def test_shared_rolls(self):
+        # Points with the same payout are given the same rolls, so the same
+        # settings reached through a different grid give the same results
+        rows = self.sweep.run(payouts=[2], loss_adders=[100], base_bets=[1],
+                              balances=[20, 40])
+        other_rows = Sweep(iterations=20, random_seed=1, workers=0).run(
+            payouts=[2], loss_adders=[100], base_bets=[1], balances=[40])
+        self.assertEqual(rows[1], other_rows[0],
+                         "The same point gave different results in a"
+                         " different grid")
+
+    def test_workers(self):
+        rows = self.sweep.run(payouts=[2, 3], loss_adders=[100],
+                              base_bets=[1], balances=[20])
+        pooled_rows = Sweep(iterations=20, random_seed=1, workers=2).run(
+            payouts=[2, 3], loss_adders=[100], base_bets=[1], balances=[20])
+        self.assertEqual(rows, pooled_rows,
+                         "Results changed when run across workers")
+
+    def test_single_payout_workers(self):
+        # One payout makes a single group, which is still split between
+        # every worker
+        groups = Sweep.group_points([(2, 100, 1, 20), (2, 100, 1, 40),
+                                     (2, 200, 1, 20), (2, 200, 1, 40)])
+        tasks = Sweep(iterations=20, random_seed=1, workers=4).make_tasks(
+            groups)
+        self.assertEqual(len(tasks), 4,
+                         "A single payout was not split between workers")
+
+        rows = self.sweep.run(payouts=[2], loss_adders=[100, 200],
+                              base_bets=[1], balances=[20, 40])
+        pooled_rows = Sweep(iterations=20, random_seed=1, workers=4).run(
+            payouts=[2], loss_adders=[100, 200], base_bets=[1],
+            balances=[20, 40])
+        self.assertEqual(rows, pooled_rows,
+                         "Results changed when the points were split")
+
+    def test_chunks(self):
+        # Each chunk is its own task, and the chunks are put back together
+        # in the same order however they were run
+        rows = Sweep(iterations=20, random_seed=1, workers=0,
+                     chunk_size=7).run(payouts=[2], loss_adders=[200],
+                                       base_bets=[1], balances=[20])
+        pooled_rows = Sweep(iterations=20, random_seed=1, workers=2,
+                            chunk_size=7).run(payouts=[2], loss_adders=[200],
+                                              base_bets=[1], balances=[20])
+        self.assertEqual(rows, pooled_rows,
+                         "Results changed when the chunks were run across"
+                         " workers")
@@ -0,0 +1,104 @@
+import time
+from unittest import TestCase
+from primediceSim.worker import SimulationWorker
+from primediceSim.simulation import Simulation
+from primediceSim.configuration import Configuration
+from primediceSim.account import Account
+from primediceSim.tests.helpers import FakeProgressBar
+
+
+class TestSimulationWorker(TestCase):
+    """Ensure that the background worker reports its runs and can be
+    cancelled
+    """
+
+    def setUp(self):
+        self.config = Configuration(base_bet=1, payout=2, iterations=30,
+                                    loss_adder=100)
+        self.account = Account(20)
+
+    def run_worker(self, **kwargs):
+        worker = SimulationWorker(self.config, self.account, random_seed=6,
+                                  **kwargs)
+        worker.start()
+        worker.join(60)
+        self.assertFalse(worker.is_running(), "The worker did not finish")
+        return worker.get_messages()
+
+    def test_finished(self):
+        messages = self.run_worker(engine="hot")
+        simulation = Simulation(self.config, self.account, random_seed=6)
+        progress = FakeProgressBar()
+        expected = simulation.run(progress, progress, engine="hot")
+
+        self.assertEqual(messages[-1][0], "finished",
+                         "The worker did not send its results")
+        self.assertEqual(messages[-1][1].get_average_balances(),
+                         expected.get_average_balances(),
+                         "The worker simulated different runs")
+        self.assertEqual(messages[-1][1].get_median_balances(),
+                         expected.get_median_balances(),
+                         "The worker found different medians")
+
+    def test_progress(self):
+        messages = self.run_worker(engine="batch", chunk_size=10,
+                                   update_interval=0)
+        progress = [message for message in messages if
+                    message[0] == "progress"]
+        self.assertEqual([message[1] for message in progress], [10, 20, 30],
+                         "Progress was not sent after every chunk")
+        self.assertEqual(messages[-1][1].number_of_results, 30,
+                         "The worker did not simulate every run")
+
+    def test_cancel(self):
+        self.config.set_iterations(10 ** 9)
+        worker = SimulationWorker(self.config, self.account, random_seed=6)
+        worker.start()
+        worker.cancel()
+        worker.join(10)
+
+        self.assertFalse(worker.is_running(), "Cancelling did not stop the"
+                                              " worker")
+        self.assertEqual(worker.get_messages()[-1][0], "cancelled",
+                         "The worker did not report that it was cancelled")
+
+    def test_progress_medians(self):
+        messages = self.run_worker(engine="batch", chunk_size=10,
+                                   update_interval=0, median_error=0.05)
+        live_medians = [message for message in messages if
+                        message[0] == "progress"][-1][3]
+        medians = messages[-1][1].get_median_balances()
+        self.assertEqual(len(live_medians), len(medians),
+                         "The progress medians cover other rolls")
+        for live_median, median in zip(live_medians, medians):
+            self.assertAlmostEqual(live_median, median,
+                                   delta=abs(median) * 0.05 + 1,
+                                   msg="The progress medians are too far"
+                                       " from the exact medians")
+
+    def assert_cancelled_mid_run(self, engine):
+        # Runs this long would take hours to finish
+        config = Configuration(base_bet=1, payout=2, iterations=1,
+                               loss_adder=0)
+        worker = SimulationWorker(config, Account(10 ** 9), random_seed=6,
+                                  engine=engine)
+        worker.start()
+        time.sleep(0.2)
+        worker.cancel()
+        worker.join(10)
+
+        self.assertFalse(worker.is_running(), "Cancelling did not stop the"
+                                              " run that was going")
+        self.assertEqual(worker.get_messages()[-1], ("cancelled", 0),
+                         "The run that was cut short was counted")
+
+    def test_cancel_hot_run(self):
+        self.assert_cancelled_mid_run("hot")
+
+    def test_cancel_batch_run(self):
+        self.assert_cancelled_mid_run("batch")
+
+    def test_error(self):
+        messages = self.run_worker(engine="abacus")
+        self.assertEqual(messages[-1][0], "error",
+                         "The worker did not report its failure")
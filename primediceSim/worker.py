@@ -0,0 +1,162 @@
+import copy
+import queue
+import threading
+import time
+
+from primediceSim.aggregate import PartialResults
+from primediceSim.batch import BatchEngine
+from primediceSim.parallel import split_iterations
+from primediceSim.simulation import Simulation, MergedResults
+from primediceSim.sketch import BalanceSketch
+
+
+class SimulationWorker:
+    """Run simulations on a background thread, so that a window can keep
+    responding while they run. Progress is sent back through a queue of
+    messages, which the window can check whenever it likes:
+
+    ("progress", finished_runs, average_balances, median_balances)
+        sent every update_interval seconds while runs are finishing
+    ("finished", results)
+        sent once every run has finished, with a MergedResults
+    ("cancelled", finished_runs)
+        sent if cancel() stopped the runs before they had all finished
+    ("error", exception)
+        sent if the simulations failed
+    """
+
+    def __init__(self, config, account, random_seed=None, engine="hot",
+                 update_interval=0.5, chunk_size=100, rng_backend="compat",
+                 median_error=0.01):
+        """The configuration and account are copied, so they can be changed
+        while the worker is running.
+        engine - "python", "hot" or "streak" to simulate one run at a time,
+        or "batch" to simulate chunk_size runs at a time with numpy arrays
+        update_interval - the least number of seconds between progress
+        messages. Finding the medians takes a while, so they are not sent
+        after every run.
+        rng_backend - how rolls are drawn, one of RNG_BACKENDS from the rolls
+        module. The default draws from the random module that the rest of
+        the program shares, so the others keep the worker's rolls to itself.
+        median_error - the largest error, as a fraction of the balance, of
+        the medians in progress messages. They are counted with a
+        BalanceSketch, whose small table keeps them quick to find however many
+        runs have finished. The finished results have exact medians.
+        """
+        self.config = copy.copy(config)
+        self.account = copy.copy(account)
+        self.random_seed = random_seed
+        self.engine = engine
+        self.rng_backend = rng_backend
+        self.update_interval = update_interval
+        self.chunk_size = chunk_size
+        self.median_error = median_error
+
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        """Ask the worker to stop. The runs that are going are cut short and
+        left out of the results.
+        """
+
+        self.cancel_event.set()
+
+    def is_running(self):
+        return self.thread.is_alive()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def get_messages(self):
+        """Return every message that has been sent since the last call,
+        without waiting for more
+        """
+
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def work(self):
+        """Simulate every run and send the results, or the reason they could
+        not be finished
+        """
+
+        try:
+            partial_results = self.simulate()
+        except Exception as error:
+            self.messages.put(("error", error))
+            return
+
+        if self.cancel_event.is_set():
+            self.messages.put(("cancelled",
+                               partial_results.number_of_results))
+        else:
+            self.messages.put(("finished", MergedResults(partial_results)))
+
+    def simulate(self):
+        """Simulate runs until every iteration has finished or the worker is
+        cancelled, and return their totals
+        """
+
+        partial_results = PartialResults()
+        # The same runs again, for the curves of the progress messages
+        live_results = PartialResults(
+            sketch=BalanceSketch(self.median_error))
+        last_update = time.monotonic()
+
+        for histories, stop_reasons in self.simulate_chunks():
+            partial_results.add_histories(histories, stop_reasons)
+            live_results.add_histories(histories, stop_reasons)
+            if self.cancel_event.is_set():
+                break
+
+            now = time.monotonic()
+            if now - last_update >= self.update_interval:
+                self.send_progress(live_results)
+                last_update = now
+
+        return partial_results
+
+    def simulate_chunks(self):
+        """Yield the balance histories of the runs, a few at a time, along
+        with the reason each run stopped, stopping early once the worker is
+        cancelled. The runs that are going when it is cancelled are stopped
+        as if their deadline had passed, and are not yielded.
+        """
+
+        iterations = self.config.get_iterations()
+        cancelled = self.cancel_event.is_set
+
+        if self.engine == "batch":
+            batch_engine = BatchEngine(self.config, self.account,
+                                       random_seed=self.random_seed,
+                                       rng_backend=self.rng_backend)
+            for chunk in split_iterations(iterations, self.chunk_size):
+                histories = batch_engine.run(chunk, deadline=cancelled)
+                if cancelled():
+                    return
+                yield histories, histories.get_stop_reasons()
+        else:
+            simulation = Simulation(self.config, self.account,
+                                    random_seed=self.random_seed,
+                                    rng_backend=self.rng_backend)
+            sim_function = simulation.sim_function(self.engine)
+            for _ in range(iterations):
+                sim_result = sim_function(deadline=cancelled)
+                if cancelled():
+                    return
+                yield [sim_result.get_balances()], \
+                    [sim_result.get_stop_reason()]
+
+    def send_progress(self, partial_results):
+        self.messages.put(("progress", partial_results.number_of_results,
+                           partial_results.find_average_balances(),
+                           partial_results.find_median_balances()))